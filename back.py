@@ -1,120 +1,25 @@
 """
 使用Excel数据的LLM评分系统
 """
-import re, json
-from typing import Dict, Any
-import json
 import asyncio
-import aiohttp
-import pandas as pd
-from typing import Dict, Any, List
+import json
+import os
 import time
-from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
-from fastapi.middleware.cors import CORSMiddleware
-import ssl
-try:
-    import certifi
-except Exception:
-    certifi = None
-
-def _strip_fences(s: str) -> str:
-    m = re.search(r"```json(.*?)```", s, flags=re.DOTALL|re.IGNORECASE)
-    if m: return m.group(1).strip()
-    m = re.search(r"```(.*?)```", s, flags=re.DOTALL)
-    if m: return m.group(1).strip()
-    return s.strip()
-
-def _fix_json_unterminated_and_newlines(s: str) -> str:
-    """
-    1) 把出现在“字符串内部”的裸换行替换为 \\n
-    2) 如果文件结尾时仍在字符串内，则补一个收尾的双引号
-    3) 若大括号/中括号未闭合，补全
-    """
-    out = []
-    in_str = False
-    esc = False
-    # 用栈跟踪括号以便闭合
-    stack = []
-
-    for ch in s:
-        if in_str:
-            if esc:
-                esc = False
-                out.append(ch)
-            else:
-                if ch == '\\':
-                    esc = True
-                    out.append(ch)
-                elif ch == '"':
-                    in_str = False
-                    out.append(ch)
-                elif ch == '\n' or ch == '\r':
-                    # 字符串内部的裸换行 → 转义
-                    out.append('\\n')
-                else:
-                    out.append(ch)
-        else:
-            if ch == '"':
-                in_str = True
-                out.append(ch)
-            else:
-                # 非字符串上下文才跟踪括号
-                if ch in '{[':
-                    stack.append('}' if ch == '{' else ']')
-                elif ch in '}]':
-                    if stack and stack[-1] == ch:
-                        stack.pop()
-                out.append(ch)
-
-    # 文件结束时还在字符串里 → 补一个引号
-    if in_str:
-        out.append('"')
-
-    # 补全未闭合的括号（按栈顺序补）
-    while stack:
-        out.append(stack.pop())
-
-    return ''.join(out)
-
-def _pick_text_from_llm_result(result: Dict[str, Any]) -> str:
-    """
-    尝试从不同返回结构中提取第一段文本：
-    - DashScope 原生: result["output"]["choices"][0]["message"]["content"]
-    - OpenAI 兼容:    result["choices"][0]["message"]["content"] 或 ["text"]
-    - 简单:           result.get("message") / result.get("output_text")
-    """
-    # 1) DashScope 原生
-    if isinstance(result, dict) and "output" in result:
-        out = result.get("output") or {}
-        ch  = out.get("choices") or []
-        if ch and isinstance(ch[0], dict):
-            msg = ch[0].get("message") or {}
-            if isinstance(msg, dict) and "content" in msg:
-                return msg["content"]
-        if "output_text" in result:
-            return result["output_text"]
-
-    # 2) OpenAI 兼容
-    if "choices" in result:
-        ch = result.get("choices") or []
-        if ch:
-            first = ch[0]
-            if isinstance(first, dict):
-                if "message" in first and isinstance(first["message"], dict):
-                    if "content" in first["message"]:
-                        return first["message"]["content"]
-                if "text" in first:
-                    return first["text"]
-
-    # 3) 常见兜底
-    if isinstance(result.get("message"), str):
-        return result["message"]
-    if "output_text" in result:
-        return result["output_text"]
-
-    return ""  # 没取到就返回空字符串
-
+from typing import Any, Dict, List
+
+from journal import JOURNAL
+from json_repair import IncrementalJSONParser, loads_tolerant
+from metrics import (LLM_CALLS_TOTAL, PARSE_TOTAL, STAGE_SECONDS, STRUCTURED_OUTPUT_TOTAL, TOKENS_TOTAL,
+                     TRUNCATION_TOTAL)
+from rate_limit import RateLimitedError
+from catalog import OpportunityCatalog, render_candidates
+from prompt_template import build_continuation, build_prompt
+from providers import get_adapter, load_provider_config
+from rec_schema import MODE_JSON_OBJECT, MODE_JSON_SCHEMA, MODE_RESPONSE_SCHEMA, MODE_TOOL
+from rerank import rerank
+from token_budget import TokenBudget, estimate_tokens, is_truncated
+from transport import call_timing
+# pandas 只在加载 Excel/CSV 目录时由 catalog.py 按需 import；aiohttp 会话与 SSL context 见 transport.py
 
 
 class LLMScorerWithExcel:
@@ -124,35 +29,65 @@ class LLMScorerWithExcel:
     LLM_CONFIGS = {
         "deepseek": {
             "api_url": "https://api.deepseek.com/v1/chat/completions",
-            "model": "deepseek-chat"
+            "model": "deepseek-chat",
+            "adapter": "openai",
+            "max_output_tokens": 8192,
+            "structured": MODE_JSON_OBJECT
         },
         "openai4": {
             "api_url": "https://api.openai.com/v1/chat/completions",
-            "model": "gpt-4.1"
+            "model": "gpt-4.1",
+            "adapter": "openai",
+            "prompt_cache_key": True,
+            "max_output_tokens": 32768,
+            "structured": MODE_JSON_SCHEMA
         },
         "openai5": {
             "api_url": "https://api.openai.com/v1/responses",
-            "model": "gpt-5"
+            "model": "gpt-5",
+            "adapter": "openai",
+            "prompt_cache_key": True,
+            "max_output_tokens": 128000,
+            # 走 chat 格式请求体，Responses API 的 text.format 未接入 → 只用修复解析
+            "structured": None
         },
         "qwen": {
             "api_url": "https://dashscope-intl.aliyuncs.com/compatible-mode/v1/chat/completions",
-            "model": "qwen-plus"
+            "model": "qwen-plus",
+            "adapter": "openai",
+            "max_output_tokens": 8192,
+            "structured": MODE_JSON_OBJECT
         },
         "claude": {
             "api_url": "https://api.anthropic.com/v1/messages",
-            "model": "claude-sonnet-4-20250514"
+            "model": "claude-sonnet-4-20250514",
+            "adapter": "anthropic",
+            "max_output_tokens": 64000,
+            "structured": MODE_TOOL
         },
         "grok": {
             "api_url": "https://api.x.ai/v1/chat/completions",
-            "model": "grok-4"
+            "model": "grok-4",
+            "adapter": "openai",
+            # 关闭结构化输出时仍要求 json_object
+            "force_json": True,
+            "max_output_tokens": 16384,
+            "structured": MODE_JSON_SCHEMA
         },
         "gemini": {
             "api_url": "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent",
-            "model": "gemini-2.5-flash"
+            "model": "gemini-2.5-flash",
+            "adapter": "gemini",
+            "max_output_tokens": 65536,
+            # 2.5 系列的思考 token 也计入 maxOutputTokens，额外留出余量
+            "thinking_allowance": 4096,
+            "structured": MODE_RESPONSE_SCHEMA
         }
     }
 
-    def __init__(self, api_key: str, provider: str = "deepseek"):
+    def __init__(self, api_key: str, provider: str = "deepseek", ssl_context=None, ssl_options=None):
+        """``ssl_options=(insecure, ca_bundle)`` defers building the SSL context to the first
+        connection (i.e. inside each worker); ``ssl_context`` uses a ready-made one."""
         self.api_key = api_key
         self.provider = provider
 
@@ -162,584 +97,503 @@ class LLMScorerWithExcel:
         self.config = self.LLM_CONFIGS[provider]
         self.api_url = self.config["api_url"]
         self.model = self.config["model"]
+        # 原生结构化输出模式（rec_schema.MODE_*）；None 表示只靠 parse_response 修复解析
+        self.structured = self.config.get("structured")
+        # 每次请求期望的推荐条数；max_tokens 按条数动态估算
+        self.target_items = 3
+        self.budget = TokenBudget(max_output=self.config.get("max_output_tokens", 8192))
+        # 请求构建/响应解析/流式增量由 provider 适配器负责（providers.py）
+        self.adapter = get_adapter(self.config.get("adapter", "openai"))(self)
+        self._ssl_context = ssl_context
+        self._ssl_options = ssl_options
+
+    def load_jobs_from_excel(self, file_path: str, top_k: int = 8) -> List[Dict[str, Any]]:
+        """Load job data from Excel/CSV into a searchable catalog used by create_prompt"""
+        self.catalog = OpportunityCatalog.load(file_path)
+        self.catalog_top_k = top_k
+        return self.catalog.rows
+
+    def create_prompt(self, profile: Any) -> str:
+        """Create a matching prompt for disability support programs, funding, and job opportunities
+
+        ``profile`` is a plain dict or a validated ``profile_schema.Profile``.
+        """
+        # 静态说明/规则/输出格式在前（可缓存前缀），用户画像与目录候选项在后
+        catalog = getattr(self, "catalog", None)
+        candidates = ""
+        if catalog is not None:
+            data = profile if isinstance(profile, dict) else profile.data
+            candidates = render_candidates(catalog.search(data, k=getattr(self, "catalog_top_k", 8)))
+        return build_prompt(profile, candidates)
+
+    # ---------- LLM calls ----------
+    async def call_llm(self, prompt: str) -> Dict[str, Any]:
+        # """Call LLM API"""
+        started = time.perf_counter()
+        result = await self._limited_call(prompt, self.budget.max_tokens(self.target_items))
+        choice = result["choices"][0]
+        if not is_truncated(choice.get("finish_reason")):
+            # 每条的 token 数要按实际解析出的条数算：由 parse_response 调 budget.observe
+            result["budget_pending"] = True
+        else:
+            # 输出被 max_tokens 截断：保留已完整的条目，只为剩余条目发一次续写请求
+            self.budget.on_truncated()
+            result = await self._continue_truncated(prompt, result)
+        # parse_response 写 journal 时用：哪条 prompt、整次调用（含续写）花了多久
+        if JOURNAL.enabled:
+            result["journal"] = {**JOURNAL.prompt_fields(prompt),
+                                 "latency_ms": round((time.perf_counter() - started) * 1000, 1)}
+        return result
+
+    async def _limited_call(self, prompt: str, max_tokens: int) -> Dict[str, Any]:
+        # 每个 provider 的准入控制：令牌桶 + 自适应并发 + 429/503 重试
+        limiter = getattr(self, "_rate_limiter", None)
+        if limiter is None:
+            return await self._dispatch_llm(prompt, max_tokens)
+        est_tokens = estimate_tokens(prompt) + max_tokens
+        return await limiter.run(lambda: self._dispatch_llm(prompt, max_tokens), est_tokens=est_tokens,
+                                 actual_tokens=lambda r: ((r.get("usage") if isinstance(r, dict) else None)
+                                                          or {}).get("total_tokens"))
+
+    async def _continue_truncated(self, prompt: str, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Merge the complete items of a truncated answer with a continuation for the rest."""
+        labels = {"provider": self.provider, "model": self.model}
+        message = result["choices"][0]["message"]
+        try:
+            items = [it for it in _recommendation_items(message.get("parsed") or loads_tolerant(message["content"])[0])
+                     if isinstance(it, dict) and it.get("name")]
+        except (ValueError, KeyError, TypeError):
+            items = []
+        remaining = self.target_items - len(items)
+        if remaining <= 0:
+            TRUNCATION_TOTAL.inc(action="complete_items", **labels)
+            return result
+
+        names = [str(it.get("name", "")) for it in items if it.get("name")]
+        try:
+            more = await self._limited_call(build_continuation(prompt, names, remaining),
+                                       self.budget.max_tokens(remaining))
+            more_msg = more["choices"][0]["message"]
+            extra = _recommendation_items(more_msg.get("parsed") or loads_tolerant(more_msg["content"])[0])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[BUDGET] {self.provider} continuation failed: {e}")
+            TRUNCATION_TOTAL.inc(action="continuation_failed", **labels)
+            return result
+
+        self.budget.stats["continuations"] += 1
+        TRUNCATION_TOTAL.inc(action="continued", **labels)
+        seen = {n.casefold() for n in names}
+        merged = list(items)
+        for it in extra:
+            if isinstance(it, dict) and str(it.get("name", "")).casefold() not in seen:
+                seen.add(str(it.get("name", "")).casefold())
+                merged.append(it)
+        usage = {k: (result.get("usage") or {}).get(k, 0) + (more.get("usage") or {}).get(k, 0)
+                 for k in set(result.get("usage") or {}) | set(more.get("usage") or {})}
+        return {
+            "choices": [{
+                "message": {"content": json.dumps(merged, ensure_ascii=False), "parsed": merged, "continued": True},
+                "finish_reason": more["choices"][0].get("finish_reason"),
+            }],
+            "usage": usage,
+        }
 
-
-
-
-
-    # def load_jobs_from_excel(self, file_path: str) -> List[Dict[str, Any]]:
-    #     """Load job data from Excel file"""
-    #
-    #     df = pd.read_excel(file_path, sheet_name=0)
-    #
-    #     jobs = []
-    #     for _, row in df.iterrows():
-    #         job = {
-    #             # LLM based
-    #             "title": row.get("title", ""),
-    #             "discipline": row.get("discipline", ""),
-    #             "education_history": row.get("educationHistory", ""),
-    #             "preferred_hard_skills": row.get("preferredHardSkills", ""),
-    #             "preferred_soft_skills": row.get("preferredSoftSkills", ""),
-    #             "preferred_traings": row.get("preferredTraining", ""),
-    #         }
-    #         jobs.append(job)
-    #
-    #     return jobs
-
-def create_prompt(self, profile: Dict[str, Any]) -> str:
-    """Create a matching prompt for disability support programs, funding, and job opportunities"""
-    # 用 f-string 只拼接“用户画像”部分
-    prompt_header = f"""
-You are an experienced career and disability support advisor. Analyze the user’s profile and recommend the most relevant programs, funding opportunities, or job placements. Be empathetic, realistic, and supportive.
-
-# User Profile
-
-**Personal Info**
-- Name: {profile['personalInfo']['name']}
-- Age: {profile['personalInfo']['age']}
-- Location: {profile['personalInfo']['location']}
-- Communication Mode: {profile['personalInfo']['communicationMode']}
-
-**Disability**
-- Type: {", ".join(profile['disability']['type'])}
-- Description: {profile['disability']['description']}
-- Severity: {profile['disability']['severity']}
-
-**Education**
-- Level: {profile['education']['level']}
-- Skills: {", ".join(profile['education']['skills'])}
-- Interests: {", ".join(profile['education']['interests'])}
-
-**Employment**
-- History: {profile['employment']['history']}
-- Interests: {", ".join(profile['employment']['interests'])}
-- Work Preferences: {", ".join(profile['employment']['workPreferences'])}
-
-**Needs & Priorities**
-- Financial: {", ".join(profile['needs']['financial'])}
-- Support: {", ".join(profile['needs']['support'])}
-- Technology: {", ".join(profile['needs']['technology'])}
-- Priority: {profile['needs']['priority']}
-
-# Matching & Scoring Rules
-1. Evaluate eligibility for government programs, non-profit funding, or accessible jobs.
-2. Consider disability type, severity, education level, and user needs when assessing relevance.
-3. Relevance scoring (0–100):
-   * 30% eligibility (criteria match)
-   * 30% alignment with needs and work preferences
-   * 40% alignment with education/skills/interests
-4. Recommendations must be constructive and tailored to the user’s location and communication needs.
-5. Do not suggest opportunities below the user’s education or capability level.
-6. Provide practical next steps and trusted contact information.
-"""
-
-    # 用普通字符串追加“Output Requirements”与 JSON 模板，避免 f-string 大括号被解释
-    prompt_footer = """
-# Output Requirements
-Return a JSON array of recommended opportunities in the format below. Include at least 2–3 items if possible.
-
-```json
-[
-  {
-    "id": "unique identifier",
-    "name": "Program or Job Name",
-    "type": "program | job | funding",
-    "description": "Short plain-language description",
-    "eligibility": ["List of eligibility requirements"],
-    "benefits": "Key benefits for the user",
-    "applicationSteps": ["Step 1", "Step 2", "Step 3"],
-    "contactInfo": {
-      "website": "URL",
-      "phone": "phone number",
-      "email": "email if available"
-    },
-    "relevanceScore": 0,
-    "location": "user location or Remote"
-  }
-]
-```
-"""
-    return prompt_header + prompt_footer
-
-
-
-# ---------- LLM calls ----------
-async def call_llm(self, prompt: str) -> Dict[str, Any]:
-    # """Call LLM API"""
-
-    if self.provider == "claude":
-        return await self._call_claude(prompt)
-    elif self.provider == "qwen":
-        return await self._call_qwen(prompt)
-    elif self.provider == "grok":
-        return await self._call_grok(prompt)
-    elif self.provider == "gemini":
-        return await self._call_gemini(prompt)
-    else:
-        return await self._call_openai_compatible(prompt)
-
-async def _call_openai_compatible(self, prompt: str) -> Dict[str, Any]:
-    """Call OpenAI-compatible API (OpenAI, DeepSeek)"""
-    headers = {
-        "Authorization": f"Bearer {self.api_key}",
-        "Content-Type": "application/json"
-    }
-
-    data = {
-        "model": self.model,
-        "messages": [
-            {"role": "user", "content": prompt}
-        ],
-        "temperature": 0.1,
-        "max_tokens": 1000
-    }
-
-    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(ssl=getattr(self, "_ssl_context", None))) as session:
-        async with session.post(self.api_url, headers=headers, json=data) as response:
-            if response.status == 200:
-                result = await response.json()
-
-                usage = result.get("usage", {})
-                print(f"[{self.provider.upper()}] Token usage: "
-                    f"prompt={usage.get('prompt_tokens', 0)}, "
-                    f"completion={usage.get('completion_tokens', 0)}, "
-                    f"total={usage.get('total_tokens', 0)}")
-
-                return result
-
-            else:
-                raise Exception(f"API call failed: {response.status}")
-
-async def _call_grok(self, prompt: str) -> Dict[str, Any]:
-    """Call xAI Grok API (OpenAI-compatible)"""
-    headers = {
-        "Authorization": f"Bearer {self.api_key}",
-        "Content-Type": "application/json"
-    }
-
-    data = {
-        "model": self.model,  # 例如 "grok-4"
-        "messages": [{"role": "user", "content": prompt}],
-        "temperature": 0.1,
-        "max_tokens": 1000,
-        # 强制 JSON 输出（Grok 的兼容接口一般支持）
-        "response_format": {"type": "json_object"}
-    }
-
-    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(ssl=getattr(self, "_ssl_context", None))) as session:
-        async with session.post(self.api_url, headers=headers, json=data) as response:
-            text = await response.text()
-            if response.status != 200:
-                raise Exception(f"Grok API failed: {response.status} - {text}")
-
-            result = await response.json()
-
-            # 打印 token 用量（如果有）
-            usage = result.get("usage", {})
-            if usage:
-                print(f"[GROK] Token usage: "
-                    f"prompt={usage.get('prompt_tokens', 0)}, "
-                    f"completion={usage.get('completion_tokens', 0)}, "
-                    f"total={usage.get('total_tokens', 0)}")
-
-            # 统一抽取文本内容
-            content = _pick_text_from_llm_result(result) or text
-
-            return {"choices": [{"message": {"content": content}}]}
-
-async def _call_claude(self, prompt: str) -> Dict[str, Any]:
-    """Call Anthropic Claude API"""
-    headers = {
-        "x-api-key": self.api_key,
-        "content-type": "application/json",
-        "anthropic-version": "2023-06-01"
-    }
-
-    data = {
-        "model": self.model,
-        "max_tokens": 1000,
-        "temperature": 0.1,
-        "messages": [
-            {"role": "user", "content": prompt}
-        ]
-    }
-
-    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(ssl=getattr(self, "_ssl_context", None))) as session:
-        async with session.post(self.api_url, headers=headers, json=data) as response:
-            if response.status == 200:
-                result = await response.json()
-                # Convert to unified format
-                return {
-                    "choices": [
-                        {
-                            "message": {
-                                "content": result["content"][0]["text"]
-                            }
-                        }
-                    ]
-                }
+    async def _dispatch_llm(self, prompt: str, max_tokens: int | None = None) -> Dict[str, Any]:
+        # 每次尝试单独计时；连接/首字节时间由 aiohttp trace 回调写入 timing
+        timing: Dict[str, float] = {}
+        token = call_timing.set(timing)
+        started = time.perf_counter()
+        labels = {"provider": self.provider, "model": self.model}
+        try:
+            result = await self.adapter.complete(prompt, max_tokens)
+        except asyncio.CancelledError:
+            LLM_CALLS_TOTAL.inc(outcome="cancelled", **labels)
+            raise
+        except RateLimitedError:
+            LLM_CALLS_TOTAL.inc(outcome="throttled", **labels)
+            raise
+        except Exception:
+            LLM_CALLS_TOTAL.inc(outcome="error", **labels)
+            raise
+        finally:
+            call_timing.reset(token)
+        finished = time.perf_counter()
+
+        LLM_CALLS_TOTAL.inc(outcome="ok", **labels)
+        STAGE_SECONDS.observe(finished - started, stage="llm_call", **labels)
+        STAGE_SECONDS.observe(timing.get("connect", 0.0), stage="connection_acquire", **labels)
+        if "headers" in timing:
+            STAGE_SECONDS.observe(timing["headers"] - started, stage="ttfb", **labels)
+            STAGE_SECONDS.observe(finished - timing["headers"], stage="response_read", **labels)
+        usage = result.get("usage") or {}
+        TOKENS_TOTAL.inc(usage.get("prompt_tokens", 0), kind="prompt", **labels)
+        TOKENS_TOTAL.inc(usage.get("completion_tokens", 0), kind="completion", **labels)
+        TOKENS_TOTAL.inc(usage.get("cached_tokens", 0), kind="cached", **labels)
+        TOKENS_TOTAL.inc(usage.get("cache_write_tokens", 0), kind="cache_write", **labels)
+        return result
+
+    # ---------- Streaming LLM calls ----------
+    async def stream_llm(self, prompt: str):
+        """Call the provider in streaming mode and yield text deltas as they arrive.
+
+        Goes through the same provider limiter as ``call_llm``: admitted (or shed) before
+        the first byte, throttling at stream open retried, the slot held until the end.
+        """
+        limiter = getattr(self, "_rate_limiter", None)
+        if limiter is None:
+            async for delta in self.adapter.stream(prompt):
+                yield delta
+            return
+        prompt_tokens = estimate_tokens(prompt)
+        max_tokens = self.budget.max_tokens(self.target_items)
+        # 流式响应没有 usage：按已收到的文本估算实际用量
+        received: List[str] = []
+        async for delta in limiter.stream(lambda: self.adapter.stream(prompt, max_tokens),
+                                          est_tokens=prompt_tokens + max_tokens,
+                                          actual_tokens=lambda: prompt_tokens + estimate_tokens("".join(received))):
+            received.append(delta)
+            yield delta
+
+    async def stream_recommendations(self, prompt: str):
+        """Yield normalized recommendations one by one while the completion is still streaming."""
+        parser = IncrementalJSONParser()
+        pieces: List[str] = []
+        emitted = 0
+        started = time.perf_counter()
+        async for delta in self.stream_llm(prompt):
+            pieces.append(delta)
+            for item in parser.feed(delta):
+                rec = _normalize_recommendation(item, emitted)
+                if rec is not None:
+                    emitted += 1
+                    yield rec
+        full = {"choices": [{"message": {"content": "".join(pieces)}}]}
+        if JOURNAL.enabled:
+            full["journal"] = {**JOURNAL.prompt_fields(prompt),
+                               "latency_ms": round((time.perf_counter() - started) * 1000, 1)}
+        if emitted:
+            self._journal_parse(full, "streamed", emitted)
+            return
+        # 没能增量切出条目（例如模型只返回了单个对象）→ 整体走一遍常规解析
+        for rec in self.parse_response(full):
+            yield rec
+
+    # ---------- Parsing ----------
+    def _journal_parse(self, llm_response: Any, outcome: str, items: int, error: str | None = None):
+        """Queue one journal record for this completion (written in the background, see journal.py)."""
+        if not JOURNAL.enabled:
+            return
+        try:
+            choice = llm_response["choices"][0]
+            message = choice.get("message") or {}
+            raw = message.get("content")
+            if not (isinstance(raw, str) and raw) and message.get("parsed") is not None:
+                raw = json.dumps(message["parsed"], ensure_ascii=False)
+            finish = choice.get("finish_reason")
+        except (KeyError, IndexError, TypeError, AttributeError):
+            raw, finish = None, None
+        meta = llm_response.get("journal") if isinstance(llm_response, dict) else None
+        JOURNAL.record({
+            **(meta or {}),
+            "provider": self.provider,
+            "model": self.model,
+            "usage": llm_response.get("usage") if isinstance(llm_response, dict) else None,
+            "finish_reason": finish,
+            "outcome": outcome,
+            "items": items,
+            "error": error,
+            "raw": raw,
+        })
+
+    def _observe_budget(self, llm_response: Any, items: int):
+        """Feed the token budget once per untruncated call_llm answer, with the number of items it parsed to."""
+        if isinstance(llm_response, dict) and llm_response.pop("budget_pending", False):
+            self.budget.observe((llm_response.get("usage") or {}).get("completion_tokens", 0), items)
+
+    def parse_response(self, llm_response: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Robustly parse LLM JSON list of recommendations (programs/jobs/funding)."""
+        started = time.perf_counter()
+        labels = {"provider": self.provider, "model": self.model}
+        _method = "failed"
+        try:
+            message = llm_response["choices"][0]["message"]
+            data = message.get("parsed")
+            if data is not None and message.get("continued"):
+                # 截断后续写合并出的结果（见 _continue_truncated）
+                _method = "continued"
+            elif data is not None:
+                # 工具调用等原生结构化输出：provider 已经按 schema 解码好了
+                _method = "structured"
+                STRUCTURED_OUTPUT_TOTAL.inc(outcome="native", **labels)
             else:
-                raise Exception(f"API call failed: {response.status}")
-
-async def _call_qwen(self, prompt: str) -> Dict[str, Any]:
-    """Call Qwen API"""
-    headers = {
-        "Authorization": f"Bearer {self.api_key}",
-        "Content-Type": "application/json"
-    }
-
-    data = {
-        "model": self.model,
-        "messages": [{"role": "user", "content": prompt}],
-        "temperature": 0.1,
-        "max_tokens": 1000
+                content = message["content"]
+                if not isinstance(content, str) or not content.strip():
+                    raise ValueError("empty content")
+                if getattr(self, "structured", None):
+                    # 快速路径：schema 约束下的输出应该能一次严格解码
+                    try:
+                        data = json.loads(content)
+                        _method = "strict"
+                        STRUCTURED_OUTPUT_TOTAL.inc(outcome="strict", **labels)
+                    except ValueError:
+                        STRUCTURED_OUTPUT_TOTAL.inc(outcome="fallback", **labels)
+                else:
+                    STRUCTURED_OUTPUT_TOTAL.inc(outcome="off", **labels)
+                if data is None:
+                    # 一次扫描：围栏/前后缀剥离、裸换行转义、括号补全、截断时保留完整条目
+                    data, _method = loads_tolerant(content)
+
+            # Normalize: ensure we return a list of objects
+            items = _recommendation_items(data)
+
+            normalized: List[Dict[str, Any]] = []
+            for it in items:
+                rec = _normalize_recommendation(it, len(normalized))
+                if rec is not None:
+                    normalized.append(rec)
+
+            # If nothing valid parsed, log and fall back to []
+            if not normalized:
+                raise ValueError("no valid items after normalization")
+
+            PARSE_TOTAL.inc(method=_method, **labels)
+            STAGE_SECONDS.observe(time.perf_counter() - started, stage="parse", **labels)
+            # 解码路径留在这次调用的响应上，级联的质量检查要看是否用了修复解析
+            llm_response["parse_method"] = _method
+            self._observe_budget(llm_response, len(normalized))
+            self._journal_parse(llm_response, _method, len(normalized))
+            return normalized
+
+        except Exception as e:
+            PARSE_TOTAL.inc(method="failed", **labels)
+            STAGE_SECONDS.observe(time.perf_counter() - started, stage="parse", **labels)
+            self._observe_budget(llm_response, 0)
+            # 原始输出进 journal（后台写盘），用 bench/replay_journal.py 复现
+            self._journal_parse(llm_response, "failed", 0, error=f"{type(e).__name__}: {e}")
+            # Return empty list for downstream safety
+            return []
+
+
+def _recommendation_items(data: Any) -> List[Any]:
+    """The list of items inside a decoded response (bare list, wrapper object or single item)."""
+    if isinstance(data, list):
+        return data
+    if isinstance(data, dict):
+        # structured output wraps the list as {"recommendations":[...]};
+        # some models return an object keyed like {"results":[...]} or a single item
+        for key in ("recommendations", "results"):
+            if isinstance(data.get(key), list):
+                return data[key]
+        return [data]
+    raise ValueError("parsed JSON is neither list nor dict")
+
+
+# ---------------- Recommendation schema ----------------
+def _norm_contact(x):
+    x = x if isinstance(x, dict) else {}
+    return {
+        "website": x.get("website", ""),
+        "phone": x.get("phone", ""),
+        "email": x.get("email", "")
     }
 
-    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(ssl=getattr(self, "_ssl_context", None))) as session:
-        async with session.post(self.api_url, headers=headers, json=data) as response:
-            text = await response.text()
-            if response.status != 200:
-                raise Exception(f"API call failed: {response.status} - {text}")
 
-            # 兼容：有些服务端返回非严格 JSON，这里优先尝试 json 解析
-            try:
-                result = await response.json()
-            except Exception:
-                raise Exception(f"Failed to parse JSON: {text}")
-
-            content = _pick_text_from_llm_result(result)
-            if not content:
-                # 打印一份原始返回，方便你定位 prompt/配额/模型等问题
-                # 也避免 parse_response 对空串做 json.loads 直接报错
-                content = text
-
-            return {"choices": [{"message": {"content": content}}]}
-
-async def _call_gemini(self, prompt: str) -> Dict[str, Any]:
-    """Call Gemini API"""
-    url =  self.api_url
-    headers = {"Content-Type": "application/json"}
-    params  = {"key": self.api_key}
-
-    # 非流式请求体（最简单的纯文本）
-    data = {
-        "contents": [
-            {"role": "user", "parts": [{"text": prompt}]}
-        ],
-        "generationConfig": {
-            "temperature": 0.1,
-            "responseMimeType": "application/json"
-        }
+def _as_list(v):
+    if v is None:
+        return []
+    if isinstance(v, list):
+        # cast all to strings
+        return [str(i) for i in v]
+    return [str(v)]
+
+
+def _normalize_recommendation(it: Any, index: int) -> Dict[str, Any] | None:
+    """Apply schema defaults to one parsed item; ``index`` is its position among valid items."""
+    if not isinstance(it, dict):
+        # skip non-dict entries
+        return None
+
+    # pull + coerce fields
+    _id = str(it.get("id", ""))
+    name = str(it.get("name", "")).strip()
+    _type = str(it.get("type", "")).strip()  # program | job | funding
+    description = str(it.get("description", "")).strip()
+    eligibility = _as_list(it.get("eligibility"))
+    benefits = str(it.get("benefits", "")).strip()
+    application_steps = _as_list(it.get("applicationSteps"))
+    contact_info = _norm_contact(it.get("contactInfo", {}))
+    location = str(it.get("location", "")).strip()
+
+    # relevanceScore → int 0..100 (clamp)
+    rs = it.get("relevanceScore", 0)
+    try:
+        rs = int(float(rs))
+    except Exception:
+        rs = 0
+    rs = max(0, min(100, rs))
+
+    return {
+        "id": _id or str(index + 1),
+        "name": name,
+        "type": _type,
+        "description": description,
+        "eligibility": eligibility,
+        "benefits": benefits,
+        "applicationSteps": application_steps,
+        "contactInfo": contact_info,
+        "relevanceScore": rs,
+        "location": location
     }
 
-    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(ssl=getattr(self, "_ssl_context", None))) as session:
-        async with session.post(url, headers=headers, params=params, json=data) as resp:
-            text = await resp.text()
-            if resp.status != 200:
-                # 把服务端原文抛出来，便于排错（配额/模型名/Key 等）
-                raise Exception(f"Gemini API failed: {resp.status} - {text}")
 
-            result = await resp.json()
+# ---------------- Config-registered providers ----------------
+# 本地/自建的 OpenAI 兼容端点等：LLM_PROVIDER_CONFIG=providers.json（或直接写 JSON），无需改代码
+if os.getenv("LLM_PROVIDER_CONFIG"):
+    LLMScorerWithExcel.LLM_CONFIGS.update(load_provider_config(os.environ["LLM_PROVIDER_CONFIG"]))
 
-            # ---- 统一抽取文本 ----
-            content_text = ""
-            try:
-                cands = result.get("candidates", [])
-                if cands:
-                    parts = cands[0].get("content", {}).get("parts", [])
-                    # 纯文本
-                    if parts and isinstance(parts[0], dict) and "text" in parts[0]:
-                        content_text = parts[0]["text"]
-                    # 兜底：如果不是文本（如 inlineData 等），直接返回原始 JSON
-            except Exception:
-                pass
-
-            if not content_text:
-                content_text = json.dumps(result, ensure_ascii=False)
-
-            # print("Raw Gemini response:", json.dumps(result, indent=2, ensure_ascii=False))
-
-            return {
-                "choices": [
-                    {"message": {"content": content_text}}
-                ]
-            }
-
-# ---------------- SSL context helper ----------------
-def _build_ssl_context(insecure: bool = False, ca_bundle: str | None = None):
-    ctx = None
-    if insecure:
-        ctx = ssl.create_default_context()
-        ctx.check_hostname = False
-        ctx.verify_mode = ssl.CERT_NONE
-    elif ca_bundle:
-        ctx = ssl.create_default_context(cafile=ca_bundle)
-    else:
-        if certifi is not None:
-            try:
-                ctx = ssl.create_default_context(cafile=certifi.where())
-            except Exception:
-                ctx = ssl.create_default_context()
-        else:
-            ctx = ssl.create_default_context()
-    return ctx
-
-
-
-def parse_response(self, llm_response: Dict[str, Any]) -> List[Dict[str, Any]]:
-    """Robustly parse LLM JSON list of recommendations (programs/jobs/funding)."""
+def provider_api_key(provider: str) -> str:
+    """API key from api_key.py, else from the provider config (``api_key_env`` / ``api_key``)."""
     try:
-        content = llm_response["choices"][0]["message"]["content"]
-        if not isinstance(content, str) or not content.strip():
-            raise ValueError("empty content")
-
-        raw = _strip_fences(content)
-
-        def _json_loads_any(s: str):
-            # 1) direct
-            try:
-                return json.loads(s)
-            except Exception:
-                pass
-            # 2) repair strings/newlines/brackets
-            fixed = _fix_json_unterminated_and_newlines(s)
-            try:
-                return json.loads(fixed)
-            except Exception:
-                pass
-            # 3) extract first plausible JSON array
-            m = re.search(r'(\[.*\])', fixed, flags=re.DOTALL)
-            if m:
-                try:
-                    return json.loads(m.group(1))
-                except Exception:
-                    pass
-            # 4) last resort: extract from first '{' or '[' and retry
-            m2 = re.search(r'([\[\{].*)', fixed, flags=re.DOTALL)
-            if m2:
-                try:
-                    return json.loads(m2.group(1))
-                except Exception:
-                    pass
-            raise ValueError("could not parse JSON")
-
-        data = _json_loads_any(raw)
-
-        # Normalize: ensure we return a list of objects
-        if isinstance(data, dict):
-            # some models return an object keyed like {"results":[...]} or a single item
-            if "results" in data and isinstance(data["results"], list):
-                items = data["results"]
-            else:
-                items = [data]
-        elif isinstance(data, list):
-            items = data
-        else:
-            raise ValueError("parsed JSON is neither list nor dict")
-
-        # Schema defaults
-        def _norm_contact(x):
-            x = x if isinstance(x, dict) else {}
-            return {
-                "website": x.get("website", ""),
-                "phone": x.get("phone", ""),
-                "email": x.get("email", "")
-            }
-
-        def _as_list(v):
-            if v is None:
-                return []
-            if isinstance(v, list):
-                # cast all to strings
-                return [str(i) for i in v]
-            return [str(v)]
-
-        normalized: List[Dict[str, Any]] = []
-        for it in items:
-            if not isinstance(it, dict):
-                # skip non-dict entries
-                continue
-
-            # pull + coerce fields
-            _id = str(it.get("id", ""))
-            name = str(it.get("name", "")).strip()
-            _type = str(it.get("type", "")).strip()  # program | job | funding
-            description = str(it.get("description", "")).strip()
-            eligibility = _as_list(it.get("eligibility"))
-            benefits = str(it.get("benefits", "")).strip()
-            application_steps = _as_list(it.get("applicationSteps"))
-            contact_info = _norm_contact(it.get("contactInfo", {}))
-            location = str(it.get("location", "")).strip()
-
-            # relevanceScore → int 0..100 (clamp)
-            rs = it.get("relevanceScore", 0)
-            try:
-                rs = int(float(rs))
-            except Exception:
-                rs = 0
-            rs = max(0, min(100, rs))
-
-            normalized.append({
-                "id": _id or str(len(normalized) + 1),
-                "name": name,
-                "type": _type,
-                "description": description,
-                "eligibility": eligibility,
-                "benefits": benefits,
-                "applicationSteps": application_steps,
-                "contactInfo": contact_info,
-                "relevanceScore": rs,
-                "location": location
-            })
-
-        # If nothing valid parsed, log and fall back to []
-        if not normalized:
-            raise ValueError("no valid items after normalization")
-
-        return normalized
-
-    except Exception as e:
-        print(f"Parsing failed: {e}")
-        try:
-            print("---- RAW CONTENT BEGIN ----")
-            print(llm_response["choices"][0]["message"]["content"])
-            print("---- RAW CONTENT END ----")
-            with open("last_llm_raw.txt", "w", encoding="utf-8") as f:
-                f.write(llm_response["choices"][0]["message"]["content"])
-        except Exception:
-            pass
-        # Return empty list for downstream safety
-        return []
-
-
-# ---------------- FastAPI Service ----------------
-
-app = FastAPI(title="LLM Recommendation Service")
-
-# Allow all origins/methods/headers for dev
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],          # allow any origin for development
-    allow_origin_regex=None,
-    allow_credentials=False,        # keep False when using "*"
-    allow_methods=["*"],           # allow all methods including OPTIONS
-    allow_headers=["*"]            # allow all headers
-)
-
-# Explicit preflight handler for /recommend to be extra safe
-@app.options("/recommend")
-async def cors_preflight():
-    return JSONResponse(
-        content={},
-        headers={
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Methods": "POST, OPTIONS",
-            "Access-Control-Allow-Headers": "*",
-            "Vary": "Origin",
-        },
-    )
-
-# Build a reusable scorer instance for the service from environment variables
-import os as _os_for_service
-import types as _types_for_service
-_PROVIDER = _os_for_service.getenv("LLM_PROVIDER", "openai4")
-_INSECURE = _os_for_service.getenv("SSL_INSECURE", "0") == "1"
-_CA_BUNDLE = _os_for_service.getenv("SSL_CA_BUNDLE", None)
-
-try:
-    import api_key as _api_key_service
-    _api_key_val = _api_key_service.get_api_key(_PROVIDER)
-except Exception:
-    _api_key_val = None
-
-_scorer_service = None
-if _api_key_val:
-    _scorer_service = LLMScorerWithExcel(api_key=_api_key_val, provider=_PROVIDER)
-    # bind top-level funcs as methods
-    _scorer_service.create_prompt = create_prompt.__get__(_scorer_service)
-    _scorer_service.parse_response = parse_response.__get__(_scorer_service)
-    _scorer_service.call_llm = _types_for_service.MethodType(call_llm, _scorer_service)
-    _scorer_service._call_openai_compatible = _types_for_service.MethodType(_call_openai_compatible, _scorer_service)
-    _scorer_service._call_grok = _types_for_service.MethodType(_call_grok, _scorer_service)
-    _scorer_service._call_claude = _types_for_service.MethodType(_call_claude, _scorer_service)
-    _scorer_service._call_qwen = _types_for_service.MethodType(_call_qwen, _scorer_service)
-    _scorer_service._call_gemini = _types_for_service.MethodType(_call_gemini, _scorer_service)
-    # SSL context for service
-    _scorer_service._ssl_context = _build_ssl_context(_INSECURE, _CA_BUNDLE)
-
-@app.post("/recommend")
-async def recommend(profile: Dict[str, Any]):
-    if _scorer_service is None:
-        return JSONResponse(status_code=500, content={"error": "Service not configured: missing API key"})
-    prompt = _scorer_service.create_prompt(profile)
-    llm_resp = await _scorer_service.call_llm(prompt)
-    recs = _scorer_service.parse_response(llm_resp)
-    return JSONResponse(content=recs)
+        import api_key as _api_key_mod
+        key = _api_key_mod.get_api_key(provider)
+    except Exception:
+        key = ""
+    if key:
+        return key
+    config = LLMScorerWithExcel.LLM_CONFIGS.get(provider) or {}
+    if config.get("api_key_env"):
+        key = os.getenv(config["api_key_env"], "")
+    return key or config.get("api_key", "")
+
+
+def __getattr__(name):
+    # `uvicorn back:app` 仍然可用：只有真正访问 app 时才加载 FastAPI 服务（CLI 不需要）
+    if name == "app":
+        from service import app
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 if __name__ == "__main__":
     import argparse
-    import os
-    import json
-    import types
-    import asyncio
-    import api_key as _api_key_mod
+
+    import batch as _batch
+    from rate_limit import ProviderLimiter
+    from transport import close_http_sessions
 
     parser = argparse.ArgumentParser(description="LLM scoring with Excel/profile")
-    parser.add_argument("--profile", required=True, help="Path to user profile JSON")
-    parser.add_argument("--excel", default=None, help="Optional Excel file to load jobs")
+    parser.add_argument("--profile", default=None, help="Path to user profile JSON")
+    parser.add_argument("--batch", default=None,
+                        help="Path to a JSONL file of profiles (one per line) for bulk scoring")
+    parser.add_argument("--batch-out", default="batch_results.jsonl",
+                        help="JSONL output for --batch; also used as the resume checkpoint")
+    parser.add_argument("--concurrency", type=int, default=8, help="Max in-flight LLM calls in --batch mode")
+    parser.add_argument("--rpm", type=float, default=0, help="Provider requests per minute limit (0 = unlimited)")
+    parser.add_argument("--no-resume", action="store_true",
+                        help="Start --batch from scratch instead of skipping lines already in --batch-out")
+    parser.add_argument("--batch-api", action="store_true",
+                        help="Use the provider's offline batch API for --batch (OpenAI/Anthropic-style; cheaper, slower)")
+    parser.add_argument("--batch-state", default=None,
+                        help="Job state file for --batch-api (default: <batch-out>.batch.json)")
+    parser.add_argument("--batch-chunk", type=int, default=5000, help="Requests per submitted batch job")
+    parser.add_argument("--poll-interval", type=float, default=10.0, help="Initial --batch-api poll interval (s)")
+    parser.add_argument("--poll-max", type=float, default=300.0, help="Poll backoff cap (s)")
+    parser.add_argument("--batch-wait", type=float, default=None,
+                        help="Stop polling after this many seconds; rerun later to collect (default: wait)")
+    parser.add_argument("--excel", default=None, help="Optional Excel/CSV file of opportunities to match against")
+    parser.add_argument("--top-k", type=int, default=8, help="Catalog candidates injected per profile with --excel")
     parser.add_argument("--provider", default="openai4",
-                        choices=["deepseek","openai4","openai5","qwen","claude","grok","gemini"],
-                        help="LLM provider (default: openai4)")
+                        choices=sorted(LLMScorerWithExcel.LLM_CONFIGS),
+                        help="LLM provider (default: openai4); more can be added via LLM_PROVIDER_CONFIG")
     parser.add_argument("--out", default="recommendations.json", help="Output JSON file")
+    parser.add_argument("--no-structured", action="store_true",
+                        help="Do not send the recommendation schema; rely on tolerant parsing only")
     parser.add_argument("--insecure", action="store_true",
                         help="Disable SSL certificate verification (debug only)")
     parser.add_argument("--ca-bundle", default=None,
                         help="Path to a custom CA bundle (PEM). If not set, will try certifi.")
     args = parser.parse_args()
+    if not args.profile and not args.batch:
+        parser.error("one of --profile or --batch is required")
 
-    # 取 API Key（你已有 api_key.get_api_key(provider)）
-    api_key_val = _api_key_mod.get_api_key(args.provider)
+    # 取 API Key（api_key.get_api_key(provider)，或 provider 配置里的 api_key_env/api_key）
+    api_key_val = provider_api_key(args.provider)
     if not api_key_val:
         raise ValueError(f"API key for provider '{args.provider}' not set in environment variables or api_key module.")
 
-    # 初始化 scorer
-    scorer = LLMScorerWithExcel(api_key=api_key_val, provider=args.provider)
+    # 初始化 scorer（SSL context 在第一次连接时才建立）
+    scorer = LLMScorerWithExcel(api_key=api_key_val, provider=args.provider,
+                                ssl_options=(args.insecure, args.ca_bundle))
+    if args.no_structured:
+        scorer.structured = None
+    scorer._rate_limiter = ProviderLimiter(args.provider, rpm=args.rpm, max_concurrency=args.concurrency,
+                                           max_wait=float("inf"))
 
-    # 将顶层函数绑定为实例方法（因为你现在的 create_prompt/parse_response 定义在类外）
-    scorer.create_prompt = types.MethodType(create_prompt, scorer)
-    scorer.parse_response = types.MethodType(parse_response, scorer)
+    # （可选）加载 Excel/CSV 机会目录：每个画像检索 top-k 候选项注入 prompt
+    if args.excel:
+        try:
+            jobs = scorer.load_jobs_from_excel(args.excel, top_k=args.top_k)
+            print(f"[Info] Loaded {len(jobs)} jobs from {args.excel}")
+        except Exception as e:
+            print(f"[Warn] Failed to load Excel '{args.excel}': {e}")
+
+    if args.batch and args.batch_api:
+        # provider batch API：提交离线任务，轮询到完成后经 parse_response 写出；状态落盘可续跑
+        import batch_api as _batch_api
+
+        async def _run_batch_api():
+            try:
+                return await _batch_api.run_provider_batch(
+                    scorer, args.batch, args.batch_out, resume=not args.no_resume, state_path=args.batch_state,
+                    chunk_size=args.batch_chunk, poll_interval=args.poll_interval, poll_max=args.poll_max,
+                    max_wait=args.batch_wait)
+            finally:
+                await close_http_sessions()
+
+        stats = asyncio.run(_run_batch_api())
+        print(f"[OK] Batch API: {stats['ok']} ok, {stats['failed']} failed, {stats['skipped']} skipped, "
+              f"{stats['submitted']} submitted in {stats['jobs']} job(s), {stats['pending_jobs']} job(s) still pending")
+        raise SystemExit(0)
+
+    if args.batch:
+        # 批量模式：逐行读取画像，有界并发，结果逐行写出
+        async def _score(profile):
+            recs = scorer.parse_response(await scorer.call_llm(scorer.create_prompt(profile)))
+            if not recs:
+                raise ValueError("empty or unparseable LLM response")
+            return rerank(recs, profile)
+
+        async def _run_batch():
+            try:
+                return await _batch.run_batch_file(args.batch, args.batch_out, _score,
+                                                   concurrency=args.concurrency, resume=not args.no_resume)
+            finally:
+                await close_http_sessions()
 
-    # 绑定顶层的异步调用方法到实例（这些函数当前定义在类外）
-    scorer.call_llm = types.MethodType(call_llm, scorer)
-    scorer._call_openai_compatible = types.MethodType(_call_openai_compatible, scorer)
-    scorer._call_grok = types.MethodType(_call_grok, scorer)
-    scorer._call_claude = types.MethodType(_call_claude, scorer)
-    scorer._call_qwen = types.MethodType(_call_qwen, scorer)
-    scorer._call_gemini = types.MethodType(_call_gemini, scorer)
+        stats = asyncio.run(_run_batch())
+        print(f"[OK] Batch done: {stats['ok']} ok, {stats['failed']} failed, "
+              f"{stats['skipped']} skipped (already in {args.batch_out})")
+        raise SystemExit(0)
 
-    # Build SSL context
-    ssl_ctx = _build_ssl_context(args.insecure, args.ca_bundle)
-    scorer._ssl_context = ssl_ctx
     # 读取用户画像
     with open(args.profile, "r", encoding="utf-8") as f:
         profile = json.load(f)
 
-    # （可选）加载 Excel 工作岗位数据，目前未合入 prompt，仅作为扩展预留
-    # if args.excel:
-    #     try:
-    #         jobs = scorer.load_jobs_from_excel(args.excel)
-    #         print(f"[Info] Loaded {len(jobs)} jobs from {args.excel}")
-    #     except Exception as e:
-    #         print(f"[Warn] Failed to load Excel '{args.excel}': {e}")
-
     # 组装提示词并请求 LLM
     prompt = scorer.create_prompt(profile)
-    llm_resp = asyncio.run(scorer.call_llm(prompt))
 
-    # 解析 LLM 返回为结构化结果
-    recs = scorer.parse_response(llm_resp)
+    async def _run_once():
+        try:
+            return await scorer.call_llm(prompt)
+        finally:
+            await close_http_sessions()
+
+    llm_resp = asyncio.run(_run_once())
+
+    # 解析 LLM 返回为结构化结果，再按画像本地重排
+    recs = rerank(scorer.parse_response(llm_resp), profile)
 
     # 保存输出
     with open(args.out, "w", encoding="utf-8") as f:
@@ -0,0 +1,164 @@
+"""
+批量推荐：有界并发地处理 JSONL 画像流，结果以 JSONL 流式输出；输出文件兼作断点
+"""
+import asyncio
+import json
+import os
+import tempfile
+from typing import IO, Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, Set, Tuple
+
+Worker = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+
+def _iter_lines(lines, skip: Set[int] = frozenset()) -> Iterator[Tuple[int, Any]]:
+    for idx, line in enumerate(lines):
+        if idx in skip or not line.strip():
+            continue
+        try:
+            yield idx, json.loads(line)
+        except ValueError as e:
+            yield idx, ValueError(f"invalid JSON on line {idx + 1}: {e}")
+
+
+def iter_jsonl_profiles(path: str, skip: Set[int] = frozenset()) -> Iterator[Tuple[int, Any]]:
+    """Yield ``(line_index, profile)`` from a JSONL file, one line at a time.
+
+    Blank lines keep their index so that indices stay stable across resumes.
+    Lines that are not valid JSON are yielded as ``ValueError`` instances.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        yield from _iter_lines(f, skip)
+
+
+async def spool_body(chunks: AsyncIterator[bytes], max_memory: int = 1 << 20) -> IO[bytes]:
+    """Read a whole HTTP request body into a temp file (in memory up to ``max_memory``, then on disk).
+
+    Must run before the response starts: once a ``StreamingResponse`` is
+    running, Starlette's disconnect listener consumes the remaining body
+    messages and ``request.stream()`` inside the generator sees nothing.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=max_memory)
+    try:
+        async for chunk in chunks:
+            spool.write(chunk)
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+
+def iter_ndjson_file(spool: IO[bytes]) -> Iterator[Tuple[int, Any]]:
+    """Same as ``iter_jsonl_profiles`` over a spooled NDJSON body; closes it when done."""
+    with spool:
+        yield from _iter_lines(spool)
+
+
+def completed_indices(out_path: str) -> Tuple[Set[int], int]:
+    """Indices already present in a previous output file (the resume checkpoint).
+
+    Also returns the byte offset just past the last complete line: a partially
+    written last line from a crash is truncated away and its item redone.
+    """
+    done: Set[int] = set()
+    good_size = 0
+    if not os.path.exists(out_path):
+        return done, good_size
+    with open(out_path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                break
+            good_size += len(line)
+            if isinstance(rec, dict) and isinstance(rec.get("index"), int):
+                done.add(rec["index"])
+    return done, good_size
+
+
+async def _aiter(items) -> AsyncIterator:
+    if hasattr(items, "__aiter__"):
+        async for it in items:
+            yield it
+    else:
+        for it in items:
+            yield it
+
+
+async def run_bounded(items, worker: Worker, concurrency: int = 8) -> AsyncIterator[Dict[str, Any]]:
+    """Run ``worker`` over ``(index, profile)`` pairs with at most ``concurrency`` in flight.
+
+    Results are yielded in completion order as ``{"index", "recommendations"}``
+    or ``{"index", "error"}``. Input is pulled lazily, so memory stays bounded
+    by the concurrency limit regardless of input size.
+    """
+    concurrency = max(1, concurrency)
+    sem = asyncio.Semaphore(concurrency)
+    results: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+    tasks: Set[asyncio.Task] = set()
+    _DONE = object()
+
+    async def _one(idx: int, profile: Any):
+        try:
+            if isinstance(profile, Exception):
+                raise profile
+            recs = await worker(profile)
+            res = {"index": idx, "recommendations": recs}
+        except Exception as e:
+            res = {"index": idx, "error": str(e) or type(e).__name__}
+        try:
+            await results.put(res)
+        finally:
+            sem.release()
+
+    async def _produce():
+        try:
+            async for idx, profile in _aiter(items):
+                # 先占并发名额再读下一条，保证内存不随输入增长
+                await sem.acquire()
+                task = asyncio.ensure_future(_one(idx, profile))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*list(tasks))
+        except Exception:
+            # 读取输入出错：先让消费者退出，再由 await producer 抛出原异常
+            await results.put(_DONE)
+            raise
+        await results.put(_DONE)
+
+    producer = asyncio.ensure_future(_produce())
+    try:
+        while True:
+            res = await results.get()
+            if res is _DONE:
+                break
+            yield res
+        await producer
+    finally:
+        producer.cancel()
+        for task in list(tasks):
+            task.cancel()
+
+
+async def run_batch_file(in_path: str, out_path: str, worker: Worker,
+                         concurrency: int = 8, resume: bool = True) -> Dict[str, int]:
+    """CLI driver: stream ``in_path`` through ``worker`` and append results to ``out_path``."""
+    skip: Set[int] = set()
+    if resume:
+        skip, good_size = completed_indices(out_path)
+        if os.path.exists(out_path):
+            os.truncate(out_path, good_size)
+    stats = {"skipped": len(skip), "ok": 0, "failed": 0}
+    with open(out_path, "a" if resume else "w", encoding="utf-8") as out:
+        async for res in run_bounded(iter_jsonl_profiles(in_path, skip), worker, concurrency):
+            out.write(json.dumps(res, ensure_ascii=False) + "\n")
+            # 每条都 flush，崩溃后最多丢失正在处理的几条
+            out.flush()
+            if "error" in res:
+                stats["failed"] += 1
+            else:
+                stats["ok"] += 1
+    return stats
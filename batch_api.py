@@ -0,0 +1,209 @@
+"""
+Provider batch API 模式（夜间离线重算）：把画像 prompt 写成 provider 的 batch JSONL（OpenAI Files+Batches、
+Anthropic Message Batches），提交后按指数退避轮询，结果逐行经 parse_response 写入输出 JSONL。
+
+任务状态落盘（默认 <batch-out>.batch.json）：中断后重跑会继续轮询已提交的任务、只补交还没提交的画像，
+已写出的结果不会重复。
+
+    python back.py --provider openai4 --batch profiles.jsonl --batch-api --batch-out nightly.jsonl
+"""
+import asyncio
+import json
+import os
+import random
+import time
+from typing import Any, Dict, List, Optional, Set
+
+from batch import completed_indices, iter_jsonl_profiles
+
+
+def _custom_id(index: int) -> str:
+    return f"line-{index}"
+
+
+def _line_index(custom_id: str) -> Optional[int]:
+    try:
+        return int(str(custom_id).rsplit("-", 1)[1])
+    except (IndexError, ValueError):
+        return None
+
+
+def load_state(path: str) -> Optional[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_state(path: str, state: Dict[str, Any]):
+    """Atomic write: a crash never leaves a half-written state file behind."""
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class ProviderBatchRunner:
+    """Submit, poll and collect provider batch jobs for one scorer.
+
+    ``scorer`` supplies ``create_prompt``, ``parse_response``, ``budget`` and
+    an ``adapter`` implementing the batch hooks in providers.py.
+    """
+
+    def __init__(self, scorer, in_path: str, out_path: str, state_path: Optional[str] = None,
+                 chunk_size: int = 5000, poll_interval: float = 10.0, poll_max: float = 300.0,
+                 max_wait: Optional[float] = None):
+        if not scorer.adapter.supports_batch:
+            raise ValueError(f"provider '{scorer.provider}' has no batch API (adapter '{scorer.adapter.name}')")
+        self.scorer = scorer
+        self.in_path = in_path
+        self.out_path = out_path
+        self.state_path = state_path or out_path + ".batch.json"
+        self.chunk_size = max(1, chunk_size)
+        self.poll_interval = poll_interval
+        self.poll_max = max(poll_interval, poll_max)
+        self.max_wait = max_wait
+        self.state: Dict[str, Any] = {}
+        self.done: Set[int] = set()
+        self.stats = {"skipped": 0, "ok": 0, "failed": 0, "submitted": 0, "jobs": 0, "pending_jobs": 0,
+                      "prompt_tokens": 0, "completion_tokens": 0}
+
+    # ---------- state ----------
+    def _load(self, resume: bool):
+        state = load_state(self.state_path) if resume else None
+        source = os.path.abspath(self.in_path)
+        if state is not None and (state.get("provider"), state.get("input")) != (self.scorer.provider, source):
+            raise ValueError(f"{self.state_path} belongs to provider={state.get('provider')} "
+                             f"input={state.get('input')}; use another --batch-out or --no-resume")
+        self.state = state or {"provider": self.scorer.provider, "model": self.scorer.model,
+                               "input": source, "jobs": []}
+        if resume:
+            self.done, good_size = completed_indices(self.out_path)
+            if os.path.exists(self.out_path):
+                os.truncate(self.out_path, good_size)
+        self.stats["skipped"] = len(self.done)
+
+    def _active(self) -> List[Dict[str, Any]]:
+        return [job for job in self.state["jobs"] if not job.get("collected")]
+
+    def _write(self, out, res: Dict[str, Any]):
+        out.write(json.dumps(res, ensure_ascii=False) + "\n")
+        out.flush()
+        self.done.add(res["index"])
+        self.stats["failed" if "error" in res else "ok"] += 1
+
+    # ---------- submit ----------
+    async def _submit(self, spool: str, indices: List[int]):
+        batch_id = await self.scorer.adapter.batch_submit(spool)
+        self.state["jobs"].append({"id": batch_id, "indices": indices, "spool": spool, "status": "submitted",
+                                   "submitted_at": time.time()})
+        # 提交成功就立刻落盘，重跑时不会再次提交同一批
+        save_state(self.state_path, self.state)
+        self.stats["submitted"] += len(indices)
+        self.stats["jobs"] += 1
+        print(f"[BATCH] submitted {batch_id} with {len(indices)} request(s)")
+
+    async def submit_pending(self, out):
+        """Turn every profile that is neither written nor in an active job into batch requests."""
+        in_flight = {i for job in self._active() for i in job["indices"]}
+        max_tokens = self.scorer.budget.max_tokens(self.scorer.target_items)
+        spool_no = len(self.state["jobs"])
+        spool_path = ""
+        spool = None
+        indices: List[int] = []
+        try:
+            for idx, profile in iter_jsonl_profiles(self.in_path, self.done | in_flight):
+                if isinstance(profile, Exception):
+                    self._write(out, {"index": idx, "error": str(profile)})
+                    continue
+                if spool is None:
+                    spool_path = f"{self.state_path}.{spool_no}.jsonl"
+                    spool = open(spool_path, "w", encoding="utf-8")
+                line = self.scorer.adapter.batch_request(_custom_id(idx), self.scorer.create_prompt(profile),
+                                                         max_tokens)
+                spool.write(json.dumps(line, ensure_ascii=False) + "\n")
+                indices.append(idx)
+                if len(indices) >= self.chunk_size:
+                    spool.close()
+                    spool = None
+                    await self._submit(spool_path, indices)
+                    spool_no += 1
+                    indices = []
+            if spool is not None:
+                spool.close()
+                spool = None
+                await self._submit(spool_path, indices)
+        finally:
+            if spool is not None:
+                spool.close()
+
+    # ---------- poll + collect ----------
+    async def _collect(self, job: Dict[str, Any], info: Dict[str, Any], out):
+        adapter = self.scorer.adapter
+        seen: Set[int] = set()
+        async for custom_id, raw, error in adapter.batch_results(job["id"], info):
+            idx = _line_index(custom_id)
+            if idx is None or idx in seen or idx in self.done:
+                continue
+            seen.add(idx)
+            if raw is None:
+                self._write(out, {"index": idx, "error": error or "batch request failed"})
+                continue
+            unified = adapter.unify(raw)
+            self.stats["prompt_tokens"] += unified["usage"].get("prompt_tokens", 0)
+            self.stats["completion_tokens"] += unified["usage"].get("completion_tokens", 0)
+            recs = self.scorer.parse_response(unified)
+            if recs:
+                self._write(out, {"index": idx, "recommendations": recs})
+            else:
+                self._write(out, {"index": idx, "error": "empty or unparseable LLM response"})
+        for idx in job["indices"]:
+            if idx not in self.done:
+                self._write(out, {"index": idx, "error": f"missing from batch output (status {job['status']})"})
+        job["collected"] = True
+        save_state(self.state_path, self.state)
+        if job.get("spool") and os.path.exists(job["spool"]):
+            os.remove(job["spool"])
+        print(f"[BATCH] collected {job['id']} ({len(seen)} result(s), status {job['status']})")
+
+    async def poll(self, out):
+        """Poll active jobs with exponential backoff until collected or ``max_wait`` elapses."""
+        deadline = time.monotonic() + self.max_wait if self.max_wait is not None else None
+        delay = self.poll_interval
+        while True:
+            for job in self._active():
+                try:
+                    state, info = await self.scorer.adapter.batch_status(job["id"])
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    # 轮询失败（网络抖动等）不影响任务本身，下一轮再查
+                    print(f"[BATCH] status check for {job['id']} failed: {e}")
+                    continue
+                job["status"] = info.get("status") or info.get("processing_status") or state
+                if state in ("done", "failed"):
+                    await self._collect(job, info, out)
+            active = self._active()
+            if not active:
+                break
+            if deadline is not None and time.monotonic() + delay > deadline:
+                # 留给下次运行继续轮询
+                save_state(self.state_path, self.state)
+                break
+            await asyncio.sleep(delay * random.uniform(0.8, 1.2))
+            delay = min(self.poll_max, delay * 1.5)
+        self.stats["pending_jobs"] = len(self._active())
+
+    async def run(self, resume: bool = True) -> Dict[str, int]:
+        self._load(resume)
+        with open(self.out_path, "a" if resume else "w", encoding="utf-8") as out:
+            await self.submit_pending(out)
+            await self.poll(out)
+        return self.stats
+
+
+async def run_provider_batch(scorer, in_path: str, out_path: str, resume: bool = True, **options) -> Dict[str, int]:
+    """CLI driver: the provider-batch counterpart of ``batch.run_batch_file``."""
+    return await ProviderBatchRunner(scorer, in_path, out_path, **options).run(resume=resume)
@@ -0,0 +1,119 @@
+"""
+provider batch API 模式的端到端检查：本地 mock 充当 OpenAI Files+Batches / Anthropic Message Batches，
+先提交后“中断”（--batch-wait 0 的效果），再续跑收取结果，最后确认每条画像恰好写出一次、没有重复提交。
+
+    python bench/bench_batch_api.py --providers openai4,claude --profiles 500 --chunk 200
+    python bench/bench_batch_api.py --error-rate 0.05 --malformed-rate 0.1 --json-out batch.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Dict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_load import DEFAULT_PROFILE, make_profiles  # noqa: E402
+from mock_providers import PROVIDER_PATHS, MockConfig, start_mock  # noqa: E402
+
+
+async def run_provider(provider: str, mock_base: str, mock, args, workdir: str) -> Dict[str, Any]:
+    import back
+    import batch_api
+
+    scorer = back.LLMScorerWithExcel(api_key="mock-key", provider=provider)
+    scorer.api_url = mock_base + PROVIDER_PATHS[provider]
+    with open(args.profile, "r", encoding="utf-8") as f:
+        base = json.load(f)
+    in_path = os.path.join(workdir, f"{provider}-profiles.jsonl")
+    out_path = os.path.join(workdir, f"{provider}-results.jsonl")
+    with open(in_path, "w", encoding="utf-8") as f:
+        for profile in make_profiles(base, args.profiles, 1.0):
+            f.write(json.dumps(profile, ensure_ascii=False) + "\n")
+
+    options = dict(chunk_size=args.chunk, poll_interval=args.poll_interval, poll_max=args.poll_interval * 4)
+    batches_before = mock.stats["batches"]
+    started = time.perf_counter()
+    # 1) 提交后立即返回，模拟进程在轮询期间被中断
+    first = await batch_api.run_provider_batch(scorer, in_path, out_path, max_wait=0, **options)
+    # 2) 续跑：只轮询/收取已提交的任务，不应再提交
+    second = await batch_api.run_provider_batch(scorer, in_path, out_path, **options)
+    elapsed = time.perf_counter() - started
+    # 3) 再跑一次：全部跳过
+    third = await batch_api.run_provider_batch(scorer, in_path, out_path, **options)
+
+    indices = []
+    with open(out_path, "r", encoding="utf-8") as f:
+        for line in f:
+            indices.append(json.loads(line)["index"])
+    problems = []
+    if sorted(indices) != list(range(args.profiles)):
+        problems.append(f"{len(indices)} result lines, {len(set(indices))} distinct for {args.profiles} profiles")
+    if second["submitted"] or third["submitted"]:
+        problems.append("resumed run resubmitted requests")
+    if mock.stats["batches"] - batches_before != first["jobs"]:
+        problems.append("mock saw more batches than the first run submitted")
+    return {
+        "provider": provider,
+        "profiles": args.profiles,
+        "jobs": first["jobs"],
+        "pending_after_interrupt": first["pending_jobs"],
+        "ok": second["ok"],
+        "failed": second["failed"],
+        "skipped_on_rerun": third["skipped"],
+        "prompt_tokens": second["prompt_tokens"],
+        "completion_tokens": second["completion_tokens"],
+        "elapsed_s": round(elapsed, 2),
+        "profiles_per_s": round(args.profiles / elapsed, 1) if elapsed else 0.0,
+        "problems": problems,
+    }
+
+
+async def run(args) -> Dict[str, Any]:
+    from transport import close_http_sessions
+
+    mock_runner, mock_base, mock = await start_mock(MockConfig.from_args(args))
+    report: Dict[str, Any] = {"providers": []}
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            for provider in [p.strip() for p in args.providers.split(",") if p.strip()]:
+                report["providers"].append(await run_provider(provider, mock_base, mock, args, workdir))
+    finally:
+        await close_http_sessions()
+        await mock_runner.cleanup()
+    report["mock"] = mock.stats
+    return report
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Provider batch-API mode against the local mock batch endpoints")
+    ap.add_argument("--providers", default="openai4,claude", help="providers with a batch-capable adapter")
+    ap.add_argument("--profiles", type=int, default=300)
+    ap.add_argument("--chunk", type=int, default=100, help="requests per submitted batch job")
+    ap.add_argument("--poll-interval", type=float, default=0.2)
+    ap.add_argument("--profile", default=DEFAULT_PROFILE, help="base profile JSON")
+    ap.add_argument("--json-out", default=None, help="also write the report as JSON")
+    MockConfig.add_arguments(ap)
+    ap.set_defaults(batch_ms=500.0, latency_ms=5.0)
+    args = ap.parse_args()
+
+    report = asyncio.run(run(args))
+    for rep in report["providers"]:
+        print(json.dumps(rep, ensure_ascii=False))
+    print("mock " + json.dumps(report["mock"]))
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    problems = [f"{r['provider']}: {p}" for r in report["providers"] for p in r["problems"]]
+    if problems:
+        print("[FAIL] " + "; ".join(problems))
+        sys.exit(1)
+    print("[OK]")
+
+
+if __name__ == "__main__":
+    main()
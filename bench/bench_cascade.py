@@ -0,0 +1,175 @@
+"""
+成本/质量级联的对比基准：两个本地 mock 分别充当便宜快速的模型和强模型（各自的延迟与畸形输出比例），
+同一批 prompt 分别只走强模型、走级联，报告 p50/p95 延迟、升级率、各档 token 与估算费用，以及最终结果的质量检查。
+
+    python bench/bench_cascade.py --requests 200 --cheap-latency-ms 300 --strong-latency-ms 900
+    python bench/bench_cascade.py --cheap-malformed-rate 0.3 --max-escalation-rate 0.4 --json-out cascade.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+os.environ["LLM_JOURNAL"] = ""
+
+from bench_load import percentile  # noqa: E402
+from mock_providers import PROVIDER_PATHS, MockConfig, start_mock  # noqa: E402
+
+# 估算费用用的标价（美元 / 百万 token，输入/输出），可用 --price 覆盖
+DEFAULT_PRICES = {"deepseek": (0.27, 1.10), "qwen": (0.40, 1.20), "gemini": (0.30, 2.50),
+                  "openai4": (2.00, 8.00), "claude": (3.00, 15.00), "grok": (3.00, 15.00)}
+
+
+def _scorer(provider: str, base: str, tokens: Dict[str, List[int]]):
+    from back import LLMScorerWithExcel
+
+    scorer = LLMScorerWithExcel(api_key="mock-key", provider=provider)
+    scorer.api_url = base + PROVIDER_PATHS[provider]
+    call_llm = scorer.call_llm
+
+    async def counted(prompt: str):
+        result = await call_llm(prompt)
+        usage = result.get("usage") or {}
+        tally = tokens.setdefault(provider, [0, 0])
+        tally[0] += usage.get("prompt_tokens", 0)
+        tally[1] += usage.get("completion_tokens", 0)
+        return result
+
+    scorer.call_llm = counted
+    return scorer
+
+
+async def _drive(engine, prompts: List[str], concurrency: int) -> Dict[str, Any]:
+    from cascade import QualityGate
+
+    gate = QualityGate()
+    sem = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    served: Dict[str, int] = {}
+    quality = {"failed": 0, "errors": 0, "items": 0, "completeness": 0.0}
+
+    async def one(prompt: str):
+        async with sem:
+            started = time.perf_counter()
+            try:
+                recs, provider = await engine.run(prompt)
+            except Exception:
+                quality["errors"] += 1
+                return
+            latencies.append(time.perf_counter() - started)
+            served[provider] = served.get(provider, 0) + 1
+            # 最终结果按同一套检查打分（解码路径不计，只看内容）
+            quality["failed"] += bool(gate.check(recs, None))
+            quality["items"] += len(recs)
+            quality["completeness"] += sum(gate.completeness(r) for r in recs) / max(1, len(recs))
+
+    await asyncio.gather(*(one(p) for p in prompts))
+    n = max(1, len(latencies))
+    return {
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "served": served,
+        "errors": quality["errors"],
+        "quality_failed": quality["failed"],
+        "avg_items": round(quality["items"] / n, 2),
+        "avg_completeness": round(quality["completeness"] / n, 3),
+    }
+
+
+def _cost(tokens: Dict[str, List[int]], prices: Dict[str, tuple]) -> float:
+    return round(sum(p * prices[prov][0] / 1e6 + c * prices[prov][1] / 1e6
+                     for prov, (p, c) in tokens.items()), 4)
+
+
+async def run(args, prices) -> Dict[str, Any]:
+    from cascade import CascadeExecutor, QualityGate
+    from llm_engine import HedgedExecutor
+    from transport import close_http_sessions
+
+    def cfg(latency_ms, malformed_rate, seed):
+        return MockConfig(latency_ms=latency_ms, latency_sigma=args.latency_sigma, malformed_rate=malformed_rate,
+                          error_rate=args.error_rate, items=args.items, seed=seed)
+
+    cheap_runner, cheap_base, cheap_mock = await start_mock(cfg(args.cheap_latency_ms, args.cheap_malformed_rate, 1))
+    strong_runner, strong_base, strong_mock = await start_mock(cfg(args.strong_latency_ms, args.strong_malformed_rate, 2))
+    prompts = [f"bench-cascade prompt {i}" for i in range(args.requests)]
+    report: Dict[str, Any] = {"requests": args.requests, "cheap": args.cheap, "strong": args.strong}
+    try:
+        tokens: Dict[str, List[int]] = {}
+        strong = HedgedExecutor([_scorer(args.strong, strong_base, tokens)], deadline=args.deadline)
+        report["strong_only"] = {**await _drive(strong, prompts, args.concurrency), "tokens": tokens,
+                                 "cost_usd": _cost(tokens, prices)}
+
+        tokens = {}
+        strong = HedgedExecutor([_scorer(args.strong, strong_base, tokens)], deadline=args.deadline)
+        cascade = CascadeExecutor([_scorer(args.cheap, cheap_base, tokens)], strong,
+                                  gate=QualityGate(min_items=args.items, min_spread=args.min_spread),
+                                  cheap_timeout=args.cheap_timeout)
+        report["cascade"] = {**await _drive(cascade, prompts, args.concurrency), "tokens": tokens,
+                             "cost_usd": _cost(tokens, prices)}
+        report["cascade"].update({k: v for k, v in cascade.snapshot().items()
+                                  if k in ("escalation_rate", "escalated", "fallback", "reasons")})
+    finally:
+        await close_http_sessions()
+        await cheap_runner.cleanup()
+        await strong_runner.cleanup()
+    report["mock"] = {"cheap": cheap_mock.stats, "strong": strong_mock.stats}
+    return report
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Cheap-first model cascade versus the strong model alone")
+    ap.add_argument("--cheap", default="deepseek", help="cheap tier provider (mock wire format)")
+    ap.add_argument("--strong", default="openai4", help="strong tier provider")
+    ap.add_argument("--requests", type=int, default=200)
+    ap.add_argument("--concurrency", type=int, default=32)
+    ap.add_argument("--items", type=int, default=3)
+    ap.add_argument("--cheap-latency-ms", type=float, default=300.0)
+    ap.add_argument("--strong-latency-ms", type=float, default=900.0)
+    ap.add_argument("--latency-sigma", type=float, default=0.3)
+    ap.add_argument("--cheap-malformed-rate", type=float, default=0.2,
+                    help="fraction of malformed cheap answers (repairable ones escalate, as do unparseable ones)")
+    ap.add_argument("--strong-malformed-rate", type=float, default=0.0)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--min-spread", type=int, default=5)
+    ap.add_argument("--cheap-timeout", type=float, default=15.0)
+    ap.add_argument("--deadline", type=float, default=60.0)
+    ap.add_argument("--price", action="append", default=[],
+                    help="provider=input,output USD per million tokens, e.g. deepseek=0.27,1.10")
+    ap.add_argument("--max-escalation-rate", type=float, default=None, help="fail above this escalation rate")
+    ap.add_argument("--json-out", default=None, help="also write the report as JSON")
+    args = ap.parse_args()
+
+    prices = dict(DEFAULT_PRICES)
+    for item in args.price:
+        name, _, values = item.partition("=")
+        prices[name] = tuple(float(v) for v in values.split(","))
+
+    report = asyncio.run(run(args, prices))
+    for key, value in report.items():
+        print(f"{key:<12} {json.dumps(value) if isinstance(value, (dict, list)) else value}")
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    strong, cascade = report["strong_only"], report["cascade"]
+    print(f"median {strong['p50_ms']} -> {cascade['p50_ms']} ms, cost ${strong['cost_usd']} -> "
+          f"${cascade['cost_usd']}, escalation rate {cascade['escalation_rate']:.1%}")
+    failures = []
+    if cascade["quality_failed"] > strong["quality_failed"] or cascade["errors"] > strong["errors"]:
+        failures.append("cascade served lower-quality results than the strong model alone")
+    if args.max_escalation_rate is not None and cascade["escalation_rate"] > args.max_escalation_rate:
+        failures.append(f"escalation rate {cascade['escalation_rate']} > {args.max_escalation_rate}")
+    if failures:
+        print("[FAIL] " + "; ".join(failures))
+        sys.exit(1)
+    print("[OK]")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""
+端到端负载基准：启动本地 mock provider，把 service.py 的 FastAPI 服务指向它，并发打入画像，
+报告 p50/p95/p99 延迟、RPS 与内存；可设阈值作为性能回归门禁（超出则退出码 1）
+
+    python bench/bench_load.py --providers openai4 --requests 500 --concurrency 64 --latency-ms 300
+    python bench/bench_load.py --endpoint stream --providers claude,gemini --malformed-rate 0.2
+    python bench/bench_load.py --max-p95-ms 900 --min-rps 50 --json-out load.json
+"""
+import argparse
+import asyncio
+import copy
+import json
+import math
+import os
+import resource
+import socket
+import sys
+import time
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import aiohttp  # noqa: E402
+
+from mock_providers import PROVIDER_PATHS, MockConfig, start_mock  # noqa: E402
+
+DEFAULT_PROFILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "user.json")
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile; 0.0 for an empty list."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))
+    return ordered[idx]
+
+
+def rss_mb() -> Dict[str, float]:
+    """Current and peak resident set size of this process (service + driver share it)."""
+    current = peak = 0.0
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    current = int(line.split()[1]) / 1024
+                elif line.startswith("VmHWM:"):
+                    peak = int(line.split()[1]) / 1024
+    except OSError:
+        # macOS 等没有 /proc：ru_maxrss 单位是字节
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024)
+    return {"rss_mb": round(current, 1), "peak_rss_mb": round(peak, 1)}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def make_profiles(base: Dict[str, Any], n: int, unique: float) -> List[Dict[str, Any]]:
+    """``n`` profiles of which about ``unique * n`` are distinct (the rest repeat and hit the cache)."""
+    distinct = max(1, int(round(n * unique)))
+    variants = []
+    for i in range(distinct):
+        p = copy.deepcopy(base)
+        p.setdefault("personalInfo", {})["name"] = f"Bench User {i}"
+        variants.append(p)
+    return [variants[i % distinct] for i in range(n)]
+
+
+def load_service(providers: List[str], mock_base: str):
+    """Import the service configured for ``providers`` and point every scorer at the mock server."""
+    os.environ["LLM_PROVIDERS"] = ",".join(providers)
+    os.environ["LLM_PROVIDER"] = providers[0]
+    os.environ.setdefault("REC_CACHE_DB", "")
+    import api_key
+    for p in providers:
+        api_key.API_KEYS[p] = api_key.API_KEYS.get(p) or "mock-key"
+    import service
+    for scorer in service._service_scorers:
+        scorer.api_url = mock_base + PROVIDER_PATHS[scorer.provider]
+    return service
+
+
+async def _drive(url: str, endpoint: str, profiles: List[Dict[str, Any]], concurrency: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    first_item: List[float] = []
+    statuses: Dict[str, int] = {}
+    cache: Dict[str, int] = {}
+    sem = asyncio.Semaphore(concurrency)
+    target = url + ("/recommend/stream" if endpoint == "stream" else "/recommend")
+
+    async def one(session: aiohttp.ClientSession, profile: Dict[str, Any]):
+        async with sem:
+            started = time.perf_counter()
+            try:
+                async with session.post(target, json=profile) as resp:
+                    if endpoint == "stream":
+                        first = None
+                        async for line in resp.content:
+                            if first is None and line.strip():
+                                first = time.perf_counter() - started
+                        if first is not None:
+                            first_item.append(first)
+                    else:
+                        await resp.read()
+                    key = str(resp.status)
+                    x_cache = resp.headers.get("X-Cache")
+                    if x_cache:
+                        cache[x_cache] = cache.get(x_cache, 0) + 1
+            except Exception as e:
+                key = type(e).__name__
+            latencies.append(time.perf_counter() - started)
+            statuses[key] = statuses.get(key, 0) + 1
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = aiohttp.ClientTimeout(total=300)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one(session, p) for p in profiles))
+        elapsed = time.perf_counter() - t0
+    return {"latencies": latencies, "first_item": first_item, "statuses": statuses,
+            "cache": cache, "elapsed": elapsed}
+
+
+def _summary(label: str, values: List[float]) -> Dict[str, float]:
+    return {f"{label}_p50_ms": round(percentile(values, 0.50) * 1000, 1),
+            f"{label}_p95_ms": round(percentile(values, 0.95) * 1000, 1),
+            f"{label}_p99_ms": round(percentile(values, 0.99) * 1000, 1)}
+
+
+async def run(args) -> Dict[str, Any]:
+    import uvicorn
+
+    providers = [p.strip() for p in args.providers.split(",") if p.strip()]
+    unknown = [p for p in providers if p not in PROVIDER_PATHS]
+    if unknown:
+        raise SystemExit(f"no mock wire format for: {', '.join(unknown)}")
+
+    mem_before = rss_mb()
+    mock_runner, mock_base, mock = await start_mock(MockConfig.from_args(args))
+    if not args.similar_cache:
+        # 变体画像只差姓名，开着近似缓存时除第一条外全部命中，测不到上游路径
+        os.environ["SIMILAR_CACHE_SIZE"] = "0"
+    service = load_service(providers, mock_base)
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(service.app, host="127.0.0.1", port=port,
+                                           log_level="warning", access_log=False, lifespan="on"))
+    serve_task = asyncio.ensure_future(server.serve())
+    while not server.started:
+        if serve_task.done():
+            serve_task.result()
+        await asyncio.sleep(0.01)
+
+    with open(args.profile, "r", encoding="utf-8") as f:
+        base_profile = json.load(f)
+    url = f"http://127.0.0.1:{port}"
+    try:
+        if args.warmup:
+            await _drive(url, args.endpoint, make_profiles(base_profile, args.warmup, 1.0), args.concurrency)
+        # 正式画像带上 benchRun 标记，不会命中预热（或上一轮）留下的缓存
+        profiles = make_profiles({**base_profile, "benchRun": time.time()}, args.requests, args.unique)
+        res = await _drive(url, args.endpoint, profiles, args.concurrency)
+    finally:
+        server.should_exit = True
+        await serve_task
+        await mock_runner.cleanup()
+
+    ok = res["statuses"].get("200", 0)
+    report = {
+        "endpoint": args.endpoint,
+        "providers": providers,
+        "requests": len(res["latencies"]),
+        "concurrency": args.concurrency,
+        "ok": ok,
+        "statuses": res["statuses"],
+        "cache": res["cache"],
+        "rps": round(len(res["latencies"]) / res["elapsed"], 1) if res["elapsed"] else 0.0,
+        **_summary("latency", res["latencies"]),
+        "rss_mb_before": mem_before["rss_mb"],
+        **rss_mb(),
+        "mock": mock.stats,
+        "engine": service._engine.stats if service._engine else None,
+    }
+    if args.endpoint == "stream":
+        report.update(_summary("first_item", res["first_item"]))
+    return report
+
+
+def main():
+    ap = argparse.ArgumentParser(description="End-to-end /recommend load test against local mock providers")
+    ap.add_argument("--providers", default="openai4",
+                    help="comma-separated provider chain (LLM_PROVIDERS), e.g. openai4,claude,gemini")
+    ap.add_argument("--endpoint", choices=["recommend", "stream"], default="recommend")
+    ap.add_argument("--requests", type=int, default=200)
+    ap.add_argument("--concurrency", type=int, default=32)
+    ap.add_argument("--warmup", type=int, default=10, help="requests sent (and discarded) before measuring")
+    ap.add_argument("--unique", type=float, default=1.0,
+                    help="fraction of distinct profiles; lower values exercise the cache and single-flight")
+    ap.add_argument("--similar-cache", action="store_true",
+                    help="keep the near-duplicate profile cache on (distinct profiles differ only by name)")
+    ap.add_argument("--profile", default=DEFAULT_PROFILE, help="base profile JSON")
+    ap.add_argument("--json-out", default=None, help="also write the report as JSON")
+    ap.add_argument("--max-p95-ms", type=float, default=None, help="fail if p95 latency exceeds this")
+    ap.add_argument("--min-rps", type=float, default=None, help="fail if throughput is below this")
+    ap.add_argument("--max-error-rate", type=float, default=None, help="fail if non-200 share exceeds this")
+    MockConfig.add_arguments(ap)
+    args = ap.parse_args()
+
+    report = asyncio.run(run(args))
+    for key, value in report.items():
+        print(f"{key:22s} {json.dumps(value, ensure_ascii=False)}")
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    failures = []
+    if args.max_p95_ms is not None and report["latency_p95_ms"] > args.max_p95_ms:
+        failures.append(f"p95 {report['latency_p95_ms']}ms > {args.max_p95_ms}ms")
+    if args.min_rps is not None and report["rps"] < args.min_rps:
+        failures.append(f"rps {report['rps']} < {args.min_rps}")
+    error_rate = 1 - report["ok"] / max(1, report["requests"])
+    if args.max_error_rate is not None and error_rate > args.max_error_rate:
+        failures.append(f"error rate {error_rate:.3f} > {args.max_error_rate}")
+    if failures:
+        print("[FAIL] " + "; ".join(failures))
+        sys.exit(1)
+    print("[OK]")
+
+
+if __name__ == "__main__":
+    main()
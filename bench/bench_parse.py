@@ -0,0 +1,84 @@
+"""
+解析器基准：对 parse_corpus.jsonl 中的畸形 LLM 输出计时，并检查能恢复的条目数
+
+    python bench/bench_parse.py [--iterations 2000] [--stream-chunk 16]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from json_repair import IncrementalJSONParser, loads_tolerant  # noqa: E402
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "parse_corpus.jsonl")
+
+
+def _count_items(data) -> int:
+    if isinstance(data, dict):
+        for key in ("results", "recommendations"):
+            if isinstance(data.get(key), list):
+                data = data[key]
+                break
+        else:
+            data = [data]
+    return sum(1 for it in data if isinstance(it, dict))
+
+
+def _parse_once(content: str):
+    try:
+        data, method = loads_tolerant(content)
+        return _count_items(data), method
+    except ValueError:
+        return 0, "failed"
+
+
+def _stream_once(content: str, chunk: int) -> int:
+    parser = IncrementalJSONParser()
+    n = 0
+    for i in range(0, len(content), chunk):
+        n += len(parser.feed(content[i:i + chunk]))
+    return n
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark the tolerant JSON parser on malformed LLM outputs")
+    ap.add_argument("--corpus", default=CORPUS)
+    ap.add_argument("--iterations", type=int, default=2000)
+    ap.add_argument("--stream-chunk", type=int, default=16, help="chunk size for the streaming feed benchmark")
+    args = ap.parse_args()
+
+    with open(args.corpus, "r", encoding="utf-8") as f:
+        cases = [json.loads(line) for line in f if line.strip()]
+
+    failures = 0
+    print(f"{'case':40s} {'bytes':>7s} {'method':>9s} {'items':>5s} {'us/parse':>9s} {'us/stream':>10s}")
+    for case in cases:
+        content = case["content"]
+        items, method = _parse_once(content)
+
+        t0 = time.perf_counter()
+        for _ in range(args.iterations):
+            _parse_once(content)
+        parse_us = (time.perf_counter() - t0) / args.iterations * 1e6
+
+        t0 = time.perf_counter()
+        for _ in range(args.iterations):
+            _stream_once(content, args.stream_chunk)
+        stream_us = (time.perf_counter() - t0) / args.iterations * 1e6
+
+        ok = items >= case.get("min_items", 0)
+        failures += not ok
+        print(f"{case['name']:40s} {len(content):7d} {method:>9s} {items:5d} {parse_us:9.1f} {stream_us:10.1f}"
+              f"{'' if ok else '  << expected >= %d' % case['min_items']}")
+
+    if failures:
+        print(f"[FAIL] {failures} case(s) recovered fewer items than expected")
+        sys.exit(1)
+    print(f"[OK] {len(cases)} cases")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+请求路径上画像校验与响应序列化的开销：编译型 schema（pydantic-core 一次解码+校验）对比 json.loads，
+orjson 对比标准库 json，以及各类非法输入被拒绝所需的时间；可设阈值作为回归门禁。
+
+    python bench/bench_schema.py
+    python bench/bench_schema.py --items 12 --max-validate-us 150 --max-serialize-us 50 --json-out schema.json
+"""
+import argparse
+import copy
+import json
+import os
+import sys
+import timeit
+from typing import Any, Callable, Dict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_load import DEFAULT_PROFILE  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def per_call_us(fn: Callable[[], Any], min_time: float = 0.2) -> float:
+    """Best-of-5 microseconds per call, with the loop count auto-sized to ``min_time``."""
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    number = max(1, int(number * min_time / 0.2))
+    return round(min(timer.repeat(5, number)) / number * 1e6, 2)
+
+
+def _rejected(parse, body: bytes) -> Callable[[], Any]:
+    from profile_schema import ProfileError
+
+    def run():
+        try:
+            parse(body)
+        except ProfileError:
+            return
+        raise AssertionError("payload was accepted")
+    run()
+    return run
+
+
+def run(args) -> Dict[str, Any]:
+    from prompt_template import build_prompt
+    from profile_schema import MAX_ITEMS, parse_profile
+
+    with open(args.profile, "rb") as f:
+        raw = f.read()
+    with open(os.path.join(ROOT, "recommendations.json"), "r", encoding="utf-8") as f:
+        base_recs = json.load(f)
+    recs = [dict(copy.deepcopy(base_recs[i % len(base_recs)]), id=str(i + 1)) for i in range(args.items)]
+    profile = parse_profile(raw)
+    plain = json.loads(raw)
+
+    report: Dict[str, Any] = {"profile_bytes": len(raw), "items": len(recs)}
+    report["decode_stdlib_us"] = per_call_us(lambda: json.loads(raw))
+    report["decode_validate_us"] = per_call_us(lambda: parse_profile(raw))
+    report["decode_validate_dict_us"] = per_call_us(lambda: parse_profile(raw).data)
+    report["prompt_dict_us"] = per_call_us(lambda: build_prompt(plain))
+    report["prompt_typed_us"] = per_call_us(lambda: build_prompt(profile))
+
+    too_many = copy.deepcopy(plain)
+    too_many["education"]["skills"] = ["skill"] * (MAX_ITEMS + 1)
+    wrong_type = copy.deepcopy(plain)
+    wrong_type["disability"] = "none"
+    report["reject_us"] = {
+        "list_too_long": per_call_us(_rejected(parse_profile, json.dumps(too_many).encode())),
+        "wrong_type": per_call_us(_rejected(parse_profile, json.dumps(wrong_type).encode())),
+        "invalid_json": per_call_us(_rejected(parse_profile, raw[: len(raw) // 2])),
+        "empty_profile": per_call_us(_rejected(parse_profile, b"{}")),
+        "oversized_body": per_call_us(_rejected(parse_profile, b" " * (1 << 20))),
+    }
+
+    report["serialize_stdlib_us"] = per_call_us(lambda: json.dumps(recs, ensure_ascii=False).encode("utf-8"))
+    try:
+        import orjson
+        report["serialize_orjson_us"] = per_call_us(lambda: orjson.dumps(recs))
+    except ImportError:
+        report["serialize_orjson_us"] = None
+    from service import _dumps
+    report["serialize_service_us"] = per_call_us(lambda: _dumps(recs))
+    return report
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Profile validation and response serialization cost")
+    ap.add_argument("--profile", default=DEFAULT_PROFILE, help="profile JSON to decode")
+    ap.add_argument("--items", type=int, default=3, help="recommendations in the serialized response")
+    ap.add_argument("--max-validate-us", type=float, default=None, help="fail if decode+validate exceeds this")
+    ap.add_argument("--max-serialize-us", type=float, default=None, help="fail if response serialization exceeds this")
+    ap.add_argument("--json-out", default=None, help="also write the report as JSON")
+    args = ap.parse_args()
+
+    report = run(args)
+    for key, value in report.items():
+        print(f"{key:<22} {json.dumps(value) if isinstance(value, dict) else value}")
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    failures = []
+    if args.max_validate_us is not None and report["decode_validate_us"] > args.max_validate_us:
+        failures.append(f"decode+validate {report['decode_validate_us']}us > {args.max_validate_us}us")
+    if args.max_serialize_us is not None and report["serialize_service_us"] > args.max_serialize_us:
+        failures.append(f"serialize {report['serialize_service_us']}us > {args.max_serialize_us}us")
+    if failures:
+        print("[FAIL] " + "; ".join(failures))
+        sys.exit(1)
+    print("[OK]")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+冷启动基准：`-X importtime` 的 import 耗时报告（按累计耗时排序），以及服务进程从启动到
+第一个请求成功的时间（time-to-first-request，上游是本地 mock provider，延迟设为 0）。
+
+    python bench/bench_startup.py
+    python bench/bench_startup.py --top 25 --modules back,service
+    python bench/bench_startup.py --max-import-ms 600 --max-ttfr-ms 1500 --json-out startup.json
+
+目标：CLI（import back）不加载 FastAPI/pandas；服务 time-to-first-request ≤ 1.5s。
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH)
+
+import aiohttp  # noqa: E402
+
+from mock_providers import MockConfig, start_mock  # noqa: E402
+
+DEFAULT_PROFILE = os.path.join(ROOT, "user.json")
+
+# CLI 路径上不应出现的重量级依赖
+HEAVY = ("pandas", "numpy", "fastapi", "starlette", "pydantic", "uvicorn", "certifi")
+
+_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+# 子进程里启动服务：API key 与 provider 地址指向 mock，其余与生产启动相同
+_SERVE = """
+import sys
+sys.path[:0] = [{root!r}, {bench!r}]
+import api_key
+api_key.API_KEYS[{provider!r}] = "mock-key"
+import service, uvicorn
+from mock_providers import PROVIDER_PATHS
+for scorer in service._service_scorers:
+    scorer.api_url = {mock!r} + PROVIDER_PATHS[scorer.provider]
+uvicorn.run(service.app, host="127.0.0.1", port={port}, log_level="warning", access_log=False)
+"""
+
+
+def parse_importtime(stderr: str) -> List[Dict[str, Any]]:
+    """Rows of ``-X importtime`` output: module, self/cumulative µs and nesting depth."""
+    rows = []
+    for line in stderr.splitlines():
+        m = _LINE.match(line)
+        if m:
+            rows.append({"module": m.group(4), "self_us": int(m.group(1)), "cumulative_us": int(m.group(2)),
+                         "depth": len(m.group(3)) // 2})
+    return rows
+
+
+def _importtime(code: str) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT, capture_output=True, text=True)
+
+
+def import_report(module: str, top: int) -> Dict[str, Any]:
+    """Import ``module`` in a fresh interpreter and summarise where the time went."""
+    # 解释器启动本身（site、.pth）加载的模块不算在内
+    baseline = {r["module"] for r in parse_importtime(_importtime("pass").stderr)}
+    started = time.perf_counter()
+    proc = _importtime(f"import {module}")
+    wall = time.perf_counter() - started
+    if proc.returncode != 0:
+        raise SystemExit(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    rows = [r for r in parse_importtime(proc.stderr) if r["module"] not in baseline]
+    # 只有顶层 import 的累计时间相加才不会重复计算
+    total_us = sum(r["cumulative_us"] for r in rows if r["depth"] == 0)
+    loaded = {r["module"] for r in rows}
+    ranked = sorted(rows, key=lambda r: r["cumulative_us"], reverse=True)[:top]
+    return {
+        "module": module,
+        "import_ms": round(total_us / 1000, 1),
+        "process_wall_ms": round(wall * 1000, 1),
+        "modules_loaded": len(loaded),
+        "heavy_loaded": [name for name in HEAVY if name in loaded],
+        "top": [{"module": r["module"], "cumulative_ms": round(r["cumulative_us"] / 1000, 1),
+                 "self_ms": round(r["self_us"] / 1000, 1)} for r in ranked],
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def time_to_first_request(provider: str, profile: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+    """Spawn the service and time: process start -> /healthz 200 -> first /recommend 200."""
+    mock_runner, mock_base, _mock = await start_mock(MockConfig(latency_ms=0, latency_sigma=0))
+    port = _free_port()
+    env = {**os.environ, "LLM_PROVIDERS": provider, "LLM_PROVIDER": provider, "REC_CACHE_DB": ""}
+    code = _SERVE.format(root=ROOT, bench=BENCH, provider=provider, mock=mock_base, port=port)
+    base = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-c", code], cwd=ROOT, env=env)
+    result: Dict[str, Any] = {"provider": provider}
+    try:
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+            while "healthz_ms" not in result:
+                if proc.poll() is not None:
+                    raise SystemExit(f"service exited with code {proc.returncode} before becoming healthy")
+                if time.perf_counter() - started > timeout:
+                    raise SystemExit(f"service not healthy after {timeout}s")
+                try:
+                    async with session.get(base + "/healthz") as resp:
+                        if resp.status == 200:
+                            result["healthz_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                except aiohttp.ClientConnectionError:
+                    await asyncio.sleep(0.01)
+            async with session.post(base + "/recommend", json=profile) as resp:
+                await resp.read()
+                result["first_request_status"] = resp.status
+            result["ttfr_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        await mock_runner.cleanup()
+    return result
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Import-time profile and time-to-first-request for back.py/service.py")
+    ap.add_argument("--modules", default="back,service", help="comma-separated modules to profile")
+    ap.add_argument("--top", type=int, default=15, help="slowest imports to list per module")
+    ap.add_argument("--provider", default="openai4", help="provider wired to the mock for the TTFR run")
+    ap.add_argument("--profile", default=DEFAULT_PROFILE, help="profile JSON for the first /recommend")
+    ap.add_argument("--timeout", type=float, default=30.0)
+    ap.add_argument("--no-ttfr", action="store_true", help="only report import times")
+    ap.add_argument("--json-out", default=None, help="also write the report as JSON")
+    ap.add_argument("--max-import-ms", type=float, default=None, help="fail if any profiled import exceeds this")
+    ap.add_argument("--max-ttfr-ms", type=float, default=None, help="fail if time-to-first-request exceeds this")
+    args = ap.parse_args()
+
+    report: Dict[str, Any] = {"imports": []}
+    for module in [m.strip() for m in args.modules.split(",") if m.strip()]:
+        rep = import_report(module, args.top)
+        report["imports"].append(rep)
+        print(f"== import {module}: {rep['import_ms']} ms ({rep['modules_loaded']} modules, "
+              f"process {rep['process_wall_ms']} ms) heavy={rep['heavy_loaded']}")
+        for row in rep["top"]:
+            print(f"   {row['cumulative_ms']:8.1f} ms  {row['self_ms']:7.1f} ms self  {row['module']}")
+
+    if not args.no_ttfr:
+        with open(args.profile, "r", encoding="utf-8") as f:
+            profile = json.load(f)
+        ttfr = asyncio.run(time_to_first_request(args.provider, profile, args.timeout))
+        report["ttfr"] = ttfr
+        print(f"== service start -> /healthz {ttfr['healthz_ms']} ms, "
+              f"-> first /recommend {ttfr['ttfr_ms']} ms (status {ttfr['first_request_status']})")
+
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    failures = []
+    for rep in report["imports"]:
+        if args.max_import_ms is not None and rep["import_ms"] > args.max_import_ms:
+            failures.append(f"import {rep['module']} {rep['import_ms']}ms > {args.max_import_ms}ms")
+    ttfr = report.get("ttfr")
+    if ttfr is not None:
+        if ttfr["first_request_status"] != 200:
+            failures.append(f"first /recommend returned {ttfr['first_request_status']}")
+        if args.max_ttfr_ms is not None and ttfr["ttfr_ms"] > args.max_ttfr_ms:
+            failures.append(f"time-to-first-request {ttfr['ttfr_ms']}ms > {args.max_ttfr_ms}ms")
+    if failures:
+        print("[FAIL] " + "; ".join(failures))
+        sys.exit(1)
+    print("[OK]")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,462 @@
+"""
+本地 mock provider：模拟 back.py 支持的各家接口格式（OpenAI chat/completions、Anthropic messages、
+DashScope/Qwen compatible-mode、Grok、Gemini generateContent），可配置延迟分布、错误率、
+畸形/截断 JSON 与流式输出；另有 OpenAI Files+Batches 与 Anthropic Message Batches 的离线 batch 接口。
+结果由随机种子决定，可重复。
+
+    python bench/mock_providers.py --port 8900 --latency-ms 800 --error-rate 0.02 --malformed-rate 0.1
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+# back.py LLM_CONFIGS 里各 provider 的请求路径（主机替换成 mock 地址即可）
+PROVIDER_PATHS = {
+    "deepseek": "/v1/chat/completions",
+    "openai4": "/v1/chat/completions",
+    "qwen": "/compatible-mode/v1/chat/completions",
+    "claude": "/v1/messages",
+    "grok": "/v1/chat/completions",
+    "gemini": "/v1beta/models/gemini-2.5-flash:generateContent",
+}
+
+# single_quotes 无法修复，用来触发 parse 失败后的 failover
+MALFORMED_KINDS = ("fenced", "prose", "trailing_comma", "truncated", "single_quotes")
+
+
+class MockConfig:
+    """Behaviour knobs shared by every mock endpoint."""
+
+    def __init__(self, latency_ms: float = 500.0, latency_sigma: float = 0.3, error_rate: float = 0.0,
+                 throttle_rate: float = 0.0, retry_after: float = 1.0, malformed_rate: float = 0.0,
+                 items: int = 3, stream_chunk: int = 24, stream_interval_ms: float = 15.0,
+                 batch_ms: float = 2000.0, seed: int = 1234):
+        self.latency_ms = latency_ms            # 对数正态分布的中位数
+        self.latency_sigma = latency_sigma      # 对数正态 sigma；0 表示固定延迟
+        self.error_rate = error_rate            # 返回 500 的比例
+        self.throttle_rate = throttle_rate      # 返回 429 + Retry-After 的比例
+        self.retry_after = retry_after
+        self.malformed_rate = malformed_rate    # 返回畸形/截断 JSON 的比例
+        self.items = items
+        self.stream_chunk = stream_chunk
+        self.stream_interval_ms = stream_interval_ms
+        self.batch_ms = batch_ms                # batch 任务从提交到完成的时间
+        self.seed = seed
+
+    @classmethod
+    def add_arguments(cls, ap: argparse.ArgumentParser):
+        d = cls()
+        ap.add_argument("--latency-ms", type=float, default=d.latency_ms, help="median upstream latency")
+        ap.add_argument("--latency-sigma", type=float, default=d.latency_sigma, help="log-normal sigma (0 = fixed)")
+        ap.add_argument("--error-rate", type=float, default=d.error_rate, help="fraction of 500 responses")
+        ap.add_argument("--throttle-rate", type=float, default=d.throttle_rate, help="fraction of 429 responses")
+        ap.add_argument("--retry-after", type=float, default=d.retry_after, help="Retry-After seconds on 429")
+        ap.add_argument("--malformed-rate", type=float, default=d.malformed_rate,
+                        help="fraction of fenced/truncated/otherwise malformed JSON completions")
+        ap.add_argument("--items", type=int, default=d.items, help="recommendations per completion")
+        ap.add_argument("--stream-chunk", type=int, default=d.stream_chunk, help="characters per streamed delta")
+        ap.add_argument("--stream-interval-ms", type=float, default=d.stream_interval_ms)
+        ap.add_argument("--batch-ms", type=float, default=d.batch_ms, help="time until a submitted batch completes")
+        ap.add_argument("--seed", type=int, default=d.seed)
+
+    @classmethod
+    def from_args(cls, args) -> "MockConfig":
+        return cls(latency_ms=args.latency_ms, latency_sigma=args.latency_sigma, error_rate=args.error_rate,
+                   throttle_rate=args.throttle_rate, retry_after=args.retry_after,
+                   malformed_rate=args.malformed_rate, items=args.items, stream_chunk=args.stream_chunk,
+                   stream_interval_ms=args.stream_interval_ms, batch_ms=args.batch_ms, seed=args.seed)
+
+
+def _recommendations(rng: random.Random, n: int) -> List[Dict[str, Any]]:
+    kinds = ("program", "job", "funding")
+    return [
+        {
+            "id": f"mock-{i + 1}",
+            "name": f"Mock Opportunity {rng.randint(100, 999)}",
+            "type": kinds[i % 3],
+            "description": "Plain-language description of a supported opportunity. " * 2,
+            "eligibility": ["Australian resident", "Registered with a disability employment service"],
+            "benefits": "Flexible hours, assistive technology and mentoring",
+            "applicationSteps": ["Check eligibility", "Prepare documents", "Apply online"],
+            "contactInfo": {"website": "https://example.org", "phone": "1800 000 000", "email": "help@example.org"},
+            "relevanceScore": rng.randint(50, 98),
+            "location": "Remote",
+        }
+        for i in range(n)
+    ]
+
+
+def _malform(text: str, kind: str) -> str:
+    if kind == "fenced":
+        return f"Here are your matches:\n```json\n{text}\n```"
+    if kind == "prose":
+        return f"Sure! Based on the profile, I recommend:\n{text}\nLet me know if you need more."
+    if kind == "trailing_comma":
+        return text[:-1].rstrip() + ",\n]"
+    if kind == "truncated":
+        return text[: int(len(text) * 0.8)]
+    return text.replace('"', "'")
+
+
+def _usage(prompt_tokens: int, completion_tokens: int) -> Dict[str, int]:
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens}
+
+
+class MockProviders:
+    """aiohttp application serving every wire format on one port."""
+
+    def __init__(self, config: MockConfig):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.stats: Dict[str, int] = {"requests": 0, "errors": 0, "throttled": 0, "malformed": 0, "truncated": 0,
+                                      "streams": 0, "batches": 0, "batch_requests": 0}
+        self.files: Dict[str, bytes] = {}
+        self.batches: Dict[str, Dict[str, Any]] = {}
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self._chat)
+        app.router.add_post("/compatible-mode/v1/chat/completions", self._chat)
+        app.router.add_post("/v1/messages", self._messages)
+        app.router.add_post("/v1beta/models/{call}", self._gemini)
+        for prefix in ("/v1", "/compatible-mode/v1"):
+            app.router.add_post(prefix + "/files", self._file_upload)
+            app.router.add_get(prefix + "/files/{file_id}/content", self._file_content)
+            app.router.add_post(prefix + "/batches", self._batch_create)
+            app.router.add_get(prefix + "/batches/{batch_id}", self._batch_get)
+        app.router.add_post("/v1/messages/batches", self._message_batch_create)
+        app.router.add_get("/v1/messages/batches/{batch_id}", self._message_batch_get)
+        app.router.add_get("/v1/messages/batches/{batch_id}/results", self._message_batch_results)
+        app.router.add_get("/stats", self._stats)
+        return app
+
+    # ---------- shared behaviour ----------
+    def _latency(self) -> float:
+        cfg = self.config
+        if cfg.latency_sigma <= 0:
+            return cfg.latency_ms / 1000.0
+        return self.rng.lognormvariate(math.log(max(cfg.latency_ms, 0.001)), cfg.latency_sigma) / 1000.0
+
+    async def _prelude(self) -> Optional[web.Response]:
+        """Count, sleep for the sampled latency and maybe fail; returns an error response or None."""
+        cfg = self.config
+        self.stats["requests"] += 1
+        await asyncio.sleep(self._latency())
+        roll = self.rng.random()
+        if roll < cfg.throttle_rate:
+            self.stats["throttled"] += 1
+            return web.json_response({"error": {"message": "rate limited"}}, status=429,
+                                     headers={"Retry-After": f"{cfg.retry_after:g}"})
+        if roll < cfg.throttle_rate + cfg.error_rate:
+            self.stats["errors"] += 1
+            return web.json_response({"error": {"message": "mock upstream failure"}}, status=500)
+        return None
+
+    @staticmethod
+    def _structured(body: Dict[str, Any]) -> bool:
+        """Did the caller send a schema (response_format, responseSchema or a forced tool)?"""
+        return bool(body.get("response_format") or body.get("tools")
+                    or (body.get("generationConfig") or {}).get("responseSchema"))
+
+    def _completion(self, body: Dict[str, Any], malformed: bool = True) -> Tuple[str, bool]:
+        """Completion text and whether it was cut off (max_tokens exceeded or a ``truncated`` malform)."""
+        recs = _recommendations(self.rng, self.config.items)
+        # 结构化输出模式下根节点是 {"recommendations": [...]}
+        payload = {"recommendations": recs} if self._structured(body) else recs
+        text = json.dumps(payload, ensure_ascii=False, indent=1)
+        truncated = False
+        if malformed and self.rng.random() < self.config.malformed_rate:
+            self.stats["malformed"] += 1
+            kind = self.rng.choice(MALFORMED_KINDS)
+            text = _malform(text, kind)
+            truncated = kind == "truncated"
+        limit = body.get("max_tokens") or (body.get("generationConfig") or {}).get("maxOutputTokens")
+        if limit and len(text) // 4 > limit:
+            text = text[: limit * 4]
+            truncated = True
+        if truncated:
+            self.stats["truncated"] += 1
+        return text, truncated
+
+    @staticmethod
+    def _prompt_tokens(body: Dict[str, Any]) -> int:
+        return len(json.dumps(body)) // 4
+
+    def _chunks(self, text: str) -> List[str]:
+        n = max(1, self.config.stream_chunk)
+        return [text[i:i + n] for i in range(0, len(text), n)]
+
+    async def _sse(self, request: web.Request, events: List[str], done: bool = False) -> web.StreamResponse:
+        self.stats["streams"] += 1
+        resp = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await resp.prepare(request)
+        interval = self.config.stream_interval_ms / 1000.0
+        for event in events:
+            await resp.write(event.encode("utf-8"))
+            if interval > 0:
+                await asyncio.sleep(interval)
+        if done:
+            await resp.write(b"data: [DONE]\n\n")
+        await resp.write_eof()
+        return resp
+
+    # ---------- wire formats ----------
+    async def _chat(self, request: web.Request):
+        """OpenAI / DeepSeek / Grok / Qwen compatible-mode chat/completions."""
+        body = await request.json()
+        err = await self._prelude()
+        if err is not None:
+            return err
+        text, truncated = self._completion(body)
+        finish = "length" if truncated else "stop"
+        model = body.get("model", "mock")
+        if body.get("stream"):
+            events = [
+                "data: " + json.dumps({"object": "chat.completion.chunk", "model": model,
+                                       "choices": [{"index": 0, "delta": {"content": c}}]}) + "\n\n"
+                for c in self._chunks(text)
+            ]
+            events.append("data: " + json.dumps({"object": "chat.completion.chunk", "model": model,
+                                                 "choices": [{"index": 0, "delta": {},
+                                                              "finish_reason": finish}]}) + "\n\n")
+            return await self._sse(request, events, done=True)
+        return web.json_response(self._chat_body(body, text, finish))
+
+    def _chat_body(self, body: Dict[str, Any], text: str, finish: str) -> Dict[str, Any]:
+        return {
+            "id": "chatcmpl-mock", "object": "chat.completion", "model": body.get("model", "mock"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": finish}],
+            "usage": _usage(self._prompt_tokens(body), len(text) // 4),
+        }
+
+    async def _messages(self, request: web.Request):
+        """Anthropic messages."""
+        body = await request.json()
+        err = await self._prelude()
+        if err is not None:
+            return err
+        # 强制工具调用时 provider 保证入参符合 schema，不注入畸形输出
+        tool = (body.get("tools") or [{}])[0].get("name")
+        text, truncated = self._completion(body, malformed=tool is None)
+        stop = "max_tokens" if truncated else ("tool_use" if tool else "end_turn")
+        usage = {"input_tokens": self._prompt_tokens(body), "output_tokens": len(text) // 4}
+        if body.get("stream"):
+            def ev(name, payload):
+                return f"event: {name}\ndata: {json.dumps(payload)}\n\n"
+            if tool:
+                block = {"type": "tool_use", "id": "toolu_mock", "name": tool, "input": {}}
+                delta = lambda c: {"type": "input_json_delta", "partial_json": c}  # noqa: E731
+            else:
+                block = {"type": "text", "text": ""}
+                delta = lambda c: {"type": "text_delta", "text": c}  # noqa: E731
+            events = [ev("message_start", {"type": "message_start", "message": {"usage": usage}}),
+                      ev("content_block_start", {"type": "content_block_start", "index": 0, "content_block": block})]
+            events += [ev("content_block_delta", {"type": "content_block_delta", "index": 0, "delta": delta(c)})
+                       for c in self._chunks(text)]
+            events += [ev("content_block_stop", {"type": "content_block_stop", "index": 0}),
+                       ev("message_delta", {"type": "message_delta", "delta": {"stop_reason": stop}}),
+                       ev("message_stop", {"type": "message_stop"})]
+            return await self._sse(request, events)
+        return web.json_response(self._message_body(body, text, truncated))
+
+    def _message_body(self, body: Dict[str, Any], text: str, truncated: bool) -> Dict[str, Any]:
+        tool = (body.get("tools") or [{}])[0].get("name")
+        return {
+            "id": "msg_mock", "type": "message", "role": "assistant", "model": body.get("model", "mock"),
+            # 截断的工具调用拿不到完整入参，按空对象返回
+            "content": ([{"type": "tool_use", "id": "toolu_mock", "name": tool,
+                          "input": {} if truncated else json.loads(text)}]
+                        if tool else [{"type": "text", "text": text}]),
+            "stop_reason": "max_tokens" if truncated else ("tool_use" if tool else "end_turn"),
+            "usage": {"input_tokens": self._prompt_tokens(body), "output_tokens": len(text) // 4},
+        }
+
+    async def _gemini(self, request: web.Request):
+        """Gemini generateContent / streamGenerateContent?alt=sse."""
+        call = request.match_info["call"]
+        if not call.endswith((":generateContent", ":streamGenerateContent")):
+            raise web.HTTPNotFound()
+        body = await request.json()
+        err = await self._prelude()
+        if err is not None:
+            return err
+        text, truncated = self._completion(body)
+        prompt_tokens = self._prompt_tokens(body)
+        finish = "MAX_TOKENS" if truncated else "STOP"
+
+        def payload(part: str) -> Dict[str, Any]:
+            return {"candidates": [{"content": {"role": "model", "parts": [{"text": part}]}, "finishReason": finish}],
+                    "usageMetadata": {"promptTokenCount": prompt_tokens, "candidatesTokenCount": len(text) // 4,
+                                      "totalTokenCount": prompt_tokens + len(text) // 4}}
+
+        if call.endswith(":streamGenerateContent"):
+            return await self._sse(request, ["data: " + json.dumps(payload(c)) + "\n\n" for c in self._chunks(text)])
+        return web.json_response(payload(text))
+
+    # ---------- offline batch APIs ----------
+    def _new_batch(self, kind: str, requests: List[Dict[str, Any]]) -> Dict[str, Any]:
+        self.stats["batches"] += 1
+        self.stats["batch_requests"] += len(requests)
+        batch_id = f"batch_mock_{len(self.batches) + 1}"
+        batch = {"id": batch_id, "kind": kind, "requests": requests, "results": None,
+                 "ready_at": time.monotonic() + self.config.batch_ms / 1000.0}
+        self.batches[batch_id] = batch
+        return batch
+
+    def _batch_results(self, batch: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+        """Result lines once the batch is due (computed on first access); None while still running."""
+        if time.monotonic() < batch["ready_at"]:
+            return None
+        if batch["results"] is None:
+            out = []
+            for req in batch["requests"]:
+                failed = self.rng.random() < self.config.error_rate
+                if failed:
+                    self.stats["errors"] += 1
+                if batch["kind"] == "openai":
+                    body = req.get("body") or {}
+                    if failed:
+                        out.append({"custom_id": req["custom_id"], "response": {"status_code": 500, "body": {
+                            "error": {"message": "mock upstream failure"}}}, "error": None})
+                        continue
+                    text, truncated = self._completion(body)
+                    out.append({"custom_id": req["custom_id"], "error": None, "response": {
+                        "status_code": 200, "body": self._chat_body(body, text, "length" if truncated else "stop")}})
+                else:
+                    body = req.get("params") or {}
+                    if failed:
+                        out.append({"custom_id": req["custom_id"], "result": {
+                            "type": "errored", "error": {"type": "api_error", "message": "mock upstream failure"}}})
+                        continue
+                    tool = (body.get("tools") or [{}])[0].get("name")
+                    text, truncated = self._completion(body, malformed=tool is None)
+                    out.append({"custom_id": req["custom_id"], "result": {
+                        "type": "succeeded", "message": self._message_body(body, text, truncated)}})
+            batch["results"] = out
+        return batch["results"]
+
+    @staticmethod
+    def _jsonl(lines: List[Dict[str, Any]]) -> web.Response:
+        text = "".join(json.dumps(line, ensure_ascii=False) + "\n" for line in lines)
+        return web.Response(text=text, content_type="application/jsonl")
+
+    async def _file_upload(self, request: web.Request):
+        form = await request.post()
+        upload = form.get("file")
+        if upload is None or form.get("purpose") != "batch":
+            return web.json_response({"error": {"message": "expected purpose=batch and a file"}}, status=400)
+        file_id = f"file-mock-{len(self.files) + 1}"
+        self.files[file_id] = upload.file.read()
+        return web.json_response({"id": file_id, "object": "file", "purpose": "batch",
+                                  "bytes": len(self.files[file_id])})
+
+    async def _file_content(self, request: web.Request):
+        file_id = request.match_info["file_id"]
+        if file_id.endswith("-output"):
+            batch = self.batches.get(file_id[:-len("-output")])
+            results = self._batch_results(batch) if batch else None
+            if results is None:
+                raise web.HTTPNotFound()
+            return self._jsonl(results)
+        if file_id not in self.files:
+            raise web.HTTPNotFound()
+        return web.Response(body=self.files[file_id], content_type="application/jsonl")
+
+    async def _batch_create(self, request: web.Request):
+        body = await request.json()
+        data = self.files.get(body.get("input_file_id", ""))
+        if data is None:
+            return web.json_response({"error": {"message": "unknown input_file_id"}}, status=400)
+        requests = [json.loads(line) for line in data.decode("utf-8").splitlines() if line.strip()]
+        batch = self._new_batch("openai", requests)
+        return web.json_response({"id": batch["id"], "object": "batch", "status": "validating",
+                                  "endpoint": body.get("endpoint"), "input_file_id": body["input_file_id"]})
+
+    async def _batch_get(self, request: web.Request):
+        batch = self.batches.get(request.match_info["batch_id"])
+        if batch is None or batch["kind"] != "openai":
+            raise web.HTTPNotFound()
+        results = self._batch_results(batch)
+        total = len(batch["requests"])
+        if results is None:
+            return web.json_response({"id": batch["id"], "object": "batch", "status": "in_progress",
+                                      "request_counts": {"total": total, "completed": 0, "failed": 0}})
+        failed = sum(1 for r in results if r["response"]["status_code"] != 200)
+        return web.json_response({"id": batch["id"], "object": "batch", "status": "completed",
+                                  "output_file_id": batch["id"] + "-output", "error_file_id": None,
+                                  "request_counts": {"total": total, "completed": total - failed, "failed": failed}})
+
+    async def _message_batch_create(self, request: web.Request):
+        body = await request.json()
+        batch = self._new_batch("anthropic", body.get("requests") or [])
+        return web.json_response({"id": batch["id"], "type": "message_batch", "processing_status": "in_progress"})
+
+    async def _message_batch_get(self, request: web.Request):
+        batch = self.batches.get(request.match_info["batch_id"])
+        if batch is None or batch["kind"] != "anthropic":
+            raise web.HTTPNotFound()
+        results = self._batch_results(batch)
+        body = {"id": batch["id"], "type": "message_batch",
+                "processing_status": "in_progress" if results is None else "ended", "results_url": None}
+        if results is not None:
+            body["results_url"] = f"{request.url.origin()}/v1/messages/batches/{batch['id']}/results"
+            body["request_counts"] = {
+                "succeeded": sum(1 for r in results if r["result"]["type"] == "succeeded"),
+                "errored": sum(1 for r in results if r["result"]["type"] == "errored"),
+            }
+        return web.json_response(body)
+
+    async def _message_batch_results(self, request: web.Request):
+        batch = self.batches.get(request.match_info["batch_id"])
+        results = self._batch_results(batch) if batch and batch["kind"] == "anthropic" else None
+        if results is None:
+            raise web.HTTPNotFound()
+        return self._jsonl(results)
+
+    async def _stats(self, request: web.Request):
+        return web.json_response(self.stats)
+
+
+async def start_mock(config: MockConfig, host: str = "127.0.0.1", port: int = 0):
+    """Start the mock server; returns ``(runner, base_url, mock)``. Port 0 picks a free port."""
+    mock = MockProviders(config)
+    runner = web.AppRunner(mock.app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound = runner.addresses[0][1]
+    return runner, f"http://{host}:{bound}", mock
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Serve deterministic stand-ins for every provider wire format")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8900)
+    MockConfig.add_arguments(ap)
+    args = ap.parse_args()
+
+    async def _serve():
+        runner, base, _ = await start_mock(MockConfig.from_args(args), args.host, args.port)
+        print(f"[MOCK] serving on {base}")
+        for provider, path in PROVIDER_PATHS.items():
+            print(f"  {provider:9s} {base}{path}")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await runner.cleanup()
+
+    try:
+        asyncio.run(_serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
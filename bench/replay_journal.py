@@ -0,0 +1,238 @@
+"""
+重放 LLM journal（journal.py 写出的 JSONL）：复现线上解析失败，并在真实流量上比较解析器改动前后的结果与耗时。
+
+    parse     （默认）对每条记录的原始输出重新跑 parse_response，报告结果分布、与记录时相比修好/变坏的条数
+    pipeline  启动本地替身 provider（OpenAI chat 格式）逐条回放原始输出，走完整的 call_llm → 截断续写 → 解析；
+              prompt 用记录里的真实 prompt（当前静态前缀 + 记录的画像部分），记录时没存 prompt 的用占位 prompt
+
+    python bench/replay_journal.py llm_journal.jsonl --only-failed --show 5
+    python bench/replay_journal.py llm_journal.jsonl --mode pipeline --concurrency 16 --json-out replay.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# 重放本身不再写 journal
+os.environ["LLM_JOURNAL"] = ""
+
+from aiohttp import web  # noqa: E402
+
+from bench_load import percentile  # noqa: E402
+
+_CONTINUATION = "\n# Continuation\n"
+
+
+def load_records(args) -> List[Dict[str, Any]]:
+    from journal import iter_journal
+
+    records = []
+    for rec in iter_journal(args.journal):
+        if not isinstance(rec.get("raw"), str):
+            continue
+        if args.only_failed and rec.get("outcome") != "failed":
+            continue
+        if args.provider and rec.get("provider") != args.provider:
+            continue
+        records.append(rec)
+        if args.limit and len(records) >= args.limit:
+            break
+    return records
+
+
+def _llm_response(rec: Dict[str, Any]) -> Dict[str, Any]:
+    return {"choices": [{"message": {"content": rec["raw"]}, "finish_reason": rec.get("finish_reason")}],
+            "usage": rec.get("usage") or {}}
+
+
+def _scorer(provider: str):
+    from back import LLMScorerWithExcel
+
+    return LLMScorerWithExcel(api_key="replay", provider=provider)
+
+
+def _compare(records: List[Dict[str, Any]], outcomes: List[Dict[str, Any]], timings: List[float], show: int):
+    counts: Dict[str, int] = {}
+    fixed, regressed = [], []
+    for rec, out in zip(records, outcomes):
+        counts[out["outcome"]] = counts.get(out["outcome"], 0) + 1
+        was_ok = rec.get("outcome") != "failed"
+        if out["items"] and not was_ok:
+            fixed.append(rec.get("id"))
+        elif not out["items"] and was_ok:
+            regressed.append(rec.get("id"))
+    for rec, out in [(r, o) for r, o in zip(records, outcomes) if not o["items"]][:show]:
+        print(f"---- {rec.get('id')} {rec.get('provider')} ({rec.get('error') or rec.get('outcome')}) ----")
+        print(rec["raw"][:2000])
+    return {
+        "records": len(records),
+        "outcomes": counts,
+        "fixed": len(fixed),
+        "regressed": len(regressed),
+        "regressed_ids": regressed[:20],
+        "p50_ms": round(percentile(timings, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(timings, 0.95) * 1000, 3),
+        "max_ms": round(max(timings, default=0.0) * 1000, 3),
+    }
+
+
+def _replay_prompt(rec: Dict[str, Any], i: int) -> str:
+    """The journaled prompt behind the current static prefix, or a placeholder for records without one."""
+    from prompt_template import STATIC_PREFIX, Prompt
+
+    if not isinstance(rec.get("prompt"), str):
+        return f"journal-replay:{i}"
+    return Prompt(STATIC_PREFIX, rec["prompt"]) if rec.get("template") else rec["prompt"]
+
+
+def _request_key(body: bytes) -> str:
+    """Per-request part of a chat request (last user message), continuation note removed."""
+    try:
+        content = json.loads(body)["messages"][-1]["content"]
+    except (ValueError, KeyError, IndexError, TypeError):
+        return ""
+    return content.split(_CONTINUATION, 1)[0] if isinstance(content, str) else ""
+
+
+def replay_parse(records: List[Dict[str, Any]], args) -> Dict[str, Any]:
+    """Re-run parse_response on every journaled completion with the journaled provider's settings."""
+    scorers: Dict[str, Any] = {}
+    outcomes, timings = [], []
+    for rec in records:
+        provider = rec.get("provider") or args.stand_in
+        if provider not in scorers:
+            from back import LLMScorerWithExcel
+
+            # journal 来自已下线/本机未配置的 provider：按替身 provider 的设置解析
+            known = provider in LLMScorerWithExcel.LLM_CONFIGS
+            scorers[provider] = _scorer(provider if known else args.stand_in)
+        started = time.perf_counter()
+        recs = scorers[provider].parse_response(_llm_response(rec))
+        timings.append(time.perf_counter() - started)
+        outcomes.append({"outcome": "ok" if recs else "failed", "items": len(recs)})
+    return _compare(records, outcomes, timings, args.show)
+
+
+async def replay_pipeline(records: List[Dict[str, Any]], args) -> Dict[str, Any]:
+    """Serve journaled completions from a local OpenAI-format stand-in and run the full call path.
+
+    Requests are matched to records by their per-request prompt part; records sharing the
+    same prompt are replayed one after another so each request gets its own record's output.
+    """
+    from prompt_template import PREFIX_ID, split_prompt
+    from transport import close_http_sessions
+
+    prompts = [_replay_prompt(rec, i) for i, rec in enumerate(records)]
+    groups: Dict[str, List[int]] = {}
+    for i, prompt in enumerate(prompts):
+        groups.setdefault(split_prompt(prompt)[1], []).append(i)
+    active: Dict[str, int] = {}
+
+    async def chat(request: web.Request):
+        body = await request.read()
+        key = _request_key(body)
+        if key not in active:
+            return web.json_response({"error": "unknown replay record"}, status=404)
+        rec = records[active[key]]
+        if _CONTINUATION.encode() in body:
+            # journal 只有第一次回答的原文；续写请求回空列表
+            text, finish = "[]", "stop"
+        else:
+            text, finish = rec["raw"], rec.get("finish_reason") or "stop"
+        usage = rec.get("usage") or {}
+        return web.json_response({
+            "id": "chatcmpl-replay", "object": "chat.completion", "model": "replay",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": finish}],
+            "usage": {"prompt_tokens": usage.get("prompt_tokens", 0),
+                      "completion_tokens": usage.get("completion_tokens", 0),
+                      "total_tokens": usage.get("prompt_tokens", 0) + usage.get("completion_tokens", 0)},
+        })
+
+    app = web.Application(client_max_size=64 << 20)
+    app.router.add_post("/v1/chat/completions", chat)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    scorer = _scorer(args.stand_in)
+    if scorer.adapter.name != "openai":
+        raise SystemExit(f"--stand-in must use the openai adapter, '{args.stand_in}' uses '{scorer.adapter.name}'")
+    scorer.api_url = f"http://127.0.0.1:{port}/v1/chat/completions"
+    sem = asyncio.Semaphore(args.concurrency)
+    outcomes: List[Dict[str, Any]] = [{}] * len(records)
+    timings: List[float] = [0.0] * len(records)
+
+    async def one(i: int):
+        started = time.perf_counter()
+        try:
+            recs = scorer.parse_response(await scorer.call_llm(prompts[i]))
+        except Exception as e:
+            print(f"[REPLAY] record {records[i].get('id')}: {type(e).__name__}: {e}")
+            recs = []
+        timings[i] = time.perf_counter() - started
+        outcomes[i] = {"outcome": "ok" if recs else "failed", "items": len(recs)}
+
+    async def group(key: str, indices: List[int]):
+        async with sem:
+            for i in indices:
+                active[key] = i
+                await one(i)
+            active.pop(key, None)
+
+    try:
+        await asyncio.gather(*(group(key, indices) for key, indices in groups.items()))
+    finally:
+        await close_http_sessions()
+        await runner.cleanup()
+    report = _compare(records, outcomes, timings, args.show)
+    report["real_prompts"] = sum(isinstance(rec.get("prompt"), str) for rec in records)
+    # 记录之后静态前缀改过的：重放用的是当前前缀
+    report["template_changed"] = sum(bool(rec.get("template")) and rec["template"] != PREFIX_ID for rec in records)
+    return report
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Replay an LLM journal through the parser or the full call pipeline")
+    ap.add_argument("journal", help="journal path (rotated .1/.2/... backups are read too)")
+    ap.add_argument("--mode", choices=["parse", "pipeline"], default="parse")
+    ap.add_argument("--only-failed", action="store_true", help="only records whose parse failed when journaled")
+    ap.add_argument("--provider", default=None, help="only records from this provider")
+    ap.add_argument("--limit", type=int, default=0)
+    ap.add_argument("--stand-in", default="openai4",
+                    help="openai-adapter provider used for pipeline mode and for unknown journaled providers")
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--show", type=int, default=0, help="print the raw output of the first N failures")
+    ap.add_argument("--max-regressed", type=int, default=None,
+                    help="fail if more than N records that parsed when journaled fail now")
+    ap.add_argument("--json-out", default=None, help="also write the report as JSON")
+    args = ap.parse_args()
+
+    records = load_records(args)
+    if not records:
+        raise SystemExit(f"no replayable records in {args.journal}")
+    if args.mode == "parse":
+        report = replay_parse(records, args)
+    else:
+        report = asyncio.run(replay_pipeline(records, args))
+    report["mode"] = args.mode
+    for key, value in report.items():
+        print(f"{key:<22} {json.dumps(value, ensure_ascii=False) if isinstance(value, (dict, list)) else value}")
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.max_regressed is not None and report["regressed"] > args.max_regressed:
+        print(f"[FAIL] {report['regressed']} record(s) regressed")
+        sys.exit(1)
+    print("[OK]")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+成本/质量级联：先让便宜快速的模型（deepseek-chat、qwen-plus、gemini-2.5-flash……）回答，
+对 parse_response 归一化后的结果做质量检查，只有检查不通过才升级到强模型（HedgedExecutor 的 provider 链）。
+
+检查项：条数、字段完整度、relevanceScore 的区分度（分数全一样说明模型没认真打分）、是否需要修复解析。
+
+    LLM_CASCADE=deepseek              （逗号分隔的便宜 provider，按顺序尝试；为空关闭）
+    LLM_CASCADE_TIMEOUT=15  LLM_CASCADE_MIN_ITEMS=3  LLM_CASCADE_MIN_COMPLETENESS=0.8
+    LLM_CASCADE_MIN_SPREAD=5  LLM_CASCADE_ALLOW_REPAIR=0
+"""
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from metrics import CASCADE_TOTAL
+
+# 归一化后每条推荐应当有内容的字段
+QUALITY_FIELDS = ("name", "type", "description", "eligibility", "benefits", "applicationSteps",
+                  "contactInfo", "location")
+KNOWN_TYPES = frozenset({"program", "job", "funding"})
+# parse_response 的解码路径里属于“修复”的那些（见 json_repair.loads_tolerant）
+REPAIR_METHODS = frozenset({"repaired", "items", "failed"})
+
+
+class Degraded(list):
+    """Recommendations from the fallback path: a cheap answer the gate rejected, served because the
+    strong tier failed. Callers should not cache it for long and should say so to the client."""
+
+    def __init__(self, recs, provider: str = ""):
+        super().__init__(recs)
+        self.provider = provider
+
+
+class QualityGate:
+    """Cheap checks on a parsed answer; ``check`` returns the names of the failed checks."""
+
+    def __init__(self, min_items: int = 3, min_completeness: float = 0.8, min_spread: int = 5,
+                 allow_repair: bool = False):
+        self.min_items = min_items
+        self.min_completeness = min_completeness
+        self.min_spread = min_spread
+        self.allow_repair = allow_repair
+
+    @staticmethod
+    def completeness(rec: Dict[str, Any]) -> float:
+        """Fraction of ``QUALITY_FIELDS`` with content (contactInfo needs at least one channel)."""
+        filled = 0
+        for field in QUALITY_FIELDS:
+            value = rec.get(field)
+            filled += bool(any(value.values()) if isinstance(value, dict) else value)
+        return filled / len(QUALITY_FIELDS)
+
+    def check(self, recs: List[Dict[str, Any]], method: Optional[str]) -> List[str]:
+        failed = []
+        if len(recs) < self.min_items:
+            failed.append("items")
+        if recs:
+            if any(not r.get("name") or r.get("type") not in KNOWN_TYPES for r in recs):
+                failed.append("schema")
+            elif sum(self.completeness(r) for r in recs) / len(recs) < self.min_completeness:
+                failed.append("completeness")
+            scores = [r.get("relevanceScore", 0) for r in recs]
+            # 只有一条时只要求打了分
+            if max(scores) == 0 or (len(scores) > 1 and max(scores) - min(scores) < self.min_spread):
+                failed.append("spread")
+        if not self.allow_repair and method in REPAIR_METHODS:
+            failed.append("repair")
+        return failed
+
+
+class CascadeExecutor:
+    """Try cheap scorers in order and accept the first answer that passes the gate; else escalate.
+
+    Same ``run(prompt) -> (recommendations, provider)`` interface as ``HedgedExecutor``,
+    which serves as the strong tier. When the strong tier fails too, the best cheap
+    answer that at least parsed is returned instead of an error, wrapped in ``Degraded``.
+    """
+
+    def __init__(self, cheap: List[Any], strong, gate: Optional[QualityGate] = None, cheap_timeout: float = 15.0):
+        if not cheap:
+            raise ValueError("CascadeExecutor needs at least one cheap scorer")
+        self.cheap = cheap
+        self.strong = strong
+        self.gate = gate or QualityGate()
+        self.cheap_timeout = cheap_timeout
+        self.stats = {"requests": 0, "accepted": 0, "escalated": 0, "fallback": 0,
+                      "reasons": {}, "accepted_by": {}, "cheap_seconds": 0.0, "strong_seconds": 0.0}
+
+    def _escalate(self, provider: str, reasons: List[str]):
+        for reason in reasons:
+            self.stats["reasons"][reason] = self.stats["reasons"].get(reason, 0) + 1
+            CASCADE_TOTAL.inc(provider=provider, outcome="rejected", reason=reason)
+
+    async def _try_cheap(self, scorer, prompt: str, timeout: float) -> Tuple[List[Dict[str, Any]], List[str]]:
+        started = time.perf_counter()
+        try:
+            llm_resp = await asyncio.wait_for(scorer.call_llm(prompt), timeout)
+        except asyncio.TimeoutError:
+            return [], ["timeout"]
+        except Exception as e:
+            print(f"[CASCADE] {scorer.provider} failed: {e}")
+            return [], ["error"]
+        finally:
+            self.stats["cheap_seconds"] += time.perf_counter() - started
+        recs = scorer.parse_response(llm_resp)
+        return recs, self.gate.check(recs, llm_resp.get("parse_method"))
+
+    async def run(self, prompt: str, deadline: Optional[float] = None) -> Tuple[List[Dict[str, Any]], str]:
+        """Return ``(recommendations, provider)``; raises only when every tier failed."""
+        self.stats["requests"] += 1
+        budget = self.strong.deadline if deadline is None else deadline
+        loop = asyncio.get_running_loop()
+        give_up_at = loop.time() + budget
+        best: Optional[Tuple[List[Dict[str, Any]], str]] = None
+
+        for scorer in self.cheap:
+            remaining = give_up_at - loop.time()
+            if remaining <= 0:
+                break
+            recs, failed = await self._try_cheap(scorer, prompt, min(self.cheap_timeout, remaining))
+            if not failed:
+                self.stats["accepted"] += 1
+                self.stats["accepted_by"][scorer.provider] = self.stats["accepted_by"].get(scorer.provider, 0) + 1
+                CASCADE_TOTAL.inc(provider=scorer.provider, outcome="accepted", reason="")
+                return recs, scorer.provider
+            self._escalate(scorer.provider, failed)
+            if recs and (best is None or len(recs) > len(best[0])):
+                best = (recs, scorer.provider)
+
+        self.stats["escalated"] += 1
+        started = time.perf_counter()
+        try:
+            return await self.strong.run(prompt, deadline=max(0.0, give_up_at - loop.time()))
+        except Exception:
+            if best is None:
+                raise
+            # 强模型也失败了：退回到能解析的便宜结果，总比报错好
+            self.stats["fallback"] += 1
+            CASCADE_TOTAL.inc(provider=best[1], outcome="fallback", reason="")
+            return Degraded(best[0], best[1]), best[1]
+        finally:
+            self.stats["strong_seconds"] += time.perf_counter() - started
+
+    def snapshot(self) -> Dict[str, Any]:
+        n = self.stats["requests"]
+        return {
+            **self.stats,
+            "cheap": [s.provider for s in self.cheap],
+            "escalation_rate": round(self.stats["escalated"] / n, 4) if n else 0.0,
+            "cheap_seconds": round(self.stats["cheap_seconds"], 3),
+            "strong_seconds": round(self.stats["strong_seconds"], 3),
+        }
@@ -0,0 +1,218 @@
+"""
+本地机会目录：从 Excel/CSV 加载岗位/项目数据，列式缓存 + BM25 检索，为每个画像预选候选项注入 prompt
+"""
+import hashlib
+import math
+import os
+import re
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional
+
+# 表格列名 → 目录字段（兼容原 load_jobs_from_excel 的列名）
+_COLUMNS = {
+    "id": "id",
+    "title": "title",
+    "type": "type",
+    "discipline": "discipline",
+    "educationHistory": "education_history",
+    "preferredHardSkills": "preferred_hard_skills",
+    "preferredSoftSkills": "preferred_soft_skills",
+    "preferredTraining": "preferred_training",
+    "location": "location",
+    "disabilitySupport": "disability_support",
+    "description": "description",
+    "website": "website",
+}
+# 参与检索的字段及权重（标题权重更高）
+_SEARCH_FIELDS = {
+    "title": 2,
+    "discipline": 1,
+    "preferred_hard_skills": 1,
+    "preferred_soft_skills": 1,
+    "preferred_training": 1,
+    "education_history": 1,
+}
+_TOKEN = re.compile(r"[a-z0-9]+")
+_ANY = {"", "all", "any", "remote", "nationwide", "australia-wide"}
+
+
+def _tokens(text: str) -> List[str]:
+    return _TOKEN.findall(text.lower())
+
+
+def _join(value: Any) -> str:
+    if isinstance(value, (list, tuple)):
+        return " ".join(str(v) for v in value)
+    return "" if value is None else str(value)
+
+
+def _source_key(path: str) -> str:
+    st = os.stat(path)
+    raw = f"{os.path.abspath(path)}:{st.st_mtime_ns}:{st.st_size}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def _cache_prefix(path: str) -> str:
+    """File-name prefix shared by every cache generation of one source file."""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return f"{stem}-{hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()[:8]}-"
+
+
+def _prune_cache(cache_dir: str, path: str, keep: str):
+    """Delete older cache files of ``path`` (keyed on a previous mtime/size), keeping ``keep``."""
+    prefix = _cache_prefix(path)
+    # 旧命名（stem-<key>.ext，没有路径指纹）的文件也不会再被读到
+    legacy = re.compile(re.escape(os.path.splitext(os.path.basename(path))[0]) + r"-[0-9a-f]{16}\.(?:parquet|pkl)$")
+    for name in os.listdir(cache_dir):
+        if name == keep or not name.endswith((".parquet", ".pkl")):
+            continue
+        if name.startswith(prefix) or legacy.match(name):
+            try:
+                os.remove(os.path.join(cache_dir, name))
+            except OSError:
+                pass
+
+
+def _read_frame(path: str, cache_dir: Optional[str]):
+    """Read the sheet once; later loads of an unchanged file hit the columnar cache."""
+    import pandas as pd  # 只有用到目录时才加载 pandas
+
+    cache_path = None
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        cache_path = os.path.join(cache_dir, _cache_prefix(path) + _source_key(path))
+        for ext, reader in ((".parquet", pd.read_parquet), (".pkl", pd.read_pickle)):
+            if os.path.exists(cache_path + ext):
+                try:
+                    return reader(cache_path + ext)
+                except Exception:
+                    pass
+
+    if path.lower().endswith((".csv", ".tsv")):
+        df = pd.read_csv(path, sep="\t" if path.lower().endswith(".tsv") else ",", dtype=str)
+    else:
+        df = pd.read_excel(path, sheet_name=0, dtype=str)
+    df = df[[c for c in df.columns if c in _COLUMNS]].rename(columns=_COLUMNS).fillna("")
+
+    if cache_path:
+        try:
+            df.to_parquet(cache_path + ".parquet", index=False)
+            written = cache_path + ".parquet"
+        except Exception:
+            # 没有 pyarrow/fastparquet 时退回 pickle
+            df.to_pickle(cache_path + ".pkl")
+            written = cache_path + ".pkl"
+        # 源文件改过后旧缓存永远不会再命中：写新的同时删掉
+        _prune_cache(cache_dir, path, os.path.basename(written))
+    return df
+
+
+class OpportunityCatalog:
+    """In-process BM25 index over a local opportunities sheet."""
+
+    def __init__(self, rows: List[Dict[str, str]], source: Optional[str] = None, k1: float = 1.5, b: float = 0.75):
+        self.rows = rows
+        self.source = source
+        self.version = _source_key(source) if source and os.path.exists(source) else "inline"
+        self.k1 = k1
+        self.b = b
+        self._build()
+
+    @classmethod
+    def load(cls, path: str, cache_dir: Optional[str] = ".catalog_cache") -> "OpportunityCatalog":
+        started = time.perf_counter()
+        df = _read_frame(path, cache_dir)
+        rows = df.to_dict(orient="records")
+        for i, row in enumerate(rows):
+            row["id"] = row.get("id") or f"catalog-{i + 1}"
+        catalog = cls(rows, source=path)
+        print(f"[CATALOG] Loaded {len(rows)} opportunities from {path} in {time.perf_counter() - started:.2f}s")
+        return catalog
+
+    def changed(self) -> bool:
+        return bool(self.source) and os.path.exists(self.source) and _source_key(self.source) != self.version
+
+    # ---------- index ----------
+    def _build(self):
+        self._postings: Dict[str, List[tuple]] = defaultdict(list)   # term -> [(doc, tf)]
+        self._doc_len: List[int] = []
+        for doc, row in enumerate(self.rows):
+            counts: Counter = Counter()
+            for field, weight in _SEARCH_FIELDS.items():
+                for tok in _tokens(row.get(field, "")):
+                    counts[tok] += weight
+            self._doc_len.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self._postings[term].append((doc, tf))
+        n = max(1, len(self.rows))
+        self._avg_len = (sum(self._doc_len) / n) or 1.0
+        self._idf = {
+            term: math.log(1 + (n - len(p) + 0.5) / (len(p) + 0.5)) for term, p in self._postings.items()
+        }
+        self._loc_tokens = [set(_tokens(r.get("location", ""))) for r in self.rows]
+        self._support_tokens = [set(_tokens(r.get("disability_support", ""))) for r in self.rows]
+
+    # ---------- query ----------
+    @staticmethod
+    def profile_query(profile: Dict[str, Any]) -> List[str]:
+        edu = profile.get("education") or {}
+        emp = profile.get("employment") or {}
+        parts = [
+            _join(edu.get("skills")), _join(edu.get("interests")), _join(edu.get("level")),
+            _join(emp.get("interests")), _join(emp.get("workPreferences")),
+        ]
+        return _tokens(" ".join(parts))
+
+    def _allowed(self, doc: int, loc: set, support: set) -> bool:
+        row_loc = self._loc_tokens[doc]
+        if loc and row_loc and not (row_loc & _ANY) and not (row_loc & loc):
+            return False
+        row_support = self._support_tokens[doc]
+        if support and row_support and not (row_support & _ANY) and not (row_support & support):
+            return False
+        return True
+
+    def search(self, profile: Dict[str, Any], k: int = 8) -> List[Dict[str, str]]:
+        """Top-k rows for a profile by BM25, filtered by location and disability support."""
+        query = self.profile_query(profile)
+        if not query or not self.rows:
+            return []
+        loc = set(_tokens(_join((profile.get("personalInfo") or {}).get("location"))))
+        support = set(_tokens(_join((profile.get("disability") or {}).get("type"))))
+
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(query):
+            idf = self._idf.get(term)
+            if idf is None:
+                continue
+            for doc, tf in self._postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self._doc_len[doc] / self._avg_len)
+                scores[doc] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        ranked = sorted(scores.items(), key=lambda kv: (-kv[1], kv[0]))
+        out = []
+        for doc, _ in ranked:
+            if self._allowed(doc, loc, support):
+                out.append(self.rows[doc])
+                if len(out) >= k:
+                    break
+        return out
+
+
+def render_candidates(rows: List[Dict[str, str]]) -> str:
+    """Compact prompt section listing pre-selected catalog entries."""
+    if not rows:
+        return ""
+    lines = [
+        "",
+        "# Candidate Opportunities (from our verified catalog)",
+        "Prefer these when they fit the user; reuse their id. Only add other items if none are suitable.",
+    ]
+    for row in rows:
+        fields = [f"id={row.get('id', '')}", row.get("title", "")]
+        for key in ("type", "discipline", "location", "preferred_hard_skills", "disability_support", "website"):
+            if row.get(key):
+                fields.append(f"{key}: {row[key]}")
+        lines.append("- " + " | ".join(f for f in fields if f))
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,334 @@
+"""
+异步任务队列：POST /recommend/jobs 立刻返回任务 ID，后台 worker 池从本地 SQLite 队列取任务，
+走与 /recommend 相同的缓存 → 单飞 → 引擎路径；客户端轮询或长轮询 GET /recommend/jobs/{id}。
+
+- 按画像哈希（缓存 key）去重：同一画像排队中/运行中/结果未过期时返回已有任务
+- 重启不丢：任务在库里；worker 领取时写租约，进程崩溃后租约过期即被重新领取，正常关闭时放回队列
+- 结果保留 JOBS_RESULT_TTL 秒后清理；失败按指数退避重试，超过次数记为 failed
+- 级联降级结果（cascade.Degraded）标 degraded，只保留 JOBS_DEGRADED_TTL 秒，且不参与去重：同一画像再提交会重新生成
+- 多个 worker 进程可以共用同一个库（WAL + BEGIN IMMEDIATE 领取）
+
+默认关闭（JOBS_DB 为空时 /recommend/jobs 返回 503），需要时显式打开：
+
+    JOBS_DB=recommend_jobs.db  JOBS_WORKERS=4  JOBS_RESULT_TTL=86400  JOBS_MAX_ATTEMPTS=3
+    JOBS_MAX_QUEUED=10000  JOBS_MAX_WAIT=30  JOBS_DEGRADED_TTL=300
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import time
+import uuid
+from contextlib import closing
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from cascade import Degraded
+from metrics import JOBS_TOTAL
+from profile_schema import ProfileError
+
+Runner = Callable[[Dict[str, Any]], Awaitable[List[Dict[str, Any]]]]
+
+# 终态：done/failed；queued/running 为未完成
+TERMINAL = ("done", "failed")
+
+
+class QueueFullError(RuntimeError):
+    """Too many queued jobs; the client should retry later."""
+
+
+class JobQueue:
+    """Persistent recommendation jobs in SQLite, drained by a pool of asyncio workers."""
+
+    def __init__(self, db_path: str, workers: int = 4, result_ttl: float = 86400.0, max_attempts: int = 3,
+                 lease: float = 120.0, max_queued: int = 10000, poll_interval: float = 1.0,
+                 retry_backoff: float = 2.0, degraded_ttl: float = 300.0):
+        self.db_path = db_path
+        self.workers = workers
+        self.result_ttl = result_ttl
+        self.max_attempts = max_attempts
+        self.lease = lease                      # 领取后多久没完成就视为 worker 已死，可被重新领取
+        self.max_queued = max_queued
+        self.poll_interval = poll_interval      # 没有本进程的提交通知时，多久查一次库（别的进程/重启留下的任务）
+        self.retry_backoff = retry_backoff
+        self.degraded_ttl = degraded_ttl
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._runner: Optional[Runner] = None
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        # 长轮询：每个任务一个 Event，按等待者计数，最后一个等待者离开时才删除
+        self._done_events: Dict[str, asyncio.Event] = {}
+        self._waiters: Dict[str, int] = {}
+        self._running: Set[str] = set()
+        self._interrupted: Set[str] = set()
+        self._stopping = False
+        self._last_purge = 0.0
+        self.stats = {"submitted": 0, "deduped": 0, "done": 0, "failed": 0, "retried": 0, "requeued": 0,
+                      "purged": 0}
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY, key TEXT NOT NULL, status TEXT NOT NULL, profile TEXT NOT NULL,"
+                " result TEXT, error TEXT, attempts INTEGER NOT NULL DEFAULT 0, owner TEXT,"
+                " created_at REAL NOT NULL, updated_at REAL NOT NULL, run_after REAL NOT NULL,"
+                " expires_at REAL, degraded INTEGER NOT NULL DEFAULT 0)"
+            )
+            try:
+                # 旧库没有 degraded 列
+                conn.execute("ALTER TABLE jobs ADD COLUMN degraded INTEGER NOT NULL DEFAULT 0")
+            except sqlite3.OperationalError:
+                pass
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_key ON jobs (key, status)")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, run_after)")
+
+    @classmethod
+    def from_env(cls, lease: float) -> Optional["JobQueue"]:
+        path = os.getenv("JOBS_DB", "")
+        if path in ("", "0"):
+            return None
+        return cls(
+            path,
+            workers=int(os.getenv("JOBS_WORKERS", "4")),
+            result_ttl=float(os.getenv("JOBS_RESULT_TTL", "86400")),
+            max_attempts=int(os.getenv("JOBS_MAX_ATTEMPTS", "3")),
+            lease=lease,
+            max_queued=int(os.getenv("JOBS_MAX_QUEUED", "10000")),
+            degraded_ttl=float(os.getenv("JOBS_DEGRADED_TTL", "300")),
+        )
+
+    # ---------- storage (sync; run via asyncio.to_thread) ----------
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _submit(self, key: str, profile: Dict[str, Any], result: Optional[List[Dict[str, Any]]]):
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT id, status FROM jobs WHERE key = ? AND status != 'failed' AND NOT degraded"
+                " AND (expires_at IS NULL OR expires_at > ?) ORDER BY created_at DESC LIMIT 1",
+                (key, now),
+            ).fetchone()
+            if row is not None:
+                conn.execute("COMMIT")
+                return row["id"], row["status"], True
+            if result is None:
+                queued = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+                if queued >= self.max_queued:
+                    conn.execute("ROLLBACK")
+                    raise QueueFullError(f"{queued} jobs already queued")
+            job_id = uuid.uuid4().hex
+            status = "queued" if result is None else "done"
+            conn.execute(
+                "INSERT INTO jobs (id, key, status, profile, result, created_at, updated_at, run_after, expires_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, key, status, json.dumps(profile, ensure_ascii=False),
+                 None if result is None else json.dumps(result, ensure_ascii=False),
+                 now, now, now, None if result is None else now + self.result_ttl),
+            )
+            conn.execute("COMMIT")
+            return job_id, status, False
+        finally:
+            conn.close()
+
+    def _claim(self) -> Optional[sqlite3.Row]:
+        now = time.time()
+        conn = self._connect()
+        try:
+            # 排队到期的，或租约已过期（领取它的进程崩溃了）的运行中任务；运行中的 run_after 就是租约到期时间
+            return conn.execute(
+                "UPDATE jobs SET status = 'running', owner = ?, attempts = attempts + 1, updated_at = ?,"
+                " run_after = ? WHERE id = (SELECT id FROM jobs WHERE (status = 'queued' AND run_after <= ?)"
+                " OR (status = 'running' AND run_after <= ?) ORDER BY created_at LIMIT 1)"
+                " RETURNING id, key, profile, attempts",
+                (self.owner, now, now + self.lease, now, now),
+            ).fetchone()
+        finally:
+            conn.close()
+
+    def _finish(self, job_id: str, status: str, result: Any = None, error: Optional[str] = None,
+                run_after: Optional[float] = None):
+        now = time.time()
+        degraded = isinstance(result, Degraded)
+        ttl = min(self.result_ttl, self.degraded_ttl) if degraded else self.result_ttl
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, owner = NULL, updated_at = ?, run_after = ?,"
+                " expires_at = ?, degraded = ? WHERE id = ? AND owner = ?",
+                (status, None if result is None else json.dumps(result, ensure_ascii=False), error, now,
+                 run_after if run_after is not None else now,
+                 now + ttl if status in TERMINAL else None, int(degraded), job_id, self.owner),
+            )
+
+    def _get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT id, status, result, error, attempts, created_at, updated_at, expires_at, degraded"
+                " FROM jobs WHERE id = ?", (job_id,),
+            ).fetchone()
+        if row is None or (row["expires_at"] is not None and row["expires_at"] < time.time()):
+            return None
+        job = {"id": row["id"], "status": row["status"], "attempts": row["attempts"],
+               "created_at": row["created_at"], "updated_at": row["updated_at"]}
+        if row["status"] == "done":
+            job["result"] = json.loads(row["result"])
+            if row["degraded"]:
+                job["degraded"] = True
+        elif row["error"]:
+            job["error"] = row["error"]
+        return job
+
+    def _purge(self) -> int:
+        with closing(self._connect()) as conn:
+            return conn.execute("DELETE FROM jobs WHERE expires_at < ?", (time.time(),)).rowcount
+
+    def _counts(self) -> Dict[str, int]:
+        with closing(self._connect()) as conn:
+            return dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+    # ---------- public API ----------
+    async def submit(self, key: str, profile: Dict[str, Any],
+                     result: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """Enqueue a job (or store an already-known ``result`` as done); same key returns the live job."""
+        job_id, status, deduped = await asyncio.to_thread(self._submit, key, profile, result)
+        outcome = "deduped" if deduped else "submitted"
+        self.stats[outcome] += 1
+        JOBS_TOTAL.inc(outcome=outcome)
+        if status == "queued" and self._wakeup is not None:
+            self._wakeup.set()
+        return {"id": job_id, "status": status, "deduped": deduped}
+
+    async def get(self, job_id: str, wait: float = 0.0) -> Optional[Dict[str, Any]]:
+        """Current job state; with ``wait`` > 0 long-polls until the job finishes or the wait runs out."""
+        give_up_at = time.monotonic() + wait
+        job = await asyncio.to_thread(self._get, job_id)
+        if job is None or job["status"] in TERMINAL or wait <= 0:
+            return job
+        event = self._done_events.setdefault(job_id, asyncio.Event())
+        self._waiters[job_id] = self._waiters.get(job_id, 0) + 1
+        try:
+            while True:
+                remaining = give_up_at - time.monotonic()
+                if remaining <= 0:
+                    return job
+                # 本进程完成时立刻唤醒；别的进程完成的任务靠定期查库
+                try:
+                    await asyncio.wait_for(event.wait(), min(remaining, self.poll_interval))
+                except asyncio.TimeoutError:
+                    pass
+                job = await asyncio.to_thread(self._get, job_id)
+                if job is None or job["status"] in TERMINAL:
+                    return job
+        finally:
+            self._waiters[job_id] -= 1
+            if not self._waiters[job_id]:
+                del self._waiters[job_id]
+                self._done_events.pop(job_id, None)
+
+    def _notify(self, job_id: str):
+        # 只置位不删除：等待者各自醒来后自己退出计数
+        event = self._done_events.get(job_id)
+        if event is not None:
+            event.set()
+
+    async def _work(self, job) -> None:
+        job_id = job["id"]
+        if job["attempts"] > self.max_attempts:
+            # 只会发生在租约反复过期时：每次处理它的进程都崩了，不再重试
+            await asyncio.to_thread(self._finish, job_id, "failed", None, "worker lost the job too many times")
+            self.stats["failed"] += 1
+            JOBS_TOTAL.inc(outcome="failed")
+            self._notify(job_id)
+            return
+        self._running.add(job_id)
+        try:
+            recs = await self._runner(json.loads(job["profile"]))
+            await asyncio.to_thread(self._finish, job_id, "done", recs)
+            outcome = "done"
+        except asyncio.CancelledError:
+            # 关闭服务：记下来由 close() 在线程里放回队列（这里不能在事件循环上做阻塞的 sqlite）
+            self._interrupted.add(job_id)
+            raise
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            # 画像不合法重试也没用；其余（超时、卸载、provider 全挂）退避后重试
+            if job["attempts"] < self.max_attempts and not isinstance(e, ProfileError):
+                delay = self.retry_backoff ** job["attempts"]
+                await asyncio.to_thread(self._finish, job_id, "queued", None, error, time.time() + delay)
+                outcome = "retried"
+            else:
+                await asyncio.to_thread(self._finish, job_id, "failed", None, error)
+                outcome = "failed"
+        finally:
+            self._running.discard(job_id)
+        self.stats[outcome] += 1
+        JOBS_TOTAL.inc(outcome=outcome)
+        if outcome != "retried":
+            self._notify(job_id)
+
+    def _requeue(self, job_ids: List[str]) -> int:
+        """Put jobs interrupted by shutdown back in the queue; this attempt does not count."""
+        now = time.time()
+        try:
+            with closing(self._connect()) as conn:
+                return conn.executemany(
+                    "UPDATE jobs SET status = 'queued', owner = NULL, attempts = attempts - 1, run_after = ?"
+                    " WHERE id = ? AND owner = ?", [(now, job_id, self.owner) for job_id in job_ids],
+                ).rowcount
+        except sqlite3.Error as e:
+            print(f"[JOBS] requeue of {len(job_ids)} job(s) failed, lease expiry will recover them: {e}")
+            return 0
+
+    async def _worker(self):
+        while not self._stopping:
+            try:
+                job = await asyncio.to_thread(self._claim)
+            except sqlite3.Error as e:
+                print(f"[JOBS] claim failed: {e}")
+                job = None
+            if job is not None:
+                await self._work(job)
+                continue
+            now = time.monotonic()
+            if now - self._last_purge > 60.0:
+                self._last_purge = now
+                purged = await asyncio.to_thread(self._purge)
+                self.stats["purged"] += purged
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self, runner: Runner):
+        """Start the worker pool in the running event loop (service lifespan)."""
+        self._runner = runner
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+
+    async def close(self, timeout: float = 0.0):
+        """Stop claiming, give running jobs ``timeout`` seconds to finish, then requeue the rest."""
+        self._stopping = True
+        if self._wakeup is not None:
+            self._wakeup.set()
+        deadline = time.monotonic() + timeout
+        while self._running and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._interrupted:
+            # 被打断的任务放回队列，重启后（或别的进程）接着做
+            job_ids, self._interrupted = list(self._interrupted), set()
+            requeued = await asyncio.to_thread(self._requeue, job_ids)
+            self.stats["requeued"] += requeued
+            JOBS_TOTAL.inc(requeued, outcome="requeued")
+
+    async def snapshot(self) -> Dict[str, Any]:
+        counts = await asyncio.to_thread(self._counts)
+        return {**self.stats, "workers": len(self._tasks), "running_here": len(self._running), "jobs": counts}
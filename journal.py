@@ -0,0 +1,187 @@
+"""
+LLM 请求/响应日志（journal）：每次解析写一条 JSONL 记录（prompt、provider、耗时、用量、原始输出、解析结果），
+供 bench/replay_journal.py 重放解析失败、对比解析器改动。
+
+prompt 只记每次请求不同的那部分（用户画像 + 目录候选项），静态前缀用模板指纹 template（prompt_template.PREFIX_ID）代替；
+LLM_JOURNAL_PROMPTS=0 时只留 prompt_hash 和 template（画像里有个人信息时用），pipeline 重放就只能用占位 prompt。
+
+请求路径里只做一次 put_nowait；后台任务攒批写入、每批一次 fsync，按大小轮转（path → path.1 → …）。
+队列满时丢弃记录并计数，绝不阻塞请求。
+
+默认关闭，需要时显式打开：
+
+    LLM_JOURNAL=llm_journal.jsonl       （不设、空字符串或 0 都是关闭；多 worker 可写成 journal-{pid}.jsonl）
+    LLM_JOURNAL_PROMPTS=1  LLM_JOURNAL_MAX_MB=64  LLM_JOURNAL_BACKUPS=5  LLM_JOURNAL_QUEUE=10000
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+import uuid
+from typing import Any, Dict, Iterator, List, Optional
+
+from metrics import JOURNAL_RECORDS_TOTAL
+from prompt_template import PREFIX_ID, split_prompt
+
+
+def prompt_hash(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+
+
+class Journal:
+    """Append-only JSONL journal fed through a bounded queue and a background writer task."""
+
+    def __init__(self, path: Optional[str], max_bytes: int = 64 << 20, backups: int = 5,
+                 queue_size: int = 10000, batch_size: int = 512, flush_interval: float = 0.5,
+                 store_prompts: bool = True):
+        self.path = path or None
+        self.store_prompts = store_prompts
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.stats = {"written": 0, "dropped": 0, "errors": 0, "batches": 0, "rotations": 0}
+
+    @classmethod
+    def from_env(cls) -> "Journal":
+        path = os.getenv("LLM_JOURNAL", "")
+        return cls(
+            path if path not in ("", "0") else None,
+            max_bytes=int(float(os.getenv("LLM_JOURNAL_MAX_MB", "64")) * (1 << 20)),
+            backups=int(os.getenv("LLM_JOURNAL_BACKUPS", "5")),
+            queue_size=int(os.getenv("LLM_JOURNAL_QUEUE", "10000")),
+            store_prompts=os.getenv("LLM_JOURNAL_PROMPTS", "1") not in ("", "0"),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    def prompt_fields(self, prompt: str) -> Dict[str, Any]:
+        """Fields identifying ``prompt`` in a record: hash, template fingerprint and the per-request part."""
+        prefix, rest = split_prompt(prompt)
+        fields: Dict[str, Any] = {"prompt_hash": prompt_hash(prompt), "template": PREFIX_ID if prefix else None}
+        if self.store_prompts:
+            fields["prompt"] = rest
+        return fields
+
+    def _file(self) -> str:
+        # 每个 worker 进程写自己的文件时用 {pid}
+        return self.path.replace("{pid}", str(os.getpid()))
+
+    # ---------- request path ----------
+    def record(self, entry: Dict[str, Any]):
+        """Queue one record; never blocks. Outside an event loop (CLI) it is written directly."""
+        if not self.enabled:
+            return
+        entry.setdefault("id", uuid.uuid4().hex[:16])
+        entry.setdefault("ts", round(time.time(), 3))
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._write([entry])
+            return
+        if self._loop is not loop or self._task is None or self._task.done():
+            # 每个事件循环（每个 worker / 每次 asyncio.run）各自一个队列和写入任务
+            self._loop = loop
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+            self._task = loop.create_task(self._run(self._queue))
+        try:
+            self._queue.put_nowait(entry)
+        except asyncio.QueueFull:
+            self.stats["dropped"] += 1
+            JOURNAL_RECORDS_TOTAL.inc(outcome="dropped")
+
+    # ---------- background writer ----------
+    async def _run(self, queue: asyncio.Queue):
+        batch: List[Dict[str, Any]] = []
+        try:
+            while True:
+                batch.append(await queue.get())
+                if queue.qsize() < self.batch_size:
+                    # 攒一会儿，让一次 fsync 覆盖更多记录
+                    await asyncio.sleep(self.flush_interval)
+                while len(batch) < self.batch_size and not queue.empty():
+                    batch.append(queue.get_nowait())
+                items, batch = batch, []
+                await asyncio.to_thread(self._write, items)
+        except asyncio.CancelledError:
+            # 关闭（或 asyncio.run 结束）时把剩下的同步写完
+            while not queue.empty():
+                batch.append(queue.get_nowait())
+            if batch:
+                self._write(batch)
+            raise
+
+    def _write(self, items: List[Dict[str, Any]]):
+        blob = "".join(json.dumps(it, ensure_ascii=False, default=str) + "\n" for it in items).encode("utf-8")
+        path = self._file()
+        try:
+            # 一次 write 追加整批：多个进程写同一文件时行不会交错
+            fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, blob)
+                os.fsync(fd)
+                size = os.fstat(fd).st_size
+            finally:
+                os.close(fd)
+            if self.max_bytes and size >= self.max_bytes:
+                self._rotate(path)
+        except OSError as e:
+            self.stats["errors"] += len(items)
+            JOURNAL_RECORDS_TOTAL.inc(len(items), outcome="error")
+            print(f"[JOURNAL] write to {path} failed: {e}")
+            return
+        self.stats["written"] += len(items)
+        self.stats["batches"] += 1
+        JOURNAL_RECORDS_TOTAL.inc(len(items), outcome="written")
+
+    def _rotate(self, path: str):
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{path}.{i}"):
+                os.replace(f"{path}.{i}", f"{path}.{i + 1}")
+        if self.backups > 0:
+            os.replace(path, f"{path}.1")
+        else:
+            os.remove(path)
+        self.stats["rotations"] += 1
+
+    async def close(self):
+        """Flush queued records and stop the writer (service shutdown)."""
+        task, self._task = self._task, None
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {**self.stats, "path": self.path, "queued": self._queue.qsize() if self._queue is not None else 0}
+
+
+def iter_journal(path: str) -> Iterator[Dict[str, Any]]:
+    """Records of a journal file and its rotated backups, oldest first; torn lines are skipped."""
+    files = []
+    i = 1
+    while os.path.exists(f"{path}.{i}"):
+        files.append(f"{path}.{i}")
+        i += 1
+    files.reverse()
+    if os.path.exists(path):
+        files.append(path)
+    for name in files:
+        with open(name, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+JOURNAL = Journal.from_env()
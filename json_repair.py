@@ -0,0 +1,277 @@
+"""
+容错 JSON 解析：一次扫描完成围栏/前后缀剥离、字符串内裸换行转义、括号补全和数组条目提取。
+既可以一次性解析完整文本，也可以 feed() 流式片段。
+"""
+import json
+import re
+from typing import Any, List, Optional, Tuple
+
+# 字符串内部需要关心的字符
+_STR_SPECIAL = re.compile(r'["\\\n\r]')
+# 字符串外部：一次吞掉“完整合法字符串 + 非结构字符”的连续片段，停在括号或无法闭合的引号处
+_RUN = re.compile(r'(?:"(?:[^"\\\r\n]|\\.)*"|[^"\[\]{}])*')
+_DOC_START = re.compile(r'[\[{]')
+# ```json / ``` 围栏开头（语言标记可有可无）
+_FENCE = re.compile(r"```[\w-]*[ \t]*\r?\n?")
+
+_CLOSER = {"[": "]", "{": "}"}
+
+
+class IncrementalJSONParser:
+    """Single-pass tolerant parser for LLM JSON output.
+
+    ``feed()`` accepts text chunks and returns the items of the recommendation
+    array that became complete in that chunk (already decoded). ``close()``
+    returns the whole document. A document truncated inside the item array
+    yields the complete items seen so far; otherwise open strings and brackets
+    are closed. ``method`` records which path produced the result: ``direct``,
+    ``repaired`` or ``items``.
+
+    Text before the first ``[``/``{`` (prose, ```json fences) and after the
+    top-level value closes is ignored. A bracketed value that holds no object
+    (``Sure [see below]:``, ``(see {rules})``) is treated as prose and the
+    scan resumes at the next ``[``/``{``. Raw newlines inside strings are
+    escaped, stray closers are dropped and trailing commas removed.
+    """
+
+    def __init__(self, decode_items: bool = True):
+        # decode_items=False 时条目只在 close() 需要回退时才解码（一次性解析用）
+        self.decode_items = decode_items
+        self._fallback = None           # 被当作正文跳过、但本身是合法 JSON 的值（后面没有更好的才用）
+        self._decoded = None            # 已完整闭合的顶层值（判断是否跳过时已解码过）
+        self._reset()
+
+    def _reset(self):
+        self.started = False
+        self.finished = False
+        self.in_str = False
+        self.esc = False
+        self.stack: List[str] = []      # 期望的闭合字符
+        self.out: List[str] = []        # 修复后的文档片段
+        self.item_depth = None          # 条目数组所在深度
+        self.in_item = False
+        self.item_start = 0             # 当前条目在 out 中的起始下标
+        self.items: List[Any] = []
+        self._raw_items: List[str] = []
+        self.repaired = False
+        self.method = None
+
+    # ---------- helpers ----------
+    @staticmethod
+    def _drop_trailing_comma(buf: List[str]) -> bool:
+        for i in range(len(buf) - 1, -1, -1):
+            piece = buf[i].rstrip()
+            if not piece:
+                continue
+            if piece.endswith(","):
+                buf[i] = piece[:-1]
+                return True
+            return False
+        return False
+
+    def _open(self, ch: str):
+        depth = len(self.stack) + 1
+        if ch == "[" and self.item_depth is None and (depth == 1 or (depth == 2 and self.stack[0] == "}")):
+            self.item_depth = depth
+        elif ch == "{" and not self.in_item and self.item_depth is not None and len(self.stack) == self.item_depth:
+            self.in_item = True
+            self.item_start = len(self.out)
+        self.stack.append(_CLOSER[ch])
+        self.out.append(ch)
+
+    def _close(self, ch: str) -> List[Any]:
+        if not self.stack or self.stack[-1] != ch:
+            # 不匹配的闭合符直接丢弃
+            self.repaired = True
+            return []
+        if self._drop_trailing_comma(self.out):
+            self.repaired = True
+        self.stack.pop()
+        self.out.append(ch)
+        if not self.stack:
+            self.finished = True
+        if ch == "}" and self.in_item and len(self.stack) == self.item_depth:
+            self.in_item = False
+            raw = "".join(self.out[self.item_start:])
+            if not self.decode_items:
+                self._raw_items.append(raw)
+                return []
+            try:
+                item = json.loads(raw)
+            except Exception:
+                return []
+            self.items.append(item)
+            return [item]
+        return []
+
+    def _keep_finished(self) -> bool:
+        """A top-level value closed; False when it is prose in brackets and the scan should go on."""
+        if self.items or self._raw_items:
+            return True
+        try:
+            data = json.loads("".join(self.out))
+        except ValueError:
+            return False
+        if isinstance(data, dict) or (isinstance(data, list) and any(isinstance(x, dict) for x in data)):
+            self._decoded = (data, "repaired" if self.repaired else "direct")
+            return True
+        if self._fallback is None:
+            self._fallback = (data, "repaired" if self.repaired else "direct")
+        return False
+
+    def _complete_items(self) -> List[Any]:
+        if self._raw_items:
+            for raw in self._raw_items:
+                try:
+                    self.items.append(json.loads(raw))
+                except Exception:
+                    pass
+            self._raw_items = []
+        return self.items
+
+    # ---------- public API ----------
+    def feed(self, chunk: str) -> List[Any]:
+        """Consume a chunk; return items of the recommendation array completed by it."""
+        done: List[Any] = []
+        out = self.out
+        i, n = 0, len(chunk)
+        while i < n and not self.finished:
+            if not self.started:
+                m = _DOC_START.search(chunk, i)
+                if m is None:
+                    break
+                self.started = True
+                i = m.start()
+            if self.in_str:
+                # 慢路径：字符串跨片段或含裸换行
+                if self.esc:
+                    out.append(chunk[i])
+                    self.esc = False
+                    i += 1
+                    continue
+                m = _STR_SPECIAL.search(chunk, i)
+                if m is None:
+                    out.append(chunk[i:])
+                    break
+                j = m.start()
+                if j > i:
+                    out.append(chunk[i:j])
+                c = chunk[j]
+                i = j + 1
+                if c == "\\":
+                    if i < n:
+                        out.append(chunk[j:i + 1])
+                        i += 1
+                    else:
+                        out.append(c)
+                        self.esc = True
+                elif c == '"':
+                    out.append(c)
+                    self.in_str = False
+                else:
+                    # 字符串内部的裸换行 → 转义
+                    out.append("\\n" if c == "\n" else "\\r")
+                    self.repaired = True
+                continue
+            j = _RUN.match(chunk, i).end()
+            if j > i:
+                out.append(chunk[i:j])
+            if j >= n:
+                break
+            c = chunk[j]
+            i = j + 1
+            if c == '"':
+                out.append(c)
+                self.in_str = True
+            elif c in "[{":
+                self._open(c)
+            else:
+                done.extend(self._close(c))
+                if self.finished and not self._keep_finished():
+                    # 例如 "Sure [see below]:" —— 不是推荐，从下一个 [/{ 继续找
+                    self._reset()
+                    out = self.out
+        return done
+
+    def close(self) -> Any:
+        """Return the parsed document; raises ValueError if nothing usable was found."""
+        if not self.started:
+            if self._fallback is not None:
+                data, self.method = self._fallback
+                return data
+            raise ValueError("no JSON value found")
+        if self._decoded is not None:
+            data, self.method = self._decoded
+            return data
+        if not self.finished and self._complete_items():
+            # 截断在条目数组内：只保留已完整的条目，不返回被截断的半个条目
+            self.method = "items"
+            return list(self.items)
+        doc = "".join(self.out)
+        if not self.finished:
+            self.repaired = True
+            tail = []
+            if self.in_str:
+                if self.esc:
+                    doc = doc[:-1]
+                tail.append('"')
+            doc = doc + "".join(tail)
+            stripped = doc.rstrip()
+            if stripped.endswith(","):
+                doc = stripped[:-1]
+            elif stripped.endswith(":"):
+                doc = stripped + " null"
+            doc += "".join(reversed(self.stack))
+        try:
+            data = json.loads(doc)
+            self.method = "repaired" if self.repaired else "direct"
+            return data
+        except Exception:
+            pass
+        if self._complete_items():
+            self.method = "items"
+            return list(self.items)
+        if self._fallback is not None:
+            data, self.method = self._fallback
+            return data
+        raise ValueError("could not parse JSON")
+
+
+def _fenced_body(text: str) -> Optional[str]:
+    """Body of the first ``` fence (to the closing fence, or to the end when truncated); None without one."""
+    m = _FENCE.search(text)
+    if m is None:
+        return None
+    end = text.find("```", m.end())
+    return text[m.end():] if end < 0 else text[m.end():end]
+
+
+def loads_tolerant(text: str) -> Tuple[Any, str]:
+    """Parse LLM output; returns ``(data, method)`` where method is direct/repaired/items.
+
+    A ``` fence is parsed first, so brackets in the prose before it do not
+    matter; if the fenced body does not parse, the whole text is scanned.
+    """
+    body = _fenced_body(text)
+    if body is not None:
+        try:
+            return _loads(body)
+        except ValueError:
+            pass
+    return _loads(text)
+
+
+def _loads(text: str) -> Tuple[Any, str]:
+    # 快速路径：截取第一个 [/{ 到最后一个 ]/}，交给 C 实现的 json.loads
+    m = _DOC_START.search(text)
+    if m is not None:
+        end = max(text.rfind("]"), text.rfind("}"))
+        if end > m.start():
+            try:
+                return json.loads(text[m.start():end + 1]), "direct"
+            except Exception:
+                pass
+    parser = IncrementalJSONParser(decode_items=False)
+    parser.feed(text)
+    data = parser.close()
+    return data, parser.method
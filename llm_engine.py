@@ -0,0 +1,128 @@
+"""
+多 provider 执行引擎：对冲请求（hedging）+ 失败转移（failover）+ 单请求截止时间
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class ProviderLatency:
+    """Rolling window of successful call latencies for one provider."""
+
+    def __init__(self, window: int = 200):
+        self.samples: deque = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        idx = min(len(ordered) - 1, int(q * len(ordered)))
+        return ordered[idx]
+
+
+class HedgedExecutor:
+    """Run a prompt against an ordered list of scorers.
+
+    The first scorer is tried immediately. If it has not answered within the
+    hedge delay (its observed p95 latency once ``min_samples`` calls have been
+    seen, else ``default_hedge_delay``) the next scorer is started in parallel.
+    A scorer that errors or whose output ``parse_response`` turns into an empty
+    list triggers failover to the next one. The first non-empty result wins and
+    every other in-flight call is cancelled.
+    """
+
+    def __init__(self, scorers: List[Any], default_hedge_delay: float = 8.0,
+                 hedge_quantile: float = 0.95, min_samples: int = 20, deadline: float = 60.0):
+        if not scorers:
+            raise ValueError("HedgedExecutor needs at least one scorer")
+        self.scorers = scorers
+        self.default_hedge_delay = default_hedge_delay
+        self.hedge_quantile = hedge_quantile
+        self.min_samples = min_samples
+        self.deadline = deadline
+        self.latency: Dict[str, ProviderLatency] = {s.provider: ProviderLatency() for s in scorers}
+        self.stats = {"requests": 0, "hedges": 0, "failovers": 0, "deadline_exceeded": 0, "wins": {}}
+
+    @property
+    def primary(self):
+        return self.scorers[0]
+
+    def hedge_delay(self, provider: str) -> float:
+        lat = self.latency[provider]
+        if len(lat.samples) >= self.min_samples:
+            return lat.quantile(self.hedge_quantile)
+        return self.default_hedge_delay
+
+    async def _attempt(self, scorer, prompt: str) -> List[Dict[str, Any]]:
+        started = time.perf_counter()
+        llm_resp = await scorer.call_llm(prompt)
+        recs = scorer.parse_response(llm_resp)
+        if not recs:
+            raise ValueError(f"{scorer.provider}: empty or unparseable response")
+        self.latency[scorer.provider].record(time.perf_counter() - started)
+        return recs
+
+    async def run(self, prompt: str, deadline: Optional[float] = None) -> Tuple[List[Dict[str, Any]], str]:
+        """Return ``(recommendations, provider)``; raises on deadline or when every provider fails."""
+        self.stats["requests"] += 1
+        budget = self.deadline if deadline is None else deadline
+        loop = asyncio.get_running_loop()
+        give_up_at = loop.time() + budget
+
+        queue = list(self.scorers)
+        running: Dict[asyncio.Task, Any] = {}
+        last_error: Optional[BaseException] = None
+
+        def _launch():
+            scorer = queue.pop(0)
+            task = asyncio.ensure_future(self._attempt(scorer, prompt))
+            running[task] = scorer
+            return scorer
+
+        newest = _launch()
+        try:
+            while running:
+                remaining = give_up_at - loop.time()
+                if remaining <= 0:
+                    self.stats["deadline_exceeded"] += 1
+                    raise asyncio.TimeoutError(f"no provider answered within {budget:.1f}s")
+                # 还有备选 provider 时，只等到对冲时间点
+                timeout = min(remaining, self.hedge_delay(newest.provider)) if queue else remaining
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    if queue:
+                        self.stats["hedges"] += 1
+                        newest = _launch()
+                    continue
+
+                for task in done:
+                    scorer = running.pop(task)
+                    if task.exception() is None:
+                        wins = self.stats["wins"]
+                        wins[scorer.provider] = wins.get(scorer.provider, 0) + 1
+                        return task.result(), scorer.provider
+                    last_error = task.exception()
+                    print(f"[ENGINE] {scorer.provider} failed: {last_error}")
+
+                # 失败转移：没有其他请求在跑时立刻启动下一个
+                if queue and not running:
+                    self.stats["failovers"] += 1
+                    newest = _launch()
+            raise RuntimeError(f"all providers failed: {last_error}") from last_error
+        finally:
+            # 同一轮一起完成但没用上的任务：取走异常（否则 "Task exception was never retrieved"）；
+            # 还在跑的取消并等它们真正结束，不把连接/限流名额留在后台
+            pending = []
+            for task in running:
+                if not task.done():
+                    task.cancel()
+                    pending.append(task)
+                elif not task.cancelled():
+                    task.exception()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
@@ -0,0 +1,187 @@
+"""
+轻量 Prometheus 指标：Counter / Histogram（带标签），以文本格式输出给 /metrics
+"""
+import bisect
+import threading
+from typing import Dict, Iterable, List, Tuple
+
+# 覆盖从微秒级解析到数十秒 LLM 调用的默认分桶（秒）
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labels)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Iterable[str] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        for key, v in sorted(self._values.items()):
+            lines.append(f"{self.name}{_fmt_labels(self.labels, key)} {v:g}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Iterable[str] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [bucket counts..., sum, count]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            idx = bisect.bisect_left(self.buckets, value)
+            if idx < len(self.buckets):
+                row[idx] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        for key, row in sorted(self._values.items()):
+            cumulative = 0.0
+            for bound, n in zip(self.buckets, row):
+                cumulative += n
+                le = 'le="%g"' % bound
+                lines.append(f"{self.name}_bucket{_fmt_labels(self.labels, key, le)} {cumulative:g}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_fmt_labels(self.labels, key, le)} {row[-1]:g}")
+            lines.append(f"{self.name}_sum{_fmt_labels(self.labels, key)} {row[-2]:.6f}")
+            lines.append(f"{self.name}_count{_fmt_labels(self.labels, key)} {row[-1]:g}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help_text: str, labels: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, help_text, labels))
+
+    def gauge(self, name: str, help_text: str, labels: Iterable[str] = ()) -> Gauge:
+        return self.register(Gauge(name, help_text, labels))
+
+    def histogram(self, name: str, help_text: str, labels: Iterable[str] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help_text, labels, buckets))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# ---------- recommendation pipeline metrics ----------
+STAGE_SECONDS = REGISTRY.histogram(
+    "llm_stage_seconds",
+    "Latency of each /recommend stage (prompt_build, connection_acquire, ttfb, response_read, llm_call, parse, total)",
+    ("stage", "provider", "model"),
+)
+PARSE_TOTAL = REGISTRY.counter(
+    "llm_parse_total",
+    "parse_response outcomes by decode path (structured, strict, continued, direct, repaired, items, failed)",
+    ("provider", "model", "method"),
+)
+STRUCTURED_OUTPUT_TOTAL = REGISTRY.counter(
+    "llm_structured_output_total",
+    "Structured-output decode outcomes (native, strict, fallback to repair parsing, off)",
+    ("provider", "model", "outcome"),
+)
+TRUNCATION_TOTAL = REGISTRY.counter(
+    "llm_truncations_total",
+    "Answers cut off by max_tokens, by handling (continued, complete_items, continuation_failed)",
+    ("provider", "model", "action"),
+)
+TOKENS_TOTAL = REGISTRY.counter(
+    "llm_tokens_total",
+    "Tokens reported by the provider, normalized across response formats",
+    ("provider", "model", "kind"),
+)
+LLM_CALLS_TOTAL = REGISTRY.counter(
+    "llm_calls_total",
+    "Provider calls by outcome",
+    ("provider", "model", "outcome"),
+)
+RECOMMEND_TOTAL = REGISTRY.counter(
+    "recommend_requests_total",
+    "Recommendation requests by endpoint and cache outcome",
+    ("endpoint", "cache"),
+)
+JOURNAL_RECORDS_TOTAL = REGISTRY.counter(
+    "llm_journal_records_total",
+    "Request/response journal records by outcome (written, dropped on a full queue, error)",
+    ("outcome",),
+)
+SPECULATION_TOTAL = REGISTRY.counter(
+    "recommend_speculation_total",
+    "Speculative pre-generation outcomes (started, reused, cancelled, wasted, skipped_* by budget cap, ready)",
+    ("outcome",),
+)
+CASCADE_TOTAL = REGISTRY.counter(
+    "llm_cascade_total",
+    "Model cascade decisions per cheap provider (accepted, rejected by quality check reason, fallback)",
+    ("provider", "outcome", "reason"),
+)
+JOBS_TOTAL = REGISTRY.counter(
+    "recommend_jobs_total",
+    "Recommendation job queue events (submitted, deduped, done, retried, failed, requeued on shutdown)",
+    ("outcome",),
+)
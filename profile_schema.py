@@ -0,0 +1,142 @@
+"""
+用户画像的编译型 schema（pydantic-core）：请求体一次完成 JSON 解码 + 校验，限制字符串/列表大小，
+不合法的画像在任何 provider 调用之前就被拒绝（413/422），create_prompt 拿到的是类型化对象。
+
+字段与 src/components/ProfileForm.tsx 的 UserProfile 一致；未知字段忽略。
+"""
+from functools import cached_property
+from typing import Annotated, Any, Dict, List, Optional, Union
+
+from pydantic import BaseModel, BeforeValidator, ConfigDict, Field, StringConstraints, ValidationError, model_validator
+
+# 请求体与单个字段的上限
+MAX_BODY_BYTES = 64 * 1024
+MAX_SHORT = 200       # 名称、地点、等级等短字段，以及列表里的每一项
+MAX_TEXT = 4000       # 描述、工作经历等自由文本
+MAX_ITEMS = 50        # 每个列表字段的条数
+
+
+class ProfileError(ValueError):
+    """Profile rejected before any provider work; ``status`` is the HTTP status to answer with."""
+
+    def __init__(self, status: int, message: str, details: Optional[List[Dict[str, Any]]] = None):
+        super().__init__(message)
+        self.status = status
+        self.details = details or []
+
+    def __str__(self) -> str:
+        if not self.details:
+            return self.args[0]
+        return self.args[0] + ": " + "; ".join(f"{d['loc']}: {d['msg']}" for d in self.details[:5])
+
+    def payload(self) -> Dict[str, Any]:
+        return {"error": self.args[0], "details": self.details}
+
+
+def _text(value: Any) -> Any:
+    # null → ""，数字按字符串处理（例如 severity: 3）
+    if value is None:
+        return ""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    return value
+
+
+def _items(value: Any) -> Any:
+    # 单个字符串当作一项；null → []
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [value] if value.strip() else []
+    return value
+
+
+Short = Annotated[str, StringConstraints(max_length=MAX_SHORT), BeforeValidator(_text)]
+Text = Annotated[str, StringConstraints(max_length=MAX_TEXT), BeforeValidator(_text)]
+Items = Annotated[List[Short], BeforeValidator(_items), Field(max_length=MAX_ITEMS)]
+
+
+class _Section(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
+
+class PersonalInfo(_Section):
+    name: Short = ""
+    # 前端发字符串，CLI 的画像文件里是数字
+    age: Union[Annotated[int, Field(ge=0, le=150)], Annotated[str, StringConstraints(max_length=20)], None] = None
+    location: Short = ""
+    communicationMode: Short = ""
+
+
+class Disability(_Section):
+    type: Items = []
+    description: Text = ""
+    severity: Short = ""
+
+
+class Education(_Section):
+    level: Short = ""
+    skills: Items = []
+    interests: Items = []
+
+
+class Employment(_Section):
+    history: Text = ""
+    interests: Items = []
+    workPreferences: Items = []
+
+
+class Needs(_Section):
+    financial: Items = []
+    support: Items = []
+    technology: Items = []
+    priority: Text = ""
+
+
+class Profile(_Section):
+    """A validated user profile; attribute access mirrors the JSON keys used by the prompt template."""
+
+    personalInfo: PersonalInfo = PersonalInfo()
+    disability: Disability = Disability()
+    education: Education = Education()
+    employment: Employment = Employment()
+    needs: Needs = Needs()
+
+    @model_validator(mode="after")
+    def _not_empty(self) -> "Profile":
+        # 空画像只会得到泛泛的推荐，不值得一次 LLM 调用
+        d, e, n = self.disability, self.education, self.needs
+        if not (d.type or d.description or e.level or e.skills or e.interests or self.employment.interests
+                or self.employment.workPreferences or n.financial or n.support or n.technology or n.priority):
+            raise ValueError("profile has no disability, education, employment or needs information")
+        return self
+
+    @cached_property
+    def data(self) -> Dict[str, Any]:
+        """Plain-dict form for the caches, catalog search and re-ranking (computed once)."""
+        return self.model_dump()
+
+
+def _details(e: ValidationError) -> List[Dict[str, Any]]:
+    return [{"loc": ".".join(str(p) for p in err["loc"]) or "profile", "msg": err["msg"]}
+            for err in e.errors(include_url=False, include_input=False, include_context=False)]
+
+
+def parse_profile(body: bytes, max_bytes: int = MAX_BODY_BYTES) -> Profile:
+    """Decode and validate a JSON request body in one pass."""
+    if len(body) > max_bytes:
+        raise ProfileError(413, f"profile body exceeds {max_bytes} bytes")
+    try:
+        return Profile.model_validate_json(body)
+    except ValidationError as e:
+        raise ProfileError(422, "invalid profile", _details(e)) from None
+
+
+def validate_profile(value: Any) -> Profile:
+    """Validate an already-decoded profile (batch lines)."""
+    if isinstance(value, Profile):
+        return value
+    try:
+        return Profile.model_validate(value)
+    except ValidationError as e:
+        raise ProfileError(422, "invalid profile", _details(e)) from None
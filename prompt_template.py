@@ -0,0 +1,158 @@
+"""
+预编译 prompt 模板：静态的顾问说明/评分规则/输出格式放在最前面作为可缓存前缀，
+用户画像部分由编译好的渲染器填充，便于各家 provider 的 prompt caching 命中
+"""
+import hashlib
+import re
+from typing import Any, Dict, List, Sequence, Tuple
+
+# 所有请求完全相同的前缀：不要在这里放任何与用户相关的内容，否则前缀缓存失效
+STATIC_PREFIX = """You are an experienced career and disability support advisor. Analyze the user’s profile (given after these instructions) and recommend the most relevant programs, funding opportunities, or job placements. Be empathetic, realistic, and supportive.
+
+# Matching & Scoring Rules
+1. Evaluate eligibility for government programs, non-profit funding, or accessible jobs.
+2. Consider disability type, severity, education level, and user needs when assessing relevance.
+3. Relevance scoring (0–100):
+   * 30% eligibility (criteria match)
+   * 30% alignment with needs and work preferences
+   * 40% alignment with education/skills/interests
+4. Recommendations must be constructive and tailored to the user’s location and communication needs.
+5. Do not suggest opportunities below the user’s education or capability level.
+6. Provide practical next steps and trusted contact information.
+
+# Output Requirements
+Return a JSON array of recommended opportunities in the format below. Include at least 2–3 items if possible.
+When a response schema or tool is provided, return the same items wrapped as {"recommendations": [...]}.
+
+```json
+[
+  {
+    "id": "unique identifier",
+    "name": "Program or Job Name",
+    "type": "program | job | funding",
+    "description": "Short plain-language description",
+    "eligibility": ["List of eligibility requirements"],
+    "benefits": "Key benefits for the user",
+    "applicationSteps": ["Step 1", "Step 2", "Step 3"],
+    "contactInfo": {
+      "website": "URL",
+      "phone": "phone number",
+      "email": "email if available"
+    },
+    "relevanceScore": 0,
+    "location": "user location or Remote"
+  }
+]
+```
+"""
+
+PROFILE_TEMPLATE = """# User Profile
+
+**Personal Info**
+- Name: {personalInfo.name}
+- Age: {personalInfo.age}
+- Location: {personalInfo.location}
+- Communication Mode: {personalInfo.communicationMode}
+
+**Disability**
+- Type: {disability.type}
+- Description: {disability.description}
+- Severity: {disability.severity}
+
+**Education**
+- Level: {education.level}
+- Skills: {education.skills}
+- Interests: {education.interests}
+
+**Employment**
+- History: {employment.history}
+- Interests: {employment.interests}
+- Work Preferences: {employment.workPreferences}
+
+**Needs & Priorities**
+- Financial: {needs.financial}
+- Support: {needs.support}
+- Technology: {needs.technology}
+- Priority: {needs.priority}
+"""
+
+# 前缀指纹：用作 OpenAI prompt_cache_key，前缀内容一改就换 key
+PREFIX_ID = "rec-" + hashlib.sha1(STATIC_PREFIX.encode("utf-8")).hexdigest()[:12]
+
+CLOSING = "\nReturn only the JSON array described in the output requirements above.\n"
+
+_PLACEHOLDER = re.compile(r"\{([A-Za-z_][\w.]*)\}")
+
+
+class CompiledTemplate:
+    """Template split once into literal chunks and key paths; rendering is a single join."""
+
+    def __init__(self, source: str):
+        self.source = source
+        self.parts: List[Tuple[str, Tuple[str, ...]]] = []
+        pos = 0
+        for m in _PLACEHOLDER.finditer(source):
+            self.parts.append((source[pos:m.start()], tuple(m.group(1).split("."))))
+            pos = m.end()
+        self.tail = source[pos:]
+
+    @staticmethod
+    def _lookup(data: Any, path: Sequence[str]) -> str:
+        for key in path:
+            # 普通 dict 或类型化画像（profile_schema.Profile）都可以
+            data = data.get(key) if isinstance(data, dict) else getattr(data, key, None)
+            if data is None:
+                return ""
+        if isinstance(data, (list, tuple)):
+            return ", ".join(str(v) for v in data)
+        return str(data)
+
+    def render(self, data: Dict[str, Any]) -> str:
+        out: List[str] = []
+        for literal, path in self.parts:
+            out.append(literal)
+            out.append(self._lookup(data, path))
+        out.append(self.tail)
+        return "".join(out)
+
+
+class Prompt(str):
+    """Prompt text that remembers which leading part is static and safe to cache.
+
+    Behaves like the full prompt string everywhere; provider calls use
+    ``prefix``/``suffix`` to send the static block as a cacheable system part.
+    """
+
+    prefix: str
+    suffix: str
+
+    def __new__(cls, prefix: str, suffix: str):
+        obj = super().__new__(cls, prefix + suffix)
+        obj.prefix = prefix
+        obj.suffix = suffix
+        return obj
+
+
+PROFILE_RENDERER = CompiledTemplate(PROFILE_TEMPLATE)
+
+
+def build_prompt(profile: Dict[str, Any], candidates: str = "") -> Prompt:
+    """Static prefix + rendered profile (+ catalog candidates)."""
+    return Prompt(STATIC_PREFIX, PROFILE_RENDERER.render(profile) + candidates + CLOSING)
+
+
+def build_continuation(prompt: str, done_names: List[str], remaining: int) -> str:
+    """Follow-up for a truncated answer: same cacheable prefix, ask only for the missing items."""
+    prefix, rest = split_prompt(prompt)
+    done = "\n".join(f"- {n}" for n in done_names) or "- (none)"
+    note = (f"\n# Continuation\nYour previous answer was cut off. Already returned:\n{done}\n"
+            f"Return ONLY {remaining} additional item(s) in the same format, without repeating the ones above.\n")
+    return Prompt(prefix, rest + note) if prefix else rest + note
+
+
+def split_prompt(prompt: str) -> Tuple[str, str]:
+    """``(cacheable_prefix, per_request_part)``; the prefix is empty for plain strings."""
+    prefix = getattr(prompt, "prefix", "")
+    if prefix:
+        return prefix, prompt.suffix
+    return "", str(prompt)
@@ -0,0 +1,522 @@
+"""
+Provider 适配器注册表：每种线路协议一个类，负责构建请求体、解析响应、抽取 token 用量和流式增量；
+HTTP 收发统一走 transport.py 的共享连接池。
+
+LLM_CONFIGS 里每个 provider 的 "adapter" 字段决定用哪个类；本地/自建的 OpenAI 兼容端点
+（vLLM、Ollama、LM Studio 等）只需写配置即可注册，见 load_provider_config。
+"""
+import json
+from typing import Any, AsyncIterator, Dict, Optional, Tuple, Type
+
+import aiohttp
+
+from prompt_template import PREFIX_ID, split_prompt
+from rec_schema import (GEMINI_RESPONSE_SCHEMA, MODE_JSON_OBJECT, MODE_RESPONSE_SCHEMA, MODE_TOOL, TOOL_NAME,
+                        claude_tool_fields, openai_response_format)
+from transport import check_rate_limits, get_http_session
+
+ADAPTERS: Dict[str, Type["ProviderAdapter"]] = {}
+
+
+def register_adapter(name: str):
+    """Class decorator: make an adapter selectable as ``"adapter": name`` in a provider config."""
+    def _register(cls):
+        cls.name = name
+        ADAPTERS[name] = cls
+        return cls
+    return _register
+
+
+def get_adapter(name: str) -> Type["ProviderAdapter"]:
+    try:
+        return ADAPTERS[name]
+    except KeyError:
+        raise ValueError(f"Unknown provider adapter: {name}. Registered adapters: {sorted(ADAPTERS)}") from None
+
+
+# ---------------- response helpers ----------------
+def _pick_text(result: Dict[str, Any]) -> str:
+    """
+    尝试从不同返回结构中提取第一段文本：
+    - DashScope 原生: output.text / output.choices[0].message.content
+    - OpenAI 兼容:    choices[0].message.content / choices[0].text
+    - OpenAI Responses / 其它: output_text / message
+    """
+    if not isinstance(result, dict):
+        return ""
+    output = result.get("output")
+    if isinstance(output, dict):
+        if isinstance(output.get("text"), str):
+            return output["text"]
+        ch = output.get("choices") or []
+        if ch and isinstance(ch[0], dict):
+            msg = ch[0].get("message") or {}
+            if isinstance(msg, dict) and "content" in msg:
+                return msg["content"]
+    ch = result.get("choices") or []
+    if ch and isinstance(ch[0], dict):
+        first = ch[0]
+        if isinstance(first.get("message"), dict) and "content" in first["message"]:
+            return first["message"]["content"] or ""
+        if "text" in first:
+            return first["text"]
+    if isinstance(result.get("output_text"), str):
+        return result["output_text"]
+    if isinstance(result.get("message"), str):
+        return result["message"]
+    return ""
+
+
+def normalize_usage(result: Dict[str, Any]) -> Dict[str, int]:
+    """
+    把各家 token 用量统一成 prompt/completion/total/cached：
+    - OpenAI 兼容 (OpenAI/DeepSeek/Grok/Qwen): usage.prompt_tokens / completion_tokens
+    - OpenAI Responses / Claude / DashScope 原生: usage.input_tokens / output_tokens
+    - Gemini: usageMetadata.promptTokenCount / candidatesTokenCount
+    """
+    if not isinstance(result, dict):
+        return {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "cached_tokens": 0,
+                "cache_write_tokens": 0}
+    usage = result.get("usage") or {}
+    meta = result.get("usageMetadata") or {}
+
+    def _int(*vals):
+        for v in vals:
+            if isinstance(v, (int, float)):
+                return int(v)
+        return 0
+
+    prompt = _int(usage.get("prompt_tokens"), usage.get("input_tokens"), meta.get("promptTokenCount"))
+    completion = _int(usage.get("completion_tokens"), usage.get("output_tokens"), meta.get("candidatesTokenCount"))
+    cached = _int(
+        (usage.get("prompt_tokens_details") or {}).get("cached_tokens"),
+        (usage.get("input_tokens_details") or {}).get("cached_tokens"),
+        usage.get("prompt_cache_hit_tokens"),      # DeepSeek
+        usage.get("cache_read_input_tokens"),      # Claude
+        meta.get("cachedContentTokenCount"),       # Gemini
+    )
+    cache_write = _int(usage.get("cache_creation_input_tokens"))   # Claude 写入缓存的部分
+    if "cache_read_input_tokens" in usage or "cache_creation_input_tokens" in usage:
+        # Claude 的 input_tokens 不含缓存命中/写入部分
+        prompt += cached + cache_write
+    total = _int(usage.get("total_tokens"), meta.get("totalTokenCount")) or prompt + completion
+    return {"prompt_tokens": prompt, "completion_tokens": completion, "total_tokens": total, "cached_tokens": cached,
+            "cache_write_tokens": cache_write}
+
+
+def finish_reason(result: Dict[str, Any]) -> str | None:
+    """Why generation stopped, from any provider's raw response (see token_budget.is_truncated)."""
+    output = result.get("output") if isinstance(result.get("output"), dict) else {}
+    # OpenAI 兼容 / DashScope 原生
+    for choices in (result.get("choices"), output.get("choices")):
+        if choices and isinstance(choices[0], dict) and choices[0].get("finish_reason"):
+            return choices[0]["finish_reason"]
+    if result.get("stop_reason"):                          # Claude
+        return result["stop_reason"]
+    cands = result.get("candidates") or []
+    if cands and isinstance(cands[0], dict) and cands[0].get("finishReason"):   # Gemini
+        return cands[0]["finishReason"]
+    return (result.get("incomplete_details") or {}).get("reason")              # OpenAI Responses
+
+
+# ---------------- adapters ----------------
+class ProviderAdapter:
+    """Wire format of one provider family.
+
+    Subclasses implement the hooks (``headers``, ``build_request``,
+    ``parse_message``, ``stream_delta`` and optionally ``endpoint`` /
+    ``extract_usage``); ``complete`` and ``stream`` do the HTTP round trip
+    through the shared pooled session. Scorer attributes (``api_url``,
+    ``model``, ``structured``, budget) are read on every call, so they can be
+    changed after construction.
+    """
+
+    name = ""
+
+    def __init__(self, scorer):
+        self.scorer = scorer
+        self.config: Dict[str, Any] = scorer.config
+
+    # ---- hooks ----
+    def headers(self) -> Dict[str, str]:
+        return {"Content-Type": "application/json", **self.config.get("headers", {})}
+
+    def endpoint(self, stream: bool) -> Tuple[str, Optional[Dict[str, str]]]:
+        """``(url, query_params)`` for a call."""
+        return self.scorer.api_url, None
+
+    def build_request(self, prompt: str, max_tokens: int, stream: bool = False) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def parse_message(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Unified ``{"content": str[, "parsed": obj]}`` from a raw response."""
+        return {"content": _pick_text(result)}
+
+    def extract_usage(self, result: Dict[str, Any]) -> Dict[str, int]:
+        return normalize_usage(result)
+
+    def stream_delta(self, event: Dict[str, Any]) -> str:
+        """Text increment carried by one SSE event ("" for bookkeeping events)."""
+        return ""
+
+    # ---- offline batch API hooks (see batch_api.py) ----
+    supports_batch = False
+
+    def batch_request(self, custom_id: str, prompt: str, max_tokens: int) -> Dict[str, Any]:
+        """One line of the provider's batch input JSONL."""
+        raise NotImplementedError(f"{self.scorer.provider}: the '{self.name}' adapter has no batch API")
+
+    async def batch_submit(self, spool_path: str) -> str:
+        """Submit a JSONL file of ``batch_request`` lines; returns the provider's batch id."""
+        raise NotImplementedError(f"{self.scorer.provider}: the '{self.name}' adapter has no batch API")
+
+    async def batch_status(self, batch_id: str) -> Tuple[str, Dict[str, Any]]:
+        """``("running" | "done" | "failed", raw_status)``; results are collected for done and failed."""
+        raise NotImplementedError(f"{self.scorer.provider}: the '{self.name}' adapter has no batch API")
+
+    def batch_results(self, batch_id: str, info: Dict[str, Any]) -> AsyncIterator[Tuple[str, Optional[Dict[str, Any]], str]]:
+        """Yield ``(custom_id, raw_response or None, error)`` for every finished request."""
+        raise NotImplementedError(f"{self.scorer.provider}: the '{self.name}' adapter has no batch API")
+
+    # ---- shared transport ----
+    def _max_tokens(self, max_tokens: Optional[int]) -> int:
+        return max_tokens or self.scorer.budget.max_tokens(self.scorer.target_items)
+
+    def unify(self, result: Dict[str, Any], raw_text: str = "") -> Dict[str, Any]:
+        """Raw provider JSON -> the OpenAI-like shape call_llm/parse_response consume."""
+        message = self.parse_message(result)
+        if not message.get("content") and message.get("parsed") is None:
+            # 取不到文本时把原文交给 parse_response（修复解析 + 失败时落盘排错）
+            message["content"] = raw_text or json.dumps(result, ensure_ascii=False)
+        return {"choices": [{"message": message, "finish_reason": finish_reason(result)}],
+                "usage": self.extract_usage(result)}
+
+    async def complete(self, prompt: str, max_tokens: Optional[int] = None) -> Dict[str, Any]:
+        url, params = self.endpoint(stream=False)
+        data = self.build_request(prompt, self._max_tokens(max_tokens))
+        session = get_http_session(self.scorer)
+        async with session.post(url, headers=self.headers(), params=params, json=data) as response:
+            check_rate_limits(self.scorer, response)
+            text = await response.text()
+            if response.status != 200:
+                # 把服务端原文抛出来，便于排错（配额/模型名/Key 等）
+                raise Exception(f"{self.scorer.provider} API call failed: {response.status} - {text[:1000]}")
+        try:
+            result = json.loads(text)
+        except ValueError:
+            raise Exception(f"{self.scorer.provider}: failed to parse JSON: {text[:1000]}") from None
+        return self.unify(result, text)
+
+    async def _get_json(self, url: str, params: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        headers = self.headers()
+        session = get_http_session(self.scorer)
+        async with session.get(url, headers=headers, params=params) as response:
+            check_rate_limits(self.scorer, response)
+            text = await response.text()
+            if response.status != 200:
+                raise Exception(f"{self.scorer.provider} batch API call failed: {response.status} - {text[:1000]}")
+        return json.loads(text)
+
+    async def _iter_jsonl(self, url: str) -> AsyncIterator[Dict[str, Any]]:
+        """Download a JSONL result file line by line (never held in memory as a whole)."""
+        session = get_http_session(self.scorer)
+        async with session.get(url, headers=self.headers()) as response:
+            check_rate_limits(self.scorer, response)
+            if response.status != 200:
+                text = await response.text()
+                raise Exception(f"{self.scorer.provider} batch results failed: {response.status} - {text[:1000]}")
+            buf = b""
+            async for chunk in response.content.iter_chunked(1 << 16):
+                buf += chunk
+                *lines, buf = buf.split(b"\n")
+                for line in lines:
+                    if line.strip():
+                        yield json.loads(line)
+            if buf.strip():
+                yield json.loads(buf)
+
+    async def stream(self, prompt: str, max_tokens: Optional[int] = None) -> AsyncIterator[str]:
+        url, params = self.endpoint(stream=True)
+        data = self.build_request(prompt, self._max_tokens(max_tokens), stream=True)
+        session = get_http_session(self.scorer)
+        async with session.post(url, headers=self.headers(), params=params, json=data) as response:
+            check_rate_limits(self.scorer, response)
+            if response.status != 200:
+                text = await response.text()
+                raise Exception(f"Streaming API call failed: {response.status} - {text[:1000]}")
+            # SSE：逐行读取 "data: {...}"，忽略 event:/注释/空行
+            async for raw_line in response.content:
+                line = raw_line.decode("utf-8", errors="replace").strip()
+                if not line.startswith("data:"):
+                    continue
+                payload = line[5:].strip()
+                if payload == "[DONE]":
+                    break
+                try:
+                    event = json.loads(payload)
+                except ValueError:
+                    continue
+                delta = self.stream_delta(event) if isinstance(event, dict) else ""
+                if delta:
+                    yield delta
+
+
+@register_adapter("openai")
+class OpenAIChatAdapter(ProviderAdapter):
+    """OpenAI chat/completions and compatible APIs (DeepSeek, Qwen compatible-mode, Grok, local servers).
+
+    Config flags: ``prompt_cache_key`` sends the static-prefix id for cache
+    routing; ``force_json`` asks for a JSON object even with structured output off.
+    """
+
+    def headers(self) -> Dict[str, str]:
+        headers = super().headers()
+        if self.scorer.api_key:
+            headers["Authorization"] = f"Bearer {self.scorer.api_key}"
+        return headers
+
+    @staticmethod
+    def messages(prompt: str):
+        """Static prefix first as the system message so automatic prefix caching can reuse it."""
+        prefix, rest = split_prompt(prompt)
+        if not prefix:
+            return [{"role": "user", "content": rest}]
+        return [{"role": "system", "content": prefix}, {"role": "user", "content": rest}]
+
+    def build_request(self, prompt: str, max_tokens: int, stream: bool = False) -> Dict[str, Any]:
+        data: Dict[str, Any] = {
+            "model": self.scorer.model,
+            "messages": self.messages(prompt),
+            "temperature": 0.1,
+            "max_tokens": max_tokens,
+        }
+        if stream:
+            data["stream"] = True
+        if self.config.get("prompt_cache_key"):
+            # 同一前缀的请求路由到同一缓存分片
+            data["prompt_cache_key"] = PREFIX_ID
+        mode = self.scorer.structured or (MODE_JSON_OBJECT if self.config.get("force_json") else None)
+        if mode:
+            data["response_format"] = openai_response_format(mode)
+        return data
+
+    # ---- Files + Batches API ----
+    supports_batch = True
+
+    def _batch_base(self) -> str:
+        """``.../v1`` of the chat endpoint (``batch_base`` in the config overrides)."""
+        url = self.scorer.api_url
+        return self.config.get("batch_base") or (url[:url.index("/v1") + 3] if "/v1" in url else url.rsplit("/", 2)[0])
+
+    def batch_request(self, custom_id: str, prompt: str, max_tokens: int) -> Dict[str, Any]:
+        return {"custom_id": custom_id, "method": "POST",
+                "url": self.config.get("batch_endpoint", "/v1/chat/completions"),
+                "body": self.build_request(prompt, max_tokens)}
+
+    async def batch_submit(self, spool_path: str) -> str:
+        base = self._batch_base()
+        # multipart 上传：Content-Type 交给 aiohttp 生成 boundary
+        headers = {k: v for k, v in self.headers().items() if k.lower() != "content-type"}
+        session = get_http_session(self.scorer)
+        with open(spool_path, "rb") as f:
+            form = aiohttp.FormData()
+            form.add_field("purpose", "batch")
+            form.add_field("file", f, filename=spool_path.rsplit("/", 1)[-1], content_type="application/jsonl")
+            async with session.post(base + "/files", headers=headers, data=form) as response:
+                check_rate_limits(self.scorer, response)
+                text = await response.text()
+                if response.status != 200:
+                    raise Exception(f"{self.scorer.provider} file upload failed: {response.status} - {text[:1000]}")
+        file_id = json.loads(text)["id"]
+        body = {"input_file_id": file_id, "endpoint": self.config.get("batch_endpoint", "/v1/chat/completions"),
+                "completion_window": self.config.get("batch_window", "24h")}
+        async with session.post(base + "/batches", headers=self.headers(), json=body) as response:
+            check_rate_limits(self.scorer, response)
+            text = await response.text()
+            if response.status != 200:
+                raise Exception(f"{self.scorer.provider} batch create failed: {response.status} - {text[:1000]}")
+        return json.loads(text)["id"]
+
+    async def batch_status(self, batch_id: str) -> Tuple[str, Dict[str, Any]]:
+        info = await self._get_json(f"{self._batch_base()}/batches/{batch_id}")
+        status = info.get("status")
+        if status == "completed":
+            return "done", info
+        # expired/cancelled 仍可能带有部分结果文件
+        if status in ("failed", "expired", "cancelled"):
+            return "failed", info
+        return "running", info
+
+    async def batch_results(self, batch_id: str, info: Dict[str, Any]):
+        base = self._batch_base()
+        for file_id in (info.get("output_file_id"), info.get("error_file_id")):
+            if not file_id:
+                continue
+            async for line in self._iter_jsonl(f"{base}/files/{file_id}/content"):
+                response = line.get("response") or {}
+                if response.get("status_code") == 200:
+                    yield line.get("custom_id", ""), response.get("body") or {}, ""
+                else:
+                    error = line.get("error") or (response.get("body") or {}).get("error") or {}
+                    yield line.get("custom_id", ""), None, (error.get("message") if isinstance(error, dict)
+                                                            else str(error)) or f"status {response.get('status_code')}"
+
+    def stream_delta(self, event: Dict[str, Any]) -> str:
+        ch = event.get("choices")
+        if ch and isinstance(ch[0], dict):
+            return (ch[0].get("delta") or {}).get("content") or ""
+        if event.get("type") == "response.output_text.delta":   # OpenAI Responses API
+            return event.get("delta") or ""
+        return ""
+
+
+@register_adapter("anthropic")
+class ClaudeAdapter(ProviderAdapter):
+    """Anthropic Messages API; structured output is a forced tool call."""
+
+    def headers(self) -> Dict[str, str]:
+        return {
+            **super().headers(),
+            "x-api-key": self.scorer.api_key,
+            "anthropic-version": self.config.get("anthropic_version", "2023-06-01"),
+        }
+
+    def build_request(self, prompt: str, max_tokens: int, stream: bool = False) -> Dict[str, Any]:
+        prefix, rest = split_prompt(prompt)
+        data: Dict[str, Any] = {
+            "model": self.scorer.model,
+            "max_tokens": max_tokens,
+            "temperature": 0.1,
+            "messages": [{"role": "user", "content": rest}],
+        }
+        if prefix:
+            # 静态前缀放 system 并标记 prompt caching
+            data["system"] = [{"type": "text", "text": prefix, "cache_control": {"type": "ephemeral"}}]
+        if stream:
+            data["stream"] = True
+        if self.scorer.structured == MODE_TOOL:
+            data.update(claude_tool_fields())
+        return data
+
+    def parse_message(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """A forced tool call carries the already-decoded object."""
+        blocks = result.get("content") or []
+        for block in blocks:
+            if block.get("type") == "tool_use" and block.get("name") == TOOL_NAME:
+                return {"content": json.dumps(block.get("input"), ensure_ascii=False), "parsed": block.get("input")}
+        return {"content": "".join(b.get("text", "") for b in blocks if b.get("type") == "text")}
+
+    # ---- Message Batches API ----
+    supports_batch = True
+
+    def batch_request(self, custom_id: str, prompt: str, max_tokens: int) -> Dict[str, Any]:
+        return {"custom_id": custom_id, "params": self.build_request(prompt, max_tokens)}
+
+    async def batch_submit(self, spool_path: str) -> str:
+        with open(spool_path, "r", encoding="utf-8") as f:
+            requests = [json.loads(line) for line in f if line.strip()]
+        session = get_http_session(self.scorer)
+        async with session.post(self.scorer.api_url + "/batches", headers=self.headers(),
+                                json={"requests": requests}) as response:
+            check_rate_limits(self.scorer, response)
+            text = await response.text()
+            if response.status != 200:
+                raise Exception(f"{self.scorer.provider} batch create failed: {response.status} - {text[:1000]}")
+        return json.loads(text)["id"]
+
+    async def batch_status(self, batch_id: str) -> Tuple[str, Dict[str, Any]]:
+        info = await self._get_json(f"{self.scorer.api_url}/batches/{batch_id}")
+        return ("done" if info.get("processing_status") == "ended" else "running"), info
+
+    async def batch_results(self, batch_id: str, info: Dict[str, Any]):
+        url = info.get("results_url") or f"{self.scorer.api_url}/batches/{batch_id}/results"
+        async for line in self._iter_jsonl(url):
+            result = line.get("result") or {}
+            if result.get("type") == "succeeded":
+                yield line.get("custom_id", ""), result.get("message") or {}, ""
+            else:
+                error = (result.get("error") or {}).get("message") or result.get("type") or "unknown"
+                yield line.get("custom_id", ""), None, f"batch request {error}"
+
+    def stream_delta(self, event: Dict[str, Any]) -> str:
+        if event.get("type") != "content_block_delta":
+            return ""
+        # 文本块是 text_delta；强制工具调用时参数以 input_json_delta 流式给出
+        delta = event.get("delta") or {}
+        return delta.get("text") or delta.get("partial_json") or ""
+
+
+@register_adapter("gemini")
+class GeminiAdapter(ProviderAdapter):
+    """Google Generative Language API (generateContent / streamGenerateContent)."""
+
+    def endpoint(self, stream: bool) -> Tuple[str, Optional[Dict[str, str]]]:
+        if stream:
+            # generateContent → streamGenerateContent，alt=sse 返回 SSE 事件
+            return (self.scorer.api_url.replace(":generateContent", ":streamGenerateContent"),
+                    {"key": self.scorer.api_key, "alt": "sse"})
+        return self.scorer.api_url, {"key": self.scorer.api_key}
+
+    def build_request(self, prompt: str, max_tokens: int, stream: bool = False) -> Dict[str, Any]:
+        prefix, rest = split_prompt(prompt)
+        # 2.5 系列的思考 token 也计入 maxOutputTokens，额外留出余量
+        max_output = min(self.scorer.budget.max_output, max_tokens + self.config.get("thinking_allowance", 0))
+        data: Dict[str, Any] = {
+            "contents": [{"role": "user", "parts": [{"text": rest}]}],
+            "generationConfig": {
+                "temperature": 0.1,
+                "responseMimeType": "application/json",
+                "maxOutputTokens": max_output,
+            },
+        }
+        if prefix:
+            # 静态前缀作为 systemInstruction（隐式上下文缓存）
+            data["systemInstruction"] = {"parts": [{"text": prefix}]}
+        if self.scorer.structured == MODE_RESPONSE_SCHEMA:
+            data["generationConfig"]["responseSchema"] = GEMINI_RESPONSE_SCHEMA
+        return data
+
+    def parse_message(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        cands = result.get("candidates") or []
+        parts = (cands[0].get("content") or {}).get("parts") or [] if cands and isinstance(cands[0], dict) else []
+        # 纯文本；不是文本（如 inlineData）时 unify 会退回原始 JSON
+        text = parts[0].get("text", "") if parts and isinstance(parts[0], dict) else ""
+        return {"content": text}
+
+    def stream_delta(self, event: Dict[str, Any]) -> str:
+        cands = event.get("candidates")
+        if cands and isinstance(cands[0], dict):
+            parts = (cands[0].get("content") or {}).get("parts") or []
+            return "".join(p.get("text", "") for p in parts if isinstance(p, dict))
+        return ""
+
+
+# ---------------- config-registered providers ----------------
+def load_provider_config(source: str) -> Dict[str, Dict[str, Any]]:
+    """Extra provider entries from a JSON file path or an inline JSON object.
+
+    ::
+
+        {"local-llama": {"api_url": "http://127.0.0.1:8001/v1/chat/completions",
+                         "model": "llama-3.1-8b-instruct", "structured": "json_object",
+                         "max_output_tokens": 4096, "api_key_env": "LOCAL_LLM_KEY"}}
+
+    ``adapter`` defaults to ``"openai"``; ``api_key`` / ``api_key_env`` supply
+    the key when api_key.py has none (local servers usually accept any value).
+    """
+    text = source.strip()
+    if not text.startswith("{"):
+        with open(text, "r", encoding="utf-8") as f:
+            text = f.read()
+    entries = json.loads(text)
+    if not isinstance(entries, dict):
+        raise ValueError("provider config must be a JSON object keyed by provider name")
+    configs: Dict[str, Dict[str, Any]] = {}
+    for name, entry in entries.items():
+        missing = [k for k in ("api_url", "model") if not (entry or {}).get(k)]
+        if missing:
+            raise ValueError(f"provider '{name}': missing {', '.join(missing)}")
+        config = {"adapter": "openai", "max_output_tokens": 8192, "structured": None, **entry}
+        get_adapter(config["adapter"])
+        configs[name] = config
+    return configs
@@ -0,0 +1,348 @@
+"""
+Provider 限流：令牌桶（请求数/分钟 + token 数/分钟）、AIMD 自适应并发、Retry-After 感知重试与排队超时卸载
+"""
+import asyncio
+import math
+import random
+import re
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Mapping, Optional
+
+
+class RateLimitedError(Exception):
+    """Provider answered 429/503 (or another retryable status)."""
+
+    def __init__(self, status: int, retry_after: Optional[float] = None, message: str = ""):
+        super().__init__(message or f"API call failed: {status}")
+        self.status = status
+        self.retry_after = retry_after
+
+
+class OverloadedError(Exception):
+    """Request was shed because it could not get a slot within the queue wait limit."""
+
+    def __init__(self, provider: str, waited: float, retry_after: float = 1.0):
+        super().__init__(f"{provider}: overloaded, waited {waited:.1f}s for capacity")
+        self.provider = provider
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Async token bucket; ``rate`` tokens per second with a burst of ``capacity``."""
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def set_rate(self, rate: float, capacity: float | None = None):
+        self._refill()
+        self.rate = rate
+        if capacity is not None:
+            self.capacity = capacity
+            self.tokens = min(self.tokens, capacity)
+
+    def set_remaining(self, remaining: float):
+        """Clamp local tokens to what the provider says is left."""
+        self._refill()
+        self.tokens = min(self.tokens, remaining)
+
+    def debit(self, amount: float):
+        """Charge tokens without waiting (may go negative, delaying later acquires)."""
+        self._refill()
+        self.tokens -= amount
+
+    def refund(self, amount: float):
+        """Give back tokens taken by an acquire whose call never went out."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+    def wait_time(self, amount: float = 1.0) -> float:
+        self._refill()
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate if self.rate > 0 else float("inf")
+
+    async def acquire(self, amount: float = 1.0):
+        # 加锁保证先到先得，避免等待者互相插队
+        async with self._lock:
+            amount = min(amount, self.capacity)
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+
+class AIMDLimiter:
+    """Adaptive concurrency cap: +1/limit per success, halve on throttling."""
+
+    def __init__(self, initial: int = 8, minimum: int = 1, maximum: int = 64):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = float(max(minimum, min(initial, maximum)))
+        self.inflight = 0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self, timeout: Optional[float] = None) -> bool:
+        async with self._cond:
+            try:
+                await asyncio.wait_for(
+                    self._cond.wait_for(lambda: self.inflight < int(self.limit)), timeout
+                )
+            except asyncio.TimeoutError:
+                return False
+            self.inflight += 1
+            return True
+
+    async def release(self):
+        async with self._cond:
+            self.inflight -= 1
+            self._cond.notify_all()
+
+    def on_success(self):
+        self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+
+    def on_throttle(self):
+        self.limit = max(self.minimum, self.limit / 2)
+
+
+def parse_limit_map(spec: str) -> Dict[str, float]:
+    """Parse ``"openai4=500,deepseek=60"`` into a dict; bare numbers apply to ``*``."""
+    limits: Dict[str, float] = {}
+    for part in (spec or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, value = part.rpartition("=")
+        limits[name.strip() or "*"] = float(value)
+    return limits
+
+
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_UNIT = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds from a Retry-After header (delta-seconds or HTTP date) or an OpenAI reset like ``6m0s``."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    parts = _DURATION.findall(value)
+    if parts and "".join(n + u for n, u in parts) == value:
+        return sum(float(n) * _UNIT[u] for n, u in parts)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except Exception:
+        return None
+
+
+def _header_float(headers: Mapping[str, str], *names: str) -> Optional[float]:
+    for name in names:
+        value = headers.get(name)
+        if value is not None:
+            try:
+                return float(value)
+            except ValueError:
+                continue
+    return None
+
+
+class ProviderLimiter:
+    """Per-provider admission control around one LLM call.
+
+    * request and token buckets (per minute); limits start from configuration
+      and are corrected from the provider's rate-limit response headers
+      (``x-ratelimit-*`` for OpenAI-compatible APIs, ``anthropic-ratelimit-*``)
+    * an AIMD concurrency cap that halves on 429/503 and grows on success
+    * retries of :class:`RateLimitedError` honouring ``Retry-After``, else
+      exponential backoff with full jitter
+    * a queue wait limit: if capacity is not available within ``max_wait``
+      seconds the call is shed with :class:`OverloadedError`
+
+    ``run`` wraps one request/response call, ``stream`` a streamed one (the
+    slot is held until the stream ends).
+    """
+
+    def __init__(self, provider: str, rpm: float = 0, tpm: float = 0, max_concurrency: int = 16,
+                 max_wait: float = 10.0, max_retries: int = 3, base_backoff: float = 0.5,
+                 max_backoff: float = 20.0):
+        self.provider = provider
+        self.requests = TokenBucket(rpm / 60.0, max(1.0, rpm / 60.0)) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm / 60.0, max(1.0, tpm / 60.0 * 10)) if tpm > 0 else None
+        self.concurrency = AIMDLimiter(initial=max_concurrency, maximum=max_concurrency)
+        self.max_wait = max_wait
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.stats = {"calls": 0, "throttled": 0, "retries": 0, "shed": 0}
+
+    # ---------- header feedback ----------
+    def update_from_headers(self, headers: Mapping[str, str]):
+        req_limit = _header_float(headers, "x-ratelimit-limit-requests", "anthropic-ratelimit-requests-limit")
+        req_left = _header_float(headers, "x-ratelimit-remaining-requests", "anthropic-ratelimit-requests-remaining")
+        tok_limit = _header_float(headers, "x-ratelimit-limit-tokens", "anthropic-ratelimit-tokens-limit")
+        tok_left = _header_float(headers, "x-ratelimit-remaining-tokens", "anthropic-ratelimit-tokens-remaining")
+        if req_limit:
+            if self.requests is None:
+                self.requests = TokenBucket(req_limit / 60.0, max(1.0, req_limit / 60.0))
+            else:
+                self.requests.set_rate(req_limit / 60.0, max(1.0, req_limit / 60.0))
+        if req_left is not None and self.requests is not None:
+            self.requests.set_remaining(req_left)
+        if tok_limit:
+            if self.tokens is None:
+                self.tokens = TokenBucket(tok_limit / 60.0, max(1.0, tok_limit / 60.0 * 10))
+            else:
+                self.tokens.set_rate(tok_limit / 60.0, max(1.0, tok_limit / 60.0 * 10))
+        if tok_left is not None and self.tokens is not None:
+            self.tokens.set_remaining(tok_left)
+
+    def record_usage(self, charged: float, actual: Optional[float]):
+        """Correct the token bucket once the real token count is known.
+
+        ``charged`` is what admission actually took from the bucket (clamped to
+        capacity, summed over retried attempts), not the raw estimate.
+        """
+        if self.tokens is not None and actual:
+            self.tokens.debit(actual - charged)
+
+    # ---------- admission ----------
+    def _remaining(self, started: float) -> Optional[float]:
+        """Seconds left of the queue wait budget; ``None`` means wait forever."""
+        if math.isinf(self.max_wait):
+            return None
+        return max(0.001, self.max_wait - (time.monotonic() - started))
+
+    async def _admit(self, est_tokens: float) -> float:
+        """Wait for request/token budget and a concurrency slot; returns the tokens taken from the bucket."""
+        started = time.monotonic()
+        taken = []
+        for bucket, amount in ((self.requests, 1.0), (self.tokens, est_tokens)):
+            if bucket is None:
+                continue
+            # 与 acquire 一致：超过桶容量的估算按满桶计，否则永远等不到而每次都被卸载
+            amount = min(amount, bucket.capacity)
+            remaining = self._remaining(started)
+            if bucket.wait_time(amount) > (remaining or float("inf")):
+                break
+            try:
+                await asyncio.wait_for(bucket.acquire(amount), remaining)
+            except asyncio.TimeoutError:
+                break
+            taken.append((bucket, amount))
+        else:
+            if await self.concurrency.acquire(timeout=self._remaining(started)):
+                return sum(amount for bucket, amount in taken if bucket is self.tokens)
+        # 被卸载的请求没有发出去：已经拿到的请求/token 额度还回去
+        for bucket, amount in taken:
+            bucket.refund(amount)
+        waited = time.monotonic() - started
+        self.stats["shed"] += 1
+        raise OverloadedError(self.provider, waited)
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        if retry_after is not None:
+            return min(self.max_backoff, retry_after) + random.uniform(0, self.base_backoff)
+        return random.uniform(0, min(self.max_backoff, self.base_backoff * (2 ** attempt)))
+
+    def _retry_delay(self, attempt: int, e: RateLimitedError) -> Optional[float]:
+        """Book a throttled attempt; the backoff before the next one, or ``None`` when out of retries."""
+        self.stats["throttled"] += 1
+        self.concurrency.on_throttle()
+        if attempt >= self.max_retries:
+            return None
+        delay = self._backoff(attempt, e.retry_after)
+        self.stats["retries"] += 1
+        print(f"[LIMIT] {self.provider} throttled ({e.status}), retry {attempt + 1} in {delay:.2f}s")
+        return delay
+
+    async def run(self, call: Callable[[], Awaitable[Any]], est_tokens: float = 0,
+                  actual_tokens: Optional[Callable[[Any], Optional[float]]] = None) -> Any:
+        """Admit, run ``call()`` and retry throttled attempts.
+
+        ``actual_tokens(result)`` gives the real token count used to correct the bucket.
+        """
+        self.stats["calls"] += 1
+        attempt = 0
+        charged = 0.0
+        while True:
+            charged += await self._admit(est_tokens)
+            try:
+                result = await call()
+            except RateLimitedError as e:
+                delay = self._retry_delay(attempt, e)
+                if delay is None:
+                    raise
+                attempt += 1
+            else:
+                self.concurrency.on_success()
+                if actual_tokens is not None:
+                    self.record_usage(charged, actual_tokens(result))
+                return result
+            finally:
+                await self.concurrency.release()
+            await asyncio.sleep(delay)
+
+    async def stream(self, open_stream: Callable[[], AsyncIterator[Any]], est_tokens: float = 0,
+                     actual_tokens: Optional[Callable[[], Optional[float]]] = None) -> AsyncIterator[Any]:
+        """Streaming counterpart of ``run``: admission before the first byte, slot held until the stream ends.
+
+        Throttling at stream open (before the first item) is retried like ``run``;
+        errors after items were yielded propagate. ``actual_tokens()`` is read once the
+        stream is over to correct the bucket.
+        """
+        self.stats["calls"] += 1
+        attempt = 0
+        charged = 0.0
+        while True:
+            charged += await self._admit(est_tokens)
+            stream = open_stream()
+            opened = False
+            try:
+                try:
+                    first = await stream.__anext__()
+                except StopAsyncIteration:
+                    opened = True
+                    self.concurrency.on_success()
+                    return
+                except RateLimitedError as e:
+                    delay = self._retry_delay(attempt, e)
+                    if delay is None:
+                        raise
+                    attempt += 1
+                else:
+                    opened = True
+                    self.concurrency.on_success()
+                    yield first
+                    async for item in stream:
+                        yield item
+                    return
+            finally:
+                await stream.aclose()
+                await self.concurrency.release()
+                if opened and actual_tokens is not None:
+                    self.record_usage(charged, actual_tokens())
+            await asyncio.sleep(delay)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "concurrency_limit": round(self.concurrency.limit, 2),
+            "inflight": self.concurrency.inflight,
+            "rpm": round(self.requests.rate * 60, 1) if self.requests else None,
+            "tpm": round(self.tokens.rate * 60, 1) if self.tokens else None,
+        }
@@ -0,0 +1,361 @@
+"""
+推荐结果缓存：内存 LRU + TTL，可选 SQLite 磁盘层（重启后仍可命中）；
+以及按画像特征向量做近似匹配的语义缓存（只差姓名/自由文本的画像直接复用结果）
+"""
+import asyncio
+import hashlib
+import json
+import math
+import re
+import sqlite3
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+# 改动 key 的组成方式或结果格式时递增，旧缓存自动失效
+CACHE_KEY_VERSION = 1
+
+
+def _normalize(value: Any) -> Any:
+    """Canonicalize a profile value: trim/casefold strings, dedupe and sort lists."""
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        items = {json.dumps(_normalize(v), sort_keys=True, ensure_ascii=False) for v in value}
+        return [json.loads(i) for i in sorted(items)]
+    if isinstance(value, str):
+        return " ".join(value.split()).casefold()
+    return value
+
+
+def profile_cache_key(profile: Dict[str, Any], provider: str, model: str, catalog: str = "") -> str:
+    """Stable hash of the normalized profile plus provider/model (and catalog version, if any)."""
+    payload = {
+        "v": CACHE_KEY_VERSION,
+        "provider": provider,
+        "model": model,
+        "profile": _normalize(profile),
+    }
+    if catalog:
+        # 目录更新后候选项变了，旧结果不能再命中
+        payload["catalog"] = catalog
+    blob = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class RecommendationCache:
+    """Bounded in-memory LRU with TTL in front of an optional SQLite tier."""
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600.0, db_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_path = db_path or None
+        self._mem: "OrderedDict[str, tuple]" = OrderedDict()   # key -> (expires_at, recs)
+        self.stats = {"hits": 0, "misses": 0, "disk_hits": 0, "stores": 0, "evictions": 0}
+        if self.db_path:
+            with self._connect() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS rec_cache ("
+                    " key TEXT PRIMARY KEY, expires_at REAL NOT NULL, value TEXT NOT NULL)"
+                )
+
+    # ---------- memory tier ----------
+    def _mem_get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        entry = self._mem.get(key)
+        if entry is None:
+            return None
+        expires_at, recs = entry
+        if expires_at < time.time():
+            del self._mem[key]
+            return None
+        self._mem.move_to_end(key)
+        return recs
+
+    def _mem_set(self, key: str, recs: List[Dict[str, Any]], expires_at: float):
+        self._mem[key] = (expires_at, recs)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    # ---------- disk tier (sync; run via asyncio.to_thread) ----------
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=5)
+
+    def _disk_get(self, key: str):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT expires_at, value FROM rec_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[0] < time.time():
+                conn.execute("DELETE FROM rec_cache WHERE key = ?", (key,))
+                return None
+            return row[0], json.loads(row[1])
+
+    def _disk_set(self, key: str, recs: List[Dict[str, Any]], expires_at: float):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO rec_cache (key, expires_at, value) VALUES (?, ?, ?)",
+                (key, expires_at, json.dumps(recs, ensure_ascii=False)),
+            )
+
+    # ---------- public API ----------
+    def __contains__(self, key: str) -> bool:
+        """Memory-tier check that leaves hit/miss stats and LRU order alone."""
+        entry = self._mem.get(key)
+        return entry is not None and entry[0] >= time.time()
+
+    async def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        recs = self._mem_get(key)
+        if recs is None and self.db_path:
+            try:
+                found = await asyncio.to_thread(self._disk_get, key)
+            except Exception as e:
+                print(f"[CACHE] disk read failed: {e}")
+                found = None
+            if found is not None:
+                expires_at, recs = found
+                self._mem_set(key, recs, expires_at)
+                self.stats["disk_hits"] += 1
+        if recs is None:
+            self.stats["misses"] += 1
+        else:
+            self.stats["hits"] += 1
+        return recs
+
+    async def set(self, key: str, recs: List[Dict[str, Any]]):
+        # 只缓存成功解析出的非空结果
+        if not recs:
+            return
+        expires_at = time.time() + self.ttl
+        self._mem_set(key, recs, expires_at)
+        self.stats["stores"] += 1
+        if self.db_path:
+            try:
+                await asyncio.to_thread(self._disk_set, key, recs, expires_at)
+            except Exception as e:
+                print(f"[CACHE] disk write failed: {e}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        total = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "entries": len(self._mem),
+            "hit_ratio": round(self.stats["hits"] / total, 4) if total else 0.0,
+            "disk_tier": bool(self.db_path),
+        }
+
+
+# 语义缓存的特征：create_prompt 读取的结构化字段及权重；姓名、年龄和自由文本（残障描述、工作经历）不参与
+SIMILARITY_FIELDS: Dict[str, float] = {
+    "disability.severity": 1.5,
+    "education.level": 2.0,
+    "education.skills": 2.0,
+    "education.interests": 1.0,
+    "employment.interests": 1.0,
+    "employment.workPreferences": 1.5,
+    "needs.financial": 1.0,
+    "needs.support": 1.0,
+    "needs.technology": 1.0,
+    "needs.priority": 1.0,
+    "personalInfo.communicationMode": 0.5,
+}
+# 这些字段必须完全一致才会比较相似度：地点或残障类型不同的结果不能复用
+SIMILARITY_STRICT_FIELDS = ("personalInfo.location", "disability.type")
+
+_WORD = re.compile(r"\w+")
+
+
+def _field(profile: Dict[str, Any], path: str) -> Any:
+    value: Any = profile
+    for key in path.split("."):
+        value = value.get(key) if isinstance(value, dict) else None
+    return value
+
+
+def _phrases(value: Any) -> List[str]:
+    """Normalized phrases of a field: list items, or comma/semicolon separated parts of a string."""
+    if value is None:
+        return []
+    items = value if isinstance(value, (list, tuple)) else re.split(r"[,;/]", str(value))
+    return [p for p in (" ".join(str(i).split()).casefold() for i in items) if p]
+
+
+def profile_features(profile: Dict[str, Any]) -> Dict[str, float]:
+    """L2-normalized sparse feature vector: whole phrases plus their words, per field."""
+    vec: Dict[str, float] = defaultdict(float)
+    for path, weight in SIMILARITY_FIELDS.items():
+        for phrase in _phrases(_field(profile, path)):
+            vec[f"{path}={phrase}"] += weight
+            # 单词级特征让 "python, data analysis" 与 "data analysis, sql" 也能部分重合
+            for word in _WORD.findall(phrase):
+                vec[f"{path}~{word}"] += weight * 0.5
+    norm = math.sqrt(sum(w * w for w in vec.values()))
+    return {k: w / norm for k, w in vec.items()} if norm else {}
+
+
+def _partition(profile: Dict[str, Any], scope: str) -> str:
+    strict = [" ".join(_phrases(_field(profile, path))) for path in SIMILARITY_STRICT_FIELDS]
+    return json.dumps([scope, *strict], ensure_ascii=False)
+
+
+class SimilarityCache:
+    """In-memory near-duplicate cache over profile feature vectors.
+
+    Entries are bucketed by ``scope`` (provider/model/catalog) and the strict
+    fields; inside a bucket an inverted index over features scores only the
+    entries that share at least one feature, which gives the exact cosine
+    similarity without scanning every vector. LRU + TTL bound the memory.
+    """
+
+    def __init__(self, max_entries: int = 2048, ttl: float = 3600.0, threshold: float = 0.9):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        # entry id -> (expires_at, partition, vector, recs)
+        self._entries: "OrderedDict[int, Tuple[float, str, Dict[str, float], List[Dict[str, Any]]]]" = OrderedDict()
+        self._postings: Dict[Tuple[str, str], Set[int]] = defaultdict(set)
+        self._next_id = 0
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    def _remove(self, eid: int):
+        _expires, partition, vec, _recs = self._entries.pop(eid)
+        for feature in vec:
+            ids = self._postings.get((partition, feature))
+            if ids is not None:
+                ids.discard(eid)
+                if not ids:
+                    del self._postings[(partition, feature)]
+
+    def _nearest(self, partition: str, vec: Dict[str, float], min_sim: float) -> Tuple[Optional[int], float]:
+        """Closest live entry with cosine >= ``min_sim`` (exact).
+
+        Features are probed rarest first; once the unprobed part of the query has
+        norm < min_sim, an entry sharing none of the probed features cannot reach
+        min_sim (Cauchy-Schwarz, entries are unit vectors), so common features such
+        as education level never fan out to the whole bucket.
+        """
+        postings = [(self._postings.get((partition, f), ()), w) for f, w in vec.items()]
+        postings.sort(key=lambda pw: len(pw[0]))
+        remaining = 1.0
+        candidates: Set[int] = set()
+        for ids, weight in postings:
+            if remaining < min_sim * min_sim - 1e-9:
+                break
+            candidates.update(ids)
+            remaining -= weight * weight
+        now = time.time()
+        best, best_sim = None, 0.0
+        for eid in candidates:
+            expires_at, _partition, other, _recs = self._entries[eid]
+            if expires_at < now:
+                continue
+            sim = sum(w * other.get(f, 0.0) for f, w in vec.items())
+            if sim > best_sim:
+                best, best_sim = eid, sim
+        return (best, best_sim) if best_sim >= min_sim else (None, best_sim)
+
+    def lookup(self, profile: Dict[str, Any], scope: str = "",
+               record: bool = True) -> Optional[Tuple[List[Dict[str, Any]], float]]:
+        """``(cached recommendations, similarity)`` of the closest entry above the threshold.
+
+        The list is the one stored for the other profile; callers re-rank it (rerank.py).
+        ``record=False`` only peeks: no stats, no LRU update.
+        """
+        vec = profile_features(profile)
+        eid, sim = self._nearest(_partition(profile, scope), vec, self.threshold) if vec else (None, 0.0)
+        if not record:
+            return (self._entries[eid][3], sim) if eid is not None else None
+        if eid is None:
+            self.stats["misses"] += 1
+            return None
+        self._entries.move_to_end(eid)
+        self.stats["hits"] += 1
+        return self._entries[eid][3], sim
+
+    def add(self, profile: Dict[str, Any], recs: List[Dict[str, Any]], scope: str = ""):
+        vec = profile_features(profile)
+        if not recs or not vec or self.max_entries <= 0:
+            return
+        partition = _partition(profile, scope)
+        # 几乎相同的画像只保留最新一条
+        eid, _sim = self._nearest(partition, vec, 0.999)
+        if eid is not None:
+            self._remove(eid)
+        eid = self._next_id
+        self._next_id += 1
+        self._entries[eid] = (time.time() + self.ttl, partition, vec, recs)
+        for feature in vec:
+            self._postings[(partition, feature)].add(eid)
+        self.stats["stores"] += 1
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.stats["evictions"] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        total = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "entries": len(self._entries),
+            "threshold": self.threshold,
+            "hit_ratio": round(self.stats["hits"] / total, 4) if total else 0.0,
+        }
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key onto one shared task."""
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+        # key -> 正在 await 的调用方数量（后台预生成不算）
+        self._waiters: Dict[str, int] = {}
+        self.stats = {"leaders": 0, "coalesced": 0}
+
+    def _forget(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # 所有等待者都取消时也要取走异常，避免 "exception was never retrieved"
+        if not task.cancelled():
+            task.exception()
+
+    def start(self, key: str, factory):
+        """Start ``factory()`` for key unless already in flight, without waiting; returns ``(task, existing)``."""
+        task = self._inflight.get(key)
+        if task is not None:
+            return task, True
+        task = asyncio.ensure_future(factory())
+        self._inflight[key] = task
+        task.add_done_callback(lambda t: self._forget(key, t))
+        self.stats["leaders"] += 1
+        return task, False
+
+    async def do(self, key: str, factory):
+        """Run ``factory()`` once per key; returns ``(result, shared)``.
+
+        ``shared`` is True when this caller joined a call started by another
+        request. Waiters are shielded, so cancelling one of them never cancels
+        the upstream call the others are waiting on.
+        """
+        task, shared = self.start(key, factory)
+        if shared:
+            self.stats["coalesced"] += 1
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            return await asyncio.shield(task), shared
+        finally:
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                del self._waiters[key]
+
+    def cancel_if_idle(self, key: str) -> bool:
+        """Cancel the in-flight call for key if nobody is waiting on it (abandoned speculation)."""
+        task = self._inflight.get(key)
+        if task is None or task.done() or self._waiters.get(key):
+            return False
+        task.cancel()
+        return True
+
+    def __len__(self) -> int:
+        return len(self._inflight)
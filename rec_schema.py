@@ -0,0 +1,85 @@
+"""
+推荐结果的统一 schema：声明一次，按各家 provider 的原生结构化输出格式下发
+（OpenAI/Grok json_schema、DeepSeek/Qwen json_object、Claude tool use、Gemini responseSchema）
+"""
+import copy
+from typing import Any, Dict
+
+RECOMMENDATION_TYPES = ["program", "job", "funding"]
+
+RECOMMENDATION_ITEM_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "id": {"type": "string"},
+        "name": {"type": "string"},
+        "type": {"type": "string", "enum": RECOMMENDATION_TYPES},
+        "description": {"type": "string"},
+        "eligibility": {"type": "array", "items": {"type": "string"}},
+        "benefits": {"type": "string"},
+        "applicationSteps": {"type": "array", "items": {"type": "string"}},
+        "contactInfo": {
+            "type": "object",
+            "properties": {
+                "website": {"type": "string"},
+                "phone": {"type": "string"},
+                "email": {"type": "string"},
+            },
+            "required": ["website", "phone", "email"],
+            "additionalProperties": False,
+        },
+        "relevanceScore": {"type": "integer"},
+        "location": {"type": "string"},
+    },
+    "required": ["id", "name", "type", "description", "eligibility", "benefits",
+                 "applicationSteps", "contactInfo", "relevanceScore", "location"],
+    "additionalProperties": False,
+}
+
+# 结构化输出要求根节点是 object，数组包在 recommendations 字段里
+RESPONSE_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {"recommendations": {"type": "array", "items": RECOMMENDATION_ITEM_SCHEMA}},
+    "required": ["recommendations"],
+    "additionalProperties": False,
+}
+
+SCHEMA_NAME = "recommendations"
+TOOL_NAME = "submit_recommendations"
+
+# provider 的结构化输出能力（LLM_CONFIGS 里的 "structured" 字段取这些值）
+MODE_JSON_SCHEMA = "json_schema"      # response_format json_schema, strict
+MODE_JSON_OBJECT = "json_object"      # 只保证是合法 JSON，schema 不强制
+MODE_TOOL = "tool"                    # Claude：强制调用一个以 schema 为入参的工具
+MODE_RESPONSE_SCHEMA = "response_schema"   # Gemini generationConfig.responseSchema
+
+
+def openai_response_format(mode: str) -> Dict[str, Any]:
+    if mode == MODE_JSON_SCHEMA:
+        return {"type": "json_schema",
+                "json_schema": {"name": SCHEMA_NAME, "strict": True, "schema": RESPONSE_SCHEMA}}
+    return {"type": "json_object"}
+
+
+def claude_tool_fields() -> Dict[str, Any]:
+    return {
+        "tools": [{
+            "name": TOOL_NAME,
+            "description": "Return the recommended opportunities for this user.",
+            "input_schema": RESPONSE_SCHEMA,
+        }],
+        "tool_choice": {"type": "tool", "name": TOOL_NAME},
+    }
+
+
+def _to_gemini(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """Gemini responseSchema is an OpenAPI subset: no additionalProperties."""
+    out = {k: v for k, v in schema.items() if k != "additionalProperties"}
+    if "properties" in out:
+        out["properties"] = {k: _to_gemini(v) for k, v in out["properties"].items()}
+        out["propertyOrdering"] = list(schema["properties"])
+    if "items" in out:
+        out["items"] = _to_gemini(out["items"])
+    return out
+
+
+GEMINI_RESPONSE_SCHEMA: Dict[str, Any] = _to_gemini(copy.deepcopy(RESPONSE_SCHEMA))
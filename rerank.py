@@ -0,0 +1,191 @@
+"""
+本地重排与分数校准：按 prompt 里的评分规则（30% 资格 / 30% 需求与工作偏好 / 40% 教育、技能与兴趣）
+把解析后的每条推荐与画像比对打分，与模型给出的 relevanceScore 混合，去掉近似重复项，返回稳定排序。
+
+画像与每条推荐各只分词一次，之后全是集合交集：十几条推荐不到一毫秒，不需要再请求一次模型来排序。
+"""
+import os
+import re
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+# prompt 中声明的权重：资格、需求/工作偏好、教育/技能/兴趣
+WEIGHTS = (0.30, 0.30, 0.40)
+# 最终分数中模型分数所占比例（0 = 只用本地分数，1 = 只用模型分数）
+MODEL_WEIGHT = float(os.getenv("RERANK_MODEL_WEIGHT", "0.5"))
+# 名称词集合的 Jaccard 相似度达到该值（且类型相同）视为同一条推荐
+DEDUPE_THRESHOLD = float(os.getenv("RERANK_DEDUPE_THRESHOLD", "0.8"))
+
+_WORD = re.compile(r"[^\W_]+")
+# 太常见、不能说明匹配的词
+_STOP = frozenset(
+    "a an and are as at be by for from has have in is it of on or the to with who must your you "
+    "user users people person applicant applicants s t".split()
+)
+# 不限地点的写法
+_ANYWHERE = frozenset({"remote", "online", "nationwide", "national", "anywhere", "virtual"})
+# 推荐类型 → 画像里表示该类需求的词
+_TYPE_HINTS = {
+    "job": frozenset({"job", "jobs", "employment", "work", "career", "income", "hire", "hiring"}),
+    "funding": frozenset({"funding", "financial", "grant", "grants", "money", "cost", "costs", "subsidy",
+                          "allowance", "payment", "scholarship"}),
+    "program": frozenset({"program", "training", "course", "courses", "mentoring", "skills", "study",
+                          "learning", "coaching"}),
+}
+
+
+def _words(value: Any) -> FrozenSet[str]:
+    if value is None:
+        return frozenset()
+    if isinstance(value, dict):
+        value = " ".join(str(v) for v in value.values())
+    elif isinstance(value, (list, tuple)):
+        value = " ".join(str(v) for v in value)
+    return frozenset(_WORD.findall(str(value).casefold())) - _STOP
+
+
+def _get(profile: Dict[str, Any], path: str) -> Any:
+    value: Any = profile
+    for key in path.split("."):
+        value = value.get(key) if isinstance(value, dict) else None
+    return value
+
+
+def _union(profile: Dict[str, Any], paths: Iterable[str]) -> FrozenSet[str]:
+    out: FrozenSet[str] = frozenset()
+    for path in paths:
+        out = out | _words(_get(profile, path))
+    return out
+
+
+def _coverage(words: FrozenSet[str], wanted: FrozenSet[str], saturate: int = 3) -> Optional[float]:
+    """Share of the profile's wanted words found in ``words``; a few hits already count as full."""
+    if not wanted:
+        return None
+    return min(1.0, len(words & wanted) / min(len(wanted), saturate))
+
+
+def _mean(values: Iterable[Optional[float]], default: float = 0.5) -> float:
+    present = [v for v in values if v is not None]
+    return sum(present) / len(present) if present else default
+
+
+class ProfileMatcher:
+    """Profile fields pre-tokenized once, scoring any number of recommendations against them."""
+
+    __slots__ = ("location", "eligibility_words", "needs", "type_words", "education")
+
+    def __init__(self, profile: Optional[Dict[str, Any]]):
+        profile = profile if isinstance(profile, dict) else {}
+        self.location = _words(_get(profile, "personalInfo.location"))
+        # 资格条件通常写的是残障类型、地点、年龄段、学历
+        self.eligibility_words = self.location | _union(profile, (
+            "disability.type", "disability.severity", "education.level", "personalInfo.communicationMode"))
+        age = _get(profile, "personalInfo.age")
+        if isinstance(age, (int, float)) or (isinstance(age, str) and age.isdigit()):
+            age = int(age)
+            # "young people"、"youth"、"under 25" 之类的条件
+            self.eligibility_words |= {"youth", "young"} if age < 25 else {"adult", "adults"}
+        self.needs = _union(profile, (
+            "needs.financial", "needs.support", "needs.technology", "needs.priority", "employment.workPreferences"))
+        self.type_words = self.needs | _union(profile, ("employment.interests",))
+        self.education = _union(profile, (
+            "education.level", "education.skills", "education.interests", "employment.interests"))
+
+    def _location_score(self, rec: Dict[str, Any]) -> Optional[float]:
+        loc = _words(rec.get("location"))
+        if not loc or not self.location:
+            return None
+        if loc & _ANYWHERE or loc & self.location:
+            return 1.0
+        return 0.0
+
+    def _type_score(self, rec: Dict[str, Any]) -> Optional[float]:
+        hints = _TYPE_HINTS.get(str(rec.get("type", "")).strip().casefold())
+        if hints is None or not self.type_words:
+            return None
+        return 1.0 if hints & self.type_words else 0.0
+
+    def components(self, rec: Dict[str, Any], tokens: Optional["_RecTokens"] = None) -> Tuple[float, float, float]:
+        """``(eligibility, needs/preferences, education/skills/interests)``, each 0..1."""
+        tokens = tokens or _RecTokens(rec)
+        if tokens.requirements and self.eligibility_words:
+            met = sum(1 for req in tokens.requirements if req & self.eligibility_words)
+            req_score: Optional[float] = met / len(tokens.requirements)
+        else:
+            req_score = None
+        eligibility = _mean((req_score, self._location_score(rec)))
+
+        needs = _mean((_coverage(tokens.text, self.needs), self._type_score(rec)))
+        education = _mean((_coverage(tokens.text | tokens.eligibility, self.education),))
+        return eligibility, needs, education
+
+    def local_score(self, rec: Dict[str, Any], tokens: Optional["_RecTokens"] = None) -> float:
+        """Weighted local relevance on the model's 0..100 scale."""
+        parts = self.components(rec, tokens)
+        return 100.0 * sum(w * p for w, p in zip(WEIGHTS, parts))
+
+
+class _RecTokens:
+    """Word sets of one recommendation, tokenized once for scoring and dedupe."""
+
+    __slots__ = ("name", "text", "requirements", "eligibility")
+
+    def __init__(self, rec: Dict[str, Any]):
+        self.name = _words(rec.get("name"))
+        self.text = self.name | _words(rec.get("description")) | _words(rec.get("benefits"))
+        requirements = rec.get("eligibility") or []
+        if isinstance(requirements, str):
+            requirements = [requirements]
+        self.requirements = [_words(req) for req in requirements]
+        self.eligibility = frozenset().union(*self.requirements)
+
+
+def _dedupe_key(rec: Dict[str, Any], name: FrozenSet[str]) -> Tuple[str, FrozenSet[str], str]:
+    contact = rec.get("contactInfo") if isinstance(rec.get("contactInfo"), dict) else {}
+    site = str(contact.get("website", "")).strip().casefold().rstrip("/")
+    site = re.sub(r"^https?://(www\.)?", "", site)
+    return str(rec.get("type", "")).strip().casefold(), name, site
+
+
+def _same(a: Tuple[str, FrozenSet[str], str], b: Tuple[str, FrozenSet[str], str]) -> bool:
+    if a[2] and a[2] == b[2] and a[1] & b[1]:
+        # 同一网址且名称有重合：同一项目的不同写法
+        return True
+    if a[0] != b[0] or not a[1] or not b[1]:
+        return False
+    return len(a[1] & b[1]) / len(a[1] | b[1]) >= DEDUPE_THRESHOLD
+
+
+def rerank(recs: List[Dict[str, Any]], profile: Optional[Dict[str, Any]],
+           model_weight: Optional[float] = None) -> List[Dict[str, Any]]:
+    """Calibrate ``relevanceScore`` against the profile, drop near-duplicates, sort descending.
+
+    The input list is not modified. Ties keep the model's original order, so the
+    result is stable across runs.
+    """
+    if not recs:
+        return []
+    alpha = MODEL_WEIGHT if model_weight is None else model_weight
+    matcher = ProfileMatcher(profile)
+    scored = []
+    for pos, rec in enumerate(recs):
+        try:
+            model = float(rec.get("relevanceScore") or 0)
+        except (TypeError, ValueError):
+            model = 0.0
+        tokens = _RecTokens(rec)
+        blended = alpha * model + (1.0 - alpha) * matcher.local_score(rec, tokens)
+        score = max(0, min(100, int(round(blended))))
+        scored.append((-score, pos, tokens.name, {**rec, "relevanceScore": score}))
+    scored.sort(key=lambda t: (t[0], t[1]))
+
+    # 按分数从高到低保留，遇到与已保留项近似的就丢弃
+    kept: List[Dict[str, Any]] = []
+    kept_keys: List[Tuple[str, FrozenSet[str], str]] = []
+    for _neg, _pos, name, rec in scored:
+        key = _dedupe_key(rec, name)
+        if any(_same(key, other) for other in kept_keys):
+            continue
+        kept.append(rec)
+        kept_keys.append(key)
+    return kept
@@ -0,0 +1,115 @@
+"""
+生产启动入口：多 worker 运行 service:app。
+
+- 安装了 gunicorn 时用 gunicorn + UvicornWorker，并 preload：配置、目录索引、编译好的模板在
+  master 里加载一次，fork 后各 worker 共享（写时复制）；连接池与 SSL context 在每个 worker 内首次使用时才建立
+- 否则退回 uvicorn 自带的多进程模式（每个 worker 各自 import）
+- SIGTERM：worker 停止接收新连接、/readyz 返回 503，在途请求（含流式响应）排空（SERVICE_DRAIN_TIMEOUT）后再关闭连接池
+
+    python serve.py --workers 4 --port 8000 --keepalive 75 --backlog 2048 --graceful-timeout 30
+"""
+import argparse
+import os
+
+try:
+    from uvicorn.workers import UvicornWorker
+except ImportError:  # 没装 gunicorn/uvicorn 时只影响 gunicorn 模式
+    UvicornWorker = None
+
+if UvicornWorker is not None:
+    class ServiceWorker(UvicornWorker):
+        """UvicornWorker that also applies the per-worker connection cap (gunicorn has no option for it)."""
+
+        CONFIG_KWARGS = {
+            **UvicornWorker.CONFIG_KWARGS,
+            "limit_concurrency": int(os.getenv("SERVE_LIMIT_CONCURRENCY", "0")) or None,
+        }
+
+
+def _parse_args():
+    ap = argparse.ArgumentParser(description="Run the recommendation service with multiple workers")
+    ap.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    ap.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    ap.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "0")),
+                    help="worker processes (default: CPU count)")
+    ap.add_argument("--keepalive", type=float, default=float(os.getenv("SERVE_KEEPALIVE", "75")),
+                    help="client keep-alive seconds; keep above the load balancer's idle timeout")
+    ap.add_argument("--backlog", type=int, default=int(os.getenv("SERVE_BACKLOG", "2048")),
+                    help="listen(2) backlog")
+    ap.add_argument("--graceful-timeout", type=float, default=float(os.getenv("SERVE_GRACEFUL_TIMEOUT", "30")),
+                    help="seconds a worker gets to finish in-flight requests after SIGTERM")
+    ap.add_argument("--limit-concurrency", type=int, default=int(os.getenv("SERVE_LIMIT_CONCURRENCY", "0")),
+                    help="per-worker cap on concurrent connections before answering 503 (0 = unlimited)")
+    ap.add_argument("--max-requests", type=int, default=int(os.getenv("SERVE_MAX_REQUESTS", "0")),
+                    help="recycle a worker after this many requests (gunicorn only, 0 = never)")
+    ap.add_argument("--log-level", default=os.getenv("LOG_LEVEL", "info"))
+    ap.add_argument("--no-gunicorn", action="store_true", help="use uvicorn's own process manager")
+    args = ap.parse_args()
+    args.workers = args.workers or os.cpu_count() or 1
+    # 排空等待要比进程级宽限期短，留时间关闭连接池
+    os.environ.setdefault("SERVICE_DRAIN_TIMEOUT", str(max(1.0, args.graceful_timeout - 5)))
+    # gunicorn 按名字重新 import ServiceWorker，通过环境变量把并发上限传过去
+    os.environ["SERVE_LIMIT_CONCURRENCY"] = str(args.limit_concurrency)
+    return args
+
+
+def _run_gunicorn(args) -> bool:
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        return False
+    if UvicornWorker is None:
+        return False
+
+    class _App(BaseApplication):
+        def load_config(self):
+            options = {
+                "bind": f"{args.host}:{args.port}",
+                "workers": args.workers,
+                "worker_class": "serve.ServiceWorker",
+                "preload_app": True,
+                "keepalive": args.keepalive,
+                "backlog": args.backlog,
+                "graceful_timeout": args.graceful_timeout,
+                # LLM 调用可能很慢，心跳超时要覆盖最长请求
+                "timeout": max(120, int(args.graceful_timeout) * 2),
+                "max_requests": args.max_requests,
+                "max_requests_jitter": args.max_requests // 10,
+                "loglevel": args.log_level,
+            }
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from service import app
+            return app
+
+    _App().run()
+    return True
+
+
+def _run_uvicorn(args):
+    import uvicorn
+
+    uvicorn.run(
+        "service:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        backlog=args.backlog,
+        timeout_keep_alive=int(args.keepalive),
+        timeout_graceful_shutdown=int(args.graceful_timeout),
+        limit_concurrency=args.limit_concurrency or None,
+        log_level=args.log_level,
+    )
+
+
+def main():
+    args = _parse_args()
+    print(f"[SERVE] {args.workers} worker(s) on {args.host}:{args.port}")
+    if args.no_gunicorn or not _run_gunicorn(args):
+        _run_uvicorn(args)
+
+
+if __name__ == "__main__":
+    main()
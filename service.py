@@ -0,0 +1,599 @@
+"""
+推荐服务的 FastAPI 应用：provider 链、结果缓存、single-flight、对冲执行器与各个 HTTP 端点。
+
+    uvicorn service:app        （`back:app` 也指向这里）
+    python serve.py --workers 4
+
+从 back.py 拆出来，CLI 运行时不必加载 FastAPI/starlette/pydantic。
+"""
+import asyncio
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List
+
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+
+import batch as _batch
+from back import LLMScorerWithExcel, provider_api_key
+from cascade import CascadeExecutor, Degraded, QualityGate
+from catalog import OpportunityCatalog
+from jobs import JobQueue, QueueFullError
+from journal import JOURNAL
+from llm_engine import HedgedExecutor
+from metrics import REGISTRY, RECOMMEND_TOTAL, STAGE_SECONDS
+from profile_schema import MAX_BODY_BYTES, Profile, ProfileError, parse_profile, validate_profile
+from rate_limit import OverloadedError, ProviderLimiter, parse_limit_map
+from rec_cache import RecommendationCache, SimilarityCache, SingleFlight, profile_cache_key
+from rerank import rerank
+from speculate import Speculator
+from token_budget import estimate_tokens
+from transport import close_http_sessions, get_http_session
+
+# Build reusable scorer instances for the service from environment variables
+_PROVIDER = os.getenv("LLM_PROVIDER", "openai4")
+_INSECURE = os.getenv("SSL_INSECURE", "0") == "1"
+_CA_BUNDLE = os.getenv("SSL_CA_BUNDLE", None)
+# Recommendation result cache (REC_CACHE_DB 为空时只用内存层)
+_CACHE_SIZE = int(os.getenv("REC_CACHE_SIZE", "1024"))
+_CACHE_TTL = float(os.getenv("REC_CACHE_TTL", "3600"))
+_CACHE_DB = os.getenv("REC_CACHE_DB", "")
+# 近似画像缓存：余弦相似度达到阈值即复用（SIMILAR_CACHE_SIZE=0 关闭）
+_SIMILAR_SIZE = int(os.getenv("SIMILAR_CACHE_SIZE", "2048"))
+_SIMILAR_THRESHOLD = float(os.getenv("SIMILAR_CACHE_THRESHOLD", "0.92"))
+# 推测式预生成（/recommend/warmup）的花费上限；SPECULATE=0 关闭
+_SPECULATE = os.getenv("SPECULATE", "1") == "1"
+_SPECULATE_MAX_INFLIGHT = int(os.getenv("SPECULATE_MAX_INFLIGHT", "4"))
+_SPECULATE_TOKENS_PER_MIN = int(os.getenv("SPECULATE_TOKENS_PER_MIN", "200000"))
+_SPECULATE_PER_SESSION = int(os.getenv("SPECULATE_PER_SESSION", "3"))
+_SPECULATE_TTL = float(os.getenv("SPECULATE_TTL", "300"))
+# 画像请求体上限（字节），超出直接 413，不读完整个请求体
+_PROFILE_MAX_BYTES = int(os.getenv("PROFILE_MAX_BYTES", str(MAX_BODY_BYTES)))
+# 关闭时等待在途请求完成的最长秒数（之后才关闭连接池）
+_DRAIN_TIMEOUT = float(os.getenv("SERVICE_DRAIN_TIMEOUT", "25"))
+
+# 每个 worker 进程各自的服务状态：就绪/排空标记与在途请求数
+_service_state = {"ready": False, "draining": False, "inflight": 0, "started_at": 0.0}
+
+@asynccontextmanager
+async def _lifespan(app: FastAPI):
+    # 启动时（每个 worker 内）为每个 provider 建连接池与 SSL context；关闭时先排空在途请求再释放
+    for scorer in _all_scorers():
+        get_http_session(scorer)
+    watcher = asyncio.ensure_future(_watch_catalog()) if _catalog is not None else None
+    if _jobs is not None and _scorer_service is not None:
+        _jobs.start(_recommend_one)
+    _service_state.update(ready=True, draining=False, started_at=time.time())
+    try:
+        yield
+    finally:
+        _service_state.update(ready=False, draining=True)
+        deadline = time.monotonic() + _DRAIN_TIMEOUT
+        while _service_state["inflight"] > 0 and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        if _service_state["inflight"]:
+            print(f"[SERVE] drain timeout, {_service_state['inflight']} request(s) still in flight")
+        if watcher is not None:
+            watcher.cancel()
+        if _jobs is not None:
+            # 剩下的排空时间留给在跑的任务，没跑完的放回队列，重启后继续
+            await _jobs.close(timeout=max(0.0, deadline - time.monotonic()))
+        await close_http_sessions()
+        await JOURNAL.close()
+
+try:
+    import orjson
+except ImportError:  # 没装 orjson 时退回标准库
+    orjson = None
+
+
+def _dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson (stdlib fallback), timed as the ``serialize`` stage."""
+
+    def render(self, content: Any) -> bytes:
+        started = time.perf_counter()
+        body = _dumps(content)
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage="serialize", **_primary_labels())
+        return body
+
+
+app = FastAPI(title="LLM Recommendation Service", lifespan=_lifespan, default_response_class=FastJSONResponse)
+
+
+class _InflightMiddleware:
+    """Count in-flight HTTP requests (including streaming bodies) for readiness and drain."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        _service_state["inflight"] += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _service_state["inflight"] -= 1
+
+app.add_middleware(_InflightMiddleware)
+
+# Allow all origins/methods/headers for dev
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],          # allow any origin for development
+    allow_origin_regex=None,
+    allow_credentials=False,        # keep False when using "*"
+    allow_methods=["*"],           # allow all methods including OPTIONS
+    allow_headers=["*"],           # allow all headers
+    expose_headers=["X-Cache", "Location"]     # let the frontend read cache status and job URLs
+)
+
+# Explicit preflight handler for /recommend to be extra safe
+@app.options("/recommend")
+async def cors_preflight():
+    return FastJSONResponse(
+        content={},
+        headers={
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Methods": "POST, OPTIONS",
+            "Access-Control-Allow-Headers": "*",
+            "Access-Control-Expose-Headers": "X-Cache",
+            "Vary": "Origin",
+        },
+    )
+
+# Ordered provider chain for hedging/failover, e.g. LLM_PROVIDERS="openai4,deepseek,gemini".
+# 未设置时只使用 LLM_PROVIDER；没有 API key 的 provider 会被跳过
+_PROVIDER_CHAIN = [p.strip() for p in os.getenv("LLM_PROVIDERS", _PROVIDER).split(",") if p.strip()]
+_HEDGE_DELAY = float(os.getenv("LLM_HEDGE_DELAY", "8"))          # 样本不足时的对冲等待秒数
+_HEDGE_QUANTILE = float(os.getenv("LLM_HEDGE_QUANTILE", "0.95"))
+_REQUEST_DEADLINE = float(os.getenv("LLM_REQUEST_DEADLINE", "60"))
+# Per-provider limits, e.g. LLM_RPM="openai4=500,deepseek=60"；单个数字对所有 provider 生效
+# 实际限额会根据 provider 返回的 rate-limit 响应头自动修正
+_RPM_LIMITS = parse_limit_map(os.getenv("LLM_RPM", ""))
+_TPM_LIMITS = parse_limit_map(os.getenv("LLM_TPM", ""))
+_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))   # AIMD 并发上限
+_QUEUE_MAX_WAIT = float(os.getenv("LLM_QUEUE_MAX_WAIT", "10"))   # 排队超过此秒数则卸载
+_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+_BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+# 设为 0 时不下发 schema，所有 provider 都走 parse_response 的修复解析
+_STRUCTURED_OUTPUT = os.getenv("LLM_STRUCTURED_OUTPUT", "1") == "1"
+_TARGET_ITEMS = int(os.getenv("LLM_TARGET_ITEMS", "3"))   # 每次请求期望的推荐条数
+# Local opportunities catalog (Excel/CSV)；设置后每个画像先检索 top-k 候选项再注入 prompt
+# 成本/质量级联：LLM_CASCADE="deepseek" 先问便宜模型，质量检查不过才走上面的 provider 链（见 cascade.py）
+_CASCADE_CHAIN = [p.strip() for p in os.getenv("LLM_CASCADE", "").split(",") if p.strip()]
+_CASCADE_TIMEOUT = float(os.getenv("LLM_CASCADE_TIMEOUT", "15"))
+_CASCADE_MIN_ITEMS = int(os.getenv("LLM_CASCADE_MIN_ITEMS", str(_TARGET_ITEMS)))
+_CASCADE_MIN_COMPLETENESS = float(os.getenv("LLM_CASCADE_MIN_COMPLETENESS", "0.8"))
+_CASCADE_MIN_SPREAD = int(os.getenv("LLM_CASCADE_MIN_SPREAD", "5"))
+_CASCADE_ALLOW_REPAIR = os.getenv("LLM_CASCADE_ALLOW_REPAIR", "0") == "1"
+_CATALOG_PATH = os.getenv("CATALOG_PATH", "")
+_CATALOG_TOP_K = int(os.getenv("CATALOG_TOP_K", "8"))
+_CATALOG_CACHE_DIR = os.getenv("CATALOG_CACHE_DIR", ".catalog_cache")
+_CATALOG_RELOAD_INTERVAL = float(os.getenv("CATALOG_RELOAD_INTERVAL", "30"))
+
+def _build_scorers(providers: List[str]) -> List[LLMScorerWithExcel]:
+    scorers = []
+    for p in providers:
+        key = provider_api_key(p)
+        if not (key and p in LLMScorerWithExcel.LLM_CONFIGS):
+            continue
+        scorer = LLMScorerWithExcel(api_key=key, provider=p, ssl_options=(_INSECURE, _CA_BUNDLE))
+        if not _STRUCTURED_OUTPUT:
+            scorer.structured = None
+        scorer.target_items = _TARGET_ITEMS
+        scorer._rate_limiter = ProviderLimiter(
+            p,
+            rpm=_RPM_LIMITS.get(p, _RPM_LIMITS.get("*", 0)),
+            tpm=_TPM_LIMITS.get(p, _TPM_LIMITS.get("*", 0)),
+            max_concurrency=_MAX_CONCURRENCY,
+            max_wait=_QUEUE_MAX_WAIT,
+            max_retries=_MAX_RETRIES,
+        )
+        scorers.append(scorer)
+    return scorers
+
+_service_scorers: List[LLMScorerWithExcel] = _build_scorers(_PROVIDER_CHAIN)
+# 级联的便宜档（可与上面的强模型链重叠，但各自独立的限流器）
+_cascade_scorers: List[LLMScorerWithExcel] = _build_scorers(_CASCADE_CHAIN) if _service_scorers else []
+
+def _all_scorers() -> List[LLMScorerWithExcel]:
+    return _cascade_scorers + _service_scorers
+
+def _attach_catalog(catalog: "OpportunityCatalog"):
+    for scorer in _all_scorers():
+        scorer.catalog = catalog
+        scorer.catalog_top_k = _CATALOG_TOP_K
+
+_catalog = None
+if _CATALOG_PATH:
+    try:
+        _catalog = OpportunityCatalog.load(_CATALOG_PATH, cache_dir=_CATALOG_CACHE_DIR or None)
+        _attach_catalog(_catalog)
+    except Exception as e:
+        print(f"[CATALOG] Failed to load '{_CATALOG_PATH}': {e}")
+
+async def _watch_catalog():
+    """Reload the catalog in a worker thread when the spreadsheet changes on disk."""
+    global _catalog
+    while True:
+        await asyncio.sleep(_CATALOG_RELOAD_INTERVAL)
+        try:
+            if _catalog is not None and _catalog.changed():
+                _catalog = await asyncio.to_thread(
+                    OpportunityCatalog.load, _CATALOG_PATH, _CATALOG_CACHE_DIR or None
+                )
+                _attach_catalog(_catalog)
+        except Exception as e:
+            print(f"[CATALOG] Reload failed, keeping previous version: {e}")
+
+_scorer_service = _service_scorers[0] if _service_scorers else None
+_engine = HedgedExecutor(
+    _service_scorers,
+    default_hedge_delay=_HEDGE_DELAY,
+    hedge_quantile=_HEDGE_QUANTILE,
+    deadline=_REQUEST_DEADLINE,
+) if _service_scorers else None
+_cascade = CascadeExecutor(
+    _cascade_scorers,
+    _engine,
+    gate=QualityGate(min_items=_CASCADE_MIN_ITEMS, min_completeness=_CASCADE_MIN_COMPLETENESS,
+                     min_spread=_CASCADE_MIN_SPREAD, allow_repair=_CASCADE_ALLOW_REPAIR),
+    cheap_timeout=_CASCADE_TIMEOUT,
+) if _cascade_scorers and _engine is not None else None
+
+_rec_cache = RecommendationCache(max_entries=_CACHE_SIZE, ttl=_CACHE_TTL, db_path=_CACHE_DB or None)
+_similar_cache = SimilarityCache(max_entries=_SIMILAR_SIZE, ttl=_CACHE_TTL, threshold=_SIMILAR_THRESHOLD)
+_inflight = SingleFlight()
+# 异步任务队列（POST /recommend/jobs）；租约覆盖一次请求的截止时间，过期说明领取它的进程已经不在了
+_jobs = JobQueue.from_env(lease=_REQUEST_DEADLINE * 2 + 30)
+_JOBS_MAX_WAIT = float(os.getenv("JOBS_MAX_WAIT", "30"))
+_speculator = Speculator(_inflight, max_inflight=_SPECULATE_MAX_INFLIGHT, tokens_per_min=_SPECULATE_TOKENS_PER_MIN,
+                         per_session=_SPECULATE_PER_SESSION, ttl=_SPECULATE_TTL)
+
+def _cache_model() -> str:
+    # 开启级联后结果可能来自便宜档，缓存与关闭级联时分开
+    if _cascade is None:
+        return _scorer_service.model
+    return ">".join([s.model for s in _cascade_scorers] + [_scorer_service.model])
+
+def _cache_key(profile: Dict[str, Any]) -> str:
+    return profile_cache_key(profile, _scorer_service.provider, _cache_model(),
+                             catalog=_catalog.version if _catalog is not None else "")
+
+def _similar_scope() -> str:
+    return "|".join((_scorer_service.provider, _cache_model(),
+                     _catalog.version if _catalog is not None else ""))
+
+def _similar_lookup(profile: Dict[str, Any]):
+    """Recommendations of a near-duplicate profile, re-ranked for this one (None when disabled or no match)."""
+    if _SIMILAR_SIZE <= 0:
+        return None
+    found = _similar_cache.lookup(profile, _similar_scope())
+    return _rerank(found[0], profile) if found is not None else None
+
+def _rerank(recs: List[Dict[str, Any]], profile: Dict[str, Any]) -> List[Dict[str, Any]]:
+    started = time.perf_counter()
+    ranked = rerank(recs, profile)
+    STAGE_SECONDS.observe(time.perf_counter() - started, stage="rerank", **_primary_labels())
+    return ranked
+
+def _primary_labels() -> Dict[str, str]:
+    if _scorer_service is None:
+        return {"provider": _PROVIDER, "model": ""}
+    return {"provider": _scorer_service.provider, "model": _scorer_service.model}
+
+async def _read_profile(request: Request) -> Profile:
+    """Read the body (refusing oversized payloads early) and decode + validate it in one pass."""
+    length = request.headers.get("content-length", "")
+    if length.isdigit() and int(length) > _PROFILE_MAX_BYTES:
+        raise ProfileError(413, f"profile body exceeds {_PROFILE_MAX_BYTES} bytes")
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > _PROFILE_MAX_BYTES:
+            raise ProfileError(413, f"profile body exceeds {_PROFILE_MAX_BYTES} bytes")
+    started = time.perf_counter()
+    try:
+        return parse_profile(bytes(body), _PROFILE_MAX_BYTES)
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage="validate", **_primary_labels())
+
+async def _generate_recommendations(profile: Profile, cache_key: str) -> List[Dict[str, Any]]:
+    """Prompt -> LLM -> parse -> local re-rank, storing successful results in the caches.
+
+    A cascade fallback (``Degraded``) is returned re-ranked but never cached.
+    """
+    started = time.perf_counter()
+    prompt = _scorer_service.create_prompt(profile)
+    STAGE_SECONDS.observe(time.perf_counter() - started, stage="prompt_build", **_primary_labels())
+    recs, provider = await (_cascade or _engine).run(prompt)
+    if provider != _scorer_service.provider and all(provider != s.provider for s in _cascade_scorers):
+        print(f"[ENGINE] served by fallback provider {provider}")
+    if isinstance(recs, Degraded):
+        # 强模型失败时退回的便宜结果没过质量检查：不进缓存，下一次请求重新走级联
+        return Degraded(_rerank(recs, profile.data), provider)
+    if _SIMILAR_SIZE > 0:
+        # 近似缓存存模型原始结果，命中时按新画像重新校准
+        _similar_cache.add(profile.data, recs, _similar_scope())
+    recs = _rerank(recs, profile.data)
+    await _rec_cache.set(cache_key, recs)
+    return recs
+
+async def _recommend_one(profile: Any) -> List[Dict[str, Any]]:
+    """Validate -> cache -> single-flight -> engine for one profile (batch endpoint and job workers).
+
+    A cascade fallback comes back as ``Degraded`` so callers can mark it and keep it out of their stores.
+    """
+    profile = validate_profile(profile)
+    cache_key = _cache_key(profile.data)
+    cached = await _rec_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    similar = _similar_lookup(profile.data)
+    if similar is not None:
+        return similar
+    recs, _shared = await _inflight.do(cache_key, lambda: _generate_recommendations(profile, cache_key))
+    return recs
+
+@app.post("/recommend")
+async def recommend(request: Request):
+    if _scorer_service is None:
+        return FastJSONResponse(status_code=500, content={"error": "Service not configured: missing API key"})
+    started = time.perf_counter()
+    try:
+        profile = await _read_profile(request)
+    except ProfileError as e:
+        # 不合法的画像在任何缓存/上游工作之前拒绝
+        RECOMMEND_TOTAL.inc(endpoint="recommend", cache="INVALID")
+        return FastJSONResponse(status_code=e.status, content=e.payload())
+    cache_key = _cache_key(profile.data)
+    # 表单提交：与预生成时的画像一致就沿用它（命中缓存或加入在跑的任务），否则取消旧的推测
+    speculated = _SPECULATE and _speculator.claim(cache_key, request.headers.get("x-session-id"))
+    cached = await _rec_cache.get(cache_key)
+    if cached is not None:
+        outcome = "SPECULATED" if speculated else "HIT"
+        resp = FastJSONResponse(content=cached, headers={"X-Cache": outcome})
+    elif (similar := _similar_lookup(profile.data)) is not None:
+        # 只差姓名/自由文本的画像：复用近似画像的结果，按本画像重排，不调用 LLM
+        outcome, resp = "SIMILAR", FastJSONResponse(content=similar, headers={"X-Cache": "SIMILAR"})
+    else:
+        # 相同画像并发到达时只发一次上游请求
+        try:
+            recs, shared = await _inflight.do(cache_key, lambda: _generate_recommendations(profile, cache_key))
+            if isinstance(recs, Degraded):
+                outcome = "DEGRADED"
+            else:
+                outcome = ("SPECULATED" if speculated else "COALESCED") if shared else "MISS"
+            resp = FastJSONResponse(content=recs, headers={"X-Cache": outcome})
+        except asyncio.TimeoutError as e:
+            outcome, resp = "TIMEOUT", FastJSONResponse(status_code=504, content={"error": f"LLM deadline exceeded: {e}"})
+        except Exception as e:
+            if isinstance(e.__cause__, OverloadedError):
+                # 所有 provider 都在排队超时后被卸载：告诉客户端稍后重试
+                outcome, resp = "SHED", FastJSONResponse(status_code=503, content={"error": str(e)},
+                                                     headers={"Retry-After": str(int(e.__cause__.retry_after) or 1)})
+            else:
+                outcome, resp = "ERROR", FastJSONResponse(status_code=502, content={"error": f"All LLM providers failed: {e}"})
+    RECOMMEND_TOTAL.inc(endpoint="recommend", cache=outcome)
+    STAGE_SECONDS.observe(time.perf_counter() - started, stage="total", **_primary_labels())
+    return resp
+
+@app.post("/recommend/warmup")
+async def recommend_warmup(request: Request):
+    """Speculatively start generation for a (partially) completed profile.
+
+    Called by the form once disability, education and needs are filled in;
+    send the same ``X-Session-Id`` header here and on the final ``/recommend``.
+    Responds 202 when a run was started, 200 when one is already running or
+    the result is cached, and 429 when a spend cap skipped it.
+    """
+    if _scorer_service is None:
+        return FastJSONResponse(status_code=500, content={"error": "Service not configured: missing API key"})
+    if not _SPECULATE:
+        return FastJSONResponse(content={"status": "disabled"})
+    try:
+        profile = await _read_profile(request)
+    except ProfileError as e:
+        return FastJSONResponse(status_code=e.status, content=e.payload())
+    cache_key = _cache_key(profile.data)
+    if cache_key in _rec_cache or (_SIMILAR_SIZE > 0 and _similar_cache.lookup(profile.data, _similar_scope(),
+                                                                                 record=False) is not None):
+        # 最终请求会直接命中缓存，不必花钱
+        _speculator.note_ready()
+        return FastJSONResponse(content={"status": "ready"})
+    prompt = _scorer_service.create_prompt(profile)
+    est_tokens = estimate_tokens(prompt) + _scorer_service.budget.max_tokens(_scorer_service.target_items)
+    status = _speculator.start(cache_key, lambda: _generate_recommendations(profile, cache_key), est_tokens,
+                               session=request.headers.get("x-session-id"))
+    code = 202 if status == "started" else 429 if status.startswith("skipped") else 200
+    return FastJSONResponse(status_code=code, content={"status": status})
+
+@app.post("/recommend/jobs")
+async def submit_job(request: Request):
+    """Queue a recommendation job and return its id immediately.
+
+    The same profile (by cache key) returns the job that is already queued,
+    running or holding an unexpired result. Poll ``GET /recommend/jobs/{id}``.
+    """
+    if _scorer_service is None:
+        return FastJSONResponse(status_code=500, content={"error": "Service not configured: missing API key"})
+    if _jobs is None:
+        return FastJSONResponse(status_code=503, content={"error": "Job queue disabled (JOBS_DB is empty)"})
+    try:
+        profile = await _read_profile(request)
+    except ProfileError as e:
+        RECOMMEND_TOTAL.inc(endpoint="jobs", cache="INVALID")
+        return FastJSONResponse(status_code=e.status, content=e.payload())
+    cache_key = _cache_key(profile.data)
+    # 已有缓存结果时直接记成完成的任务，不必排队
+    cached = await _rec_cache.get(cache_key)
+    try:
+        job = await _jobs.submit(cache_key, profile.data, result=cached)
+    except QueueFullError as e:
+        RECOMMEND_TOTAL.inc(endpoint="jobs", cache="SHED")
+        return FastJSONResponse(status_code=429, content={"error": str(e)}, headers={"Retry-After": "5"})
+    outcome = "DEDUPED" if job["deduped"] else "HIT" if cached is not None else "QUEUED"
+    RECOMMEND_TOTAL.inc(endpoint="jobs", cache=outcome)
+    return FastJSONResponse(status_code=200 if job["status"] == "done" else 202, content=job,
+                            headers={"Location": f"/recommend/jobs/{job['id']}", "X-Cache": outcome})
+
+@app.get("/recommend/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = 0.0):
+    """Job status; ``?wait=N`` long-polls up to N seconds (capped by JOBS_MAX_WAIT) for it to finish."""
+    if _jobs is None:
+        return FastJSONResponse(status_code=503, content={"error": "Job queue disabled (JOBS_DB is empty)"})
+    job = await _jobs.get(job_id, wait=min(max(wait, 0.0), _JOBS_MAX_WAIT))
+    if job is None:
+        return FastJSONResponse(status_code=404, content={"error": "unknown or expired job"})
+    headers = {} if job["status"] in ("done", "failed") else {"Retry-After": "1"}
+    return FastJSONResponse(content=job, headers=headers)
+
+@app.post("/recommend/stream")
+async def recommend_stream(request: Request):
+    """NDJSON stream: one normalized recommendation per line, emitted as soon as it is complete.
+
+    A failure after some items were sent ends the stream with an ``{"error": ...}`` line.
+    """
+    if _scorer_service is None:
+        return FastJSONResponse(status_code=500, content={"error": "Service not configured: missing API key"})
+    try:
+        profile = await _read_profile(request)
+    except ProfileError as e:
+        RECOMMEND_TOTAL.inc(endpoint="stream", cache="INVALID")
+        return FastJSONResponse(status_code=e.status, content=e.payload())
+    cache_key = _cache_key(profile.data)
+    cached = await _rec_cache.get(cache_key)
+
+    RECOMMEND_TOTAL.inc(endpoint="stream", cache="HIT" if cached is not None else "MISS")
+
+    async def _ndjson():
+        if cached is not None:
+            for rec in cached:
+                yield _dumps(rec) + b"\n"
+            return
+        started = time.perf_counter()
+        prompt = _scorer_service.create_prompt(profile)
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage="prompt_build", **_primary_labels())
+        recs: List[Dict[str, Any]] = []
+        last_error = None
+        for scorer in _service_scorers:
+            try:
+                async for rec in scorer.stream_recommendations(prompt):
+                    recs.append(rec)
+                    yield _dumps(rec) + b"\n"
+                last_error = None
+            except Exception as e:
+                last_error = e
+                print(f"[STREAM] {scorer.provider} failed: {e}")
+            # 已经发出过条目就不再换 provider，避免结果混杂
+            if recs:
+                break
+        if last_error is not None:
+            yield _dumps({"error": str(last_error)}) + b"\n"
+            # 中途失败的残缺结果不能进缓存，否则整个 TTL 内都会被当作完整结果命中
+            return
+        if len(recs) < _scorer_service.target_items:
+            # 流式没有截断续写：条数不够（多半是被 max_tokens 截断）时同样不缓存
+            return
+        # 流里的条目已按模型顺序发出；缓存的是重排后的结果，之后命中时顺序与 /recommend 一致
+        if _SIMILAR_SIZE > 0:
+            _similar_cache.add(profile.data, recs, _similar_scope())
+        await _rec_cache.set(cache_key, _rerank(recs, profile.data))
+
+    return StreamingResponse(
+        _ndjson(),
+        media_type="application/x-ndjson",
+        headers={"X-Cache": "HIT" if cached is not None else "MISS"},
+    )
+
+@app.post("/recommend/batch")
+async def recommend_batch(request: Request):
+    """Score many profiles; body is NDJSON (one profile per line) or a JSON array.
+
+    Responds with NDJSON in completion order: ``{"index", "recommendations"}``
+    or ``{"index", "error"}`` per input line; cascade fallbacks also carry
+    ``"degraded": true``. An NDJSON upload is spooled
+    to a temp file (on disk past 1 MiB) before the response starts and then
+    read line by line, so large uploads are never held in memory at once.
+    """
+    if _scorer_service is None:
+        return FastJSONResponse(status_code=500, content={"error": "Service not configured: missing API key"})
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonl" in content_type:
+        # 必须在返回 StreamingResponse 之前读完：响应开始后断连监听会吃掉剩余的请求体
+        items = _batch.iter_ndjson_file(await _batch.spool_body(request.stream()))
+    else:
+        try:
+            body = await request.json()
+        except Exception:
+            return FastJSONResponse(status_code=400, content={"error": "Body must be a JSON array or NDJSON"})
+        if not isinstance(body, list):
+            return FastJSONResponse(status_code=400, content={"error": "Body must be a JSON array or NDJSON"})
+        items = enumerate(body)
+
+    async def _ndjson():
+        async for res in _batch.run_bounded(items, _recommend_one, _BATCH_CONCURRENCY):
+            if isinstance(res.get("recommendations"), Degraded):
+                # 级联降级结果：强模型失败时退回的便宜结果
+                res["degraded"] = True
+            yield _dumps(res) + b"\n"
+
+    return StreamingResponse(_ndjson(), media_type="application/x-ndjson")
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the worker process is up and its event loop is responsive."""
+    return FastJSONResponse(content={"status": "ok", "pid": os.getpid()})
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: started, not draining and at least one provider configured."""
+    ready = _service_state["ready"] and not _service_state["draining"] and _scorer_service is not None
+    body = {
+        "ready": ready,
+        "draining": _service_state["draining"],
+        "inflight": _service_state["inflight"],
+        "providers": [s.provider for s in _service_scorers],
+        "pid": os.getpid(),
+    }
+    return FastJSONResponse(status_code=200 if ready else 503, content=body)
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text exposition of stage latencies, token usage and parse outcomes."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return FastJSONResponse(content={**_rec_cache.snapshot(), "similar": _similar_cache.snapshot(),
+                                 "singleflight": {**_inflight.stats, "inflight": len(_inflight)},
+                                 "speculation": _speculator.snapshot()})
+
+@app.get("/jobs/stats")
+async def jobs_stats():
+    if _jobs is None:
+        return FastJSONResponse(content={"enabled": False})
+    return FastJSONResponse(content={"enabled": True, **await _jobs.snapshot()})
+
+@app.get("/engine/stats")
+async def engine_stats():
+    if _engine is None:
+        return FastJSONResponse(content={"providers": []})
+    return FastJSONResponse(content={
+        **_engine.stats,
+        "providers": [s.provider for s in _engine.scorers],
+        "hedge_delay": {s.provider: _engine.hedge_delay(s.provider) for s in _engine.scorers},
+        "limits": {s.provider: s._rate_limiter.snapshot() for s in _engine.scorers},
+        "token_budget": {s.provider: s.budget.snapshot() for s in _engine.scorers},
+        "cascade": _cascade.snapshot() if _cascade is not None else None,
+    })
@@ -0,0 +1,118 @@
+"""
+推测式预生成：表单填到高信号部分（残障、教育、需求）时，前端调用 /recommend/warmup，服务在后台
+按（部分）画像的缓存 key 提前跑 create_prompt → call_llm。最终画像的 key 相同（prompt 没变）时，
+/recommend 直接加入正在跑的任务或命中它写入的缓存；key 变了就取消旧任务重来。
+
+花费有上限：同时在跑的推测数、每分钟估算 token 数、每个会话的推测次数；超出时直接跳过。
+"""
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+from metrics import SPECULATION_TOTAL
+
+
+class Speculator:
+    """Background pre-generation on top of a ``SingleFlight``, with spend caps.
+
+    A speculation is just the single-flight leader for its cache key, so a
+    final request for the same key coalesces onto it (or hits the cache it
+    filled). Abandoned speculations are cancelled only while no real request
+    is waiting on them.
+    """
+
+    def __init__(self, flight, max_inflight: int = 4, tokens_per_min: int = 200_000,
+                 per_session: int = 3, ttl: float = 300.0):
+        self.flight = flight
+        self.max_inflight = max_inflight
+        self.tokens_per_min = tokens_per_min
+        self.per_session = per_session
+        self.ttl = ttl
+        # key -> {"task", "session", "started_at"}
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        # session -> (current key, speculations started, last seen)
+        self._sessions: Dict[str, Tuple[str, int, float]] = {}
+        self._spend: Deque[Tuple[float, int]] = deque()
+        self.stats = {"started": 0, "reused": 0, "cancelled": 0, "wasted": 0, "ready": 0,
+                      "skipped_inflight": 0, "skipped_budget": 0, "skipped_session": 0, "est_tokens": 0}
+
+    def _count(self, outcome: str, n: int = 1):
+        self.stats[outcome] += n
+        SPECULATION_TOTAL.inc(n, outcome=outcome)
+
+    def _abandon(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        if not entry["task"].done():
+            if self.flight.cancel_if_idle(key):
+                self._count("cancelled")
+        else:
+            # 跑完了但最终没有被用上
+            self._count("wasted")
+
+    def _prune(self, now: float):
+        for key in [k for k, e in self._entries.items() if now - e["started_at"] > self.ttl]:
+            self._abandon(key)
+        for session in [s for s, (_k, _n, seen) in self._sessions.items() if now - seen > self.ttl]:
+            del self._sessions[session]
+        while self._spend and now - self._spend[0][0] > 60.0:
+            self._spend.popleft()
+
+    def _running(self) -> int:
+        return sum(1 for e in self._entries.values() if not e["task"].done())
+
+    def start(self, key: str, factory: Callable, est_tokens: int, session: Optional[str] = None) -> str:
+        """Start a speculation for key; returns its status (started, running, ready or skipped_*)."""
+        now = time.monotonic()
+        self._prune(now)
+        previous = self._sessions.get(session) if session else None
+        if previous is not None and previous[0] != key:
+            # 同一会话的画像又变了：旧的推测作废
+            self._abandon(previous[0])
+        entry = self._entries.get(key)
+        if entry is not None:
+            return "ready" if entry["task"].done() else "running"
+
+        count = previous[1] if previous is not None else 0
+        if session and count >= self.per_session:
+            outcome = "skipped_session"
+        elif self._running() >= self.max_inflight:
+            outcome = "skipped_inflight"
+        elif sum(t for _ts, t in self._spend) + est_tokens > self.tokens_per_min:
+            outcome = "skipped_budget"
+        else:
+            outcome = "started"
+        if outcome != "started":
+            self._count(outcome)
+            return outcome
+
+        task, _existing = self.flight.start(key, factory)
+        self._entries[key] = {"task": task, "session": session, "started_at": now}
+        self._spend.append((now, est_tokens))
+        if session:
+            self._sessions[session] = (key, count + 1, now)
+        self._count("started")
+        self.stats["est_tokens"] += est_tokens
+        return outcome
+
+    def note_ready(self):
+        """The result was already cached; nothing to speculate."""
+        self._count("ready")
+
+    def claim(self, key: str, session: Optional[str] = None) -> bool:
+        """Final request for key: True when it reuses a speculation; a stale one for this session is dropped."""
+        now = time.monotonic()
+        self._prune(now)
+        if session:
+            previous = self._sessions.pop(session, None)
+            if previous is not None and previous[0] != key:
+                self._abandon(previous[0])
+        if self._entries.pop(key, None) is None:
+            return False
+        self._count("reused")
+        return True
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {**self.stats, "running": self._running(), "entries": len(self._entries),
+                "sessions": len(self._sessions), "tokens_last_min": sum(t for _ts, t in self._spend)}
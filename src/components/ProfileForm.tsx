@@ -1,8 +1,27 @@
 const API_BASE = (import.meta as any)?.env?.VITE_API_BASE || 'http://127.0.0.1:8000';
-import React, { useState } from 'react';
+import React, { useCallback, useEffect, useRef, useState } from 'react';
 import { ArrowLeft, ArrowRight, Mic, Type, CheckCircle, User, GraduationCap, Briefcase, Heart } from 'lucide-react';
 import Header from './Header';
 import { UserProfile, Resource } from '../App';
+
+const sections = [
+  { title: 'Personal Information', icon: User },
+  { title: 'Disability Profile', icon: Heart },
+  { title: 'Education & Skills', icon: GraduationCap },
+  { title: 'Employment Goals', icon: Briefcase },
+  { title: 'Support Needs', icon: CheckCircle }
+];
+
+// 高信号部分：这些都填了（任一字段非空）就开始预生成；可用 VITE_WARMUP_SECTIONS=disability,education,needs 覆盖
+const WARMUP_SECTIONS = (
+  ((import.meta as any)?.env?.VITE_WARMUP_SECTIONS as string | undefined) || 'disability,education,needs'
+).split(',').map(s => s.trim()).filter(Boolean) as (keyof UserProfile)[];
+
+const sectionFilled = (profile: UserProfile, section: keyof UserProfile) =>
+  Object.values(profile[section] ?? {}).some(value =>
+    Array.isArray(value) ? value.length > 0 : typeof value === 'string' && value.trim() !== ''
+  );
+
 interface ProfileFormProps {
   onComplete: (profile: UserProfile, recommendations: Resource[]) => void;
   onBack: () => void;
@@ -12,6 +31,12 @@ const ProfileForm: React.FC<ProfileFormProps> = ({ onComplete, onBack }) => {
   const [currentSection, setCurrentSection] = useState(0);
   const [isRecording, setIsRecording] = useState(false);
   const [isSubmitting, setIsSubmitting] = useState(false);
+  // 同一次填写的 warmup 与最终提交共用一个会话 id，服务端据此复用或取消预生成
+  const sessionId = useRef(
+    typeof crypto !== 'undefined' && 'randomUUID' in crypto
+      ? crypto.randomUUID()
+      : `${Date.now()}-${Math.random().toString(36).slice(2)}`
+  ).current;
   const [profile, setProfile] = useState<UserProfile>({
     personalInfo: {
       name: '',
@@ -42,14 +67,6 @@ const ProfileForm: React.FC<ProfileFormProps> = ({ onComplete, onBack }) => {
     }
   });
 
-  const sections = [
-    { title: 'Personal Information', icon: User },
-    { title: 'Disability Profile', icon: Heart },
-    { title: 'Education & Skills', icon: GraduationCap },
-    { title: 'Employment Goals', icon: Briefcase },
-    { title: 'Support Needs', icon: CheckCircle }
-  ];
-
   const updateProfile = (section: keyof UserProfile, field: string, value: any) => {
     setProfile(prev => ({
       ...prev,
@@ -76,6 +93,35 @@ const ProfileForm: React.FC<ProfileFormProps> = ({ onComplete, onBack }) => {
       };
     });
   };
+// 尽力而为：失败或被服务端的预算上限跳过都不影响最终提交
+const warmupProfile = useCallback(async (profile: UserProfile) => {
+  try {
+    await fetch(`${API_BASE}/recommend/warmup`, {
+      method: 'POST',
+      mode: 'cors',
+      credentials: 'omit',
+      headers: { 'Content-Type': 'application/json', 'X-Session-Id': sessionId },
+      body: JSON.stringify(profile),
+    });
+  } catch (error) {
+    console.debug('warmup skipped:', error);
+  }
+}, [sessionId]);
+
+// 高信号部分都填了之后（不管当前在哪一步），让服务端提前开始生成推荐
+const lastWarmup = useRef('');
+useEffect(() => {
+  if (!WARMUP_SECTIONS.every(section => sectionFilled(profile, section))) return;
+  const body = JSON.stringify(profile);
+  if (body === lastWarmup.current) return;
+  // 停止输入一会儿再发，避免每次按键都触发一次预生成
+  const timer = setTimeout(() => {
+    lastWarmup.current = body;
+    warmupProfile(profile);
+  }, 1500);
+  return () => clearTimeout(timer);
+}, [profile, warmupProfile]);
+
 // 假设 UserProfile 是你的类型定义
 async function sendProfile(profile: UserProfile) {
   try {
@@ -85,7 +131,7 @@ async function sendProfile(profile: UserProfile) {
       method: 'POST',
       mode: 'cors',
       credentials: 'omit',
-      headers: { 'Content-Type': 'application/json' },
+      headers: { 'Content-Type': 'application/json', 'X-Session-Id': sessionId },
       body: JSON.stringify(profile),
     });
 
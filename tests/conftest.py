@@ -0,0 +1,129 @@
+"""
+测试共用：仓库根目录与 bench/ 加入 sys.path；service.py 在 import 时读环境变量，所以这里先固定好配置。
+live_service 在后台线程里启动 mock provider + 真实的 uvicorn 服务（不是进程内 TestClient）；
+make_profile 按 user.json 生成画像，post 向服务发请求。
+"""
+import asyncio
+import copy
+import json
+import os
+import socket
+import sys
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "bench"))
+
+os.environ.update(
+    LLM_JOURNAL="",
+    LLM_PROVIDERS="openai4",
+    LLM_PROVIDER="openai4",
+    LLM_CASCADE="",
+    REC_CACHE_DB="",
+    SIMILAR_CACHE_SIZE="0",
+    SPECULATE="0",
+    JOBS_DB="",
+    SERVICE_DRAIN_TIMEOUT="1",
+)
+
+
+class LiveService:
+    """A uvicorn server for ``service.app`` pointed at the local mock providers, on its own loop thread."""
+
+    def __init__(self):
+        import api_key
+        api_key.API_KEYS["openai4"] = "mock-key"
+        import service
+        self.service = service
+        self.loop = asyncio.new_event_loop()
+        self.ready = threading.Event()
+        self.error = None
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            self.port = s.getsockname()[1]
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    async def _main(self):
+        import uvicorn
+        from mock_providers import PROVIDER_PATHS, MockConfig, start_mock
+
+        runner, base, self.mock = await start_mock(MockConfig(latency_ms=20, latency_sigma=0))
+        for scorer in self.service._all_scorers():
+            scorer.api_url = base + PROVIDER_PATHS[scorer.provider]
+        self.server = uvicorn.Server(uvicorn.Config(self.service.app, host="127.0.0.1", port=self.port,
+                                                    log_level="warning", access_log=False, lifespan="on"))
+        serve = asyncio.ensure_future(self.server.serve())
+        while not self.server.started:
+            if serve.done():
+                serve.result()
+            await asyncio.sleep(0.01)
+        self.ready.set()
+        try:
+            await serve
+        finally:
+            await runner.cleanup()
+
+    def _run(self):
+        try:
+            self.loop.run_until_complete(self._main())
+        except BaseException as e:  # 启动失败时让 fixture 报出来
+            self.error = e
+            self.ready.set()
+
+    def start(self) -> "LiveService":
+        self.thread.start()
+        self.ready.wait(30)
+        if self.error is not None:
+            raise self.error
+        return self
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join(30)
+
+    def cache_key(self, profile) -> str:
+        """The result-cache key the service uses for ``profile``."""
+        from profile_schema import validate_profile
+        return self.service._cache_key(validate_profile(profile).data)
+
+
+@pytest.fixture(scope="session")
+def live_service():
+    svc = LiveService().start()
+    yield svc
+    svc.stop()
+
+
+@pytest.fixture
+def make_profile():
+    """Factory for profiles based on user.json: ``make_profile(name, **extra_fields)``."""
+    with open(os.path.join(ROOT, "user.json"), "r", encoding="utf-8") as f:
+        base = json.load(f)
+
+    def make(name: str, **extra):
+        profile = copy.deepcopy(base)
+        profile["personalInfo"]["name"] = name
+        profile.update(extra)
+        return profile
+    return make
+
+
+def post(url: str, path: str, body, content_type: str = "application/json"):
+    """POST to the live service; ``body`` is bytes or JSON-encoded. Returns ``(status, headers, body)``."""
+    data = body if isinstance(body, bytes) else json.dumps(body).encode("utf-8")
+    req = urllib.request.Request(url + path, data=data, headers={"Content-Type": content_type})
+    try:
+        with urllib.request.urlopen(req, timeout=60) as resp:
+            return resp.status, resp.headers, resp.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, e.read()
+
+
+def ndjson(body: bytes):
+    return [json.loads(line) for line in body.splitlines() if line.strip()]
@@ -0,0 +1,37 @@
+"""/recommend/batch 在真实 uvicorn 服务下的 NDJSON 上传（分块传输，几 MB 的请求体）。"""
+import http.client
+import json
+
+from conftest import ndjson, post
+
+
+def _post_chunked(url: str, path: str, lines):
+    host, port = url.rsplit("//", 1)[1].split(":")
+    conn = http.client.HTTPConnection(host, int(port), timeout=60)
+    body = (json.dumps(p).encode() + b"\n" for p in lines)
+    conn.request("POST", path, body=body, encode_chunked=True,
+                 headers={"Content-Type": "application/x-ndjson", "Transfer-Encoding": "chunked"})
+    resp = conn.getresponse()
+    data = resp.read()
+    conn.close()
+    return resp.status, ndjson(data)
+
+
+def test_ndjson_upload_under_uvicorn(live_service, make_profile):
+    n = 300
+    # 未知字段会被忽略，padding 只用来把请求体撑大
+    profiles = (make_profile(f"Batch User {i}", padding="x" * 15000) for i in range(n))
+    status, results = _post_chunked(live_service.url, "/recommend/batch", profiles)
+    assert status == 200
+    assert sorted(r["index"] for r in results) == list(range(n))
+    assert all(r.get("recommendations") for r in results), [r for r in results if "error" in r][:3]
+
+
+def test_ndjson_bad_lines_keep_their_index(live_service):
+    lines = [b'{"needs": {"priority": "work"}}', b"", b"not json", b'{"education": {"level": "Year 12"}}']
+    status, _, body = post(live_service.url, "/recommend/batch", b"\n".join(lines) + b"\n", "application/x-ndjson")
+    results = {r["index"]: r for r in ndjson(body)}
+    assert status == 200
+    assert sorted(results) == [0, 2, 3]
+    assert "invalid JSON on line 3" in results[2]["error"]
+    assert results[0]["recommendations"] and results[3]["recommendations"]
@@ -0,0 +1,58 @@
+"""级联：强模型失败时退回的便宜结果标成 DEGRADED，且不进缓存。"""
+import json
+
+import pytest
+
+from cascade import CascadeExecutor, Degraded
+from conftest import ndjson, post
+
+
+class CheapScorer:
+    provider = "cheap"
+
+    async def call_llm(self, prompt):
+        return {"parse_method": "strict"}
+
+    def parse_response(self, llm_resp):
+        # 只有一条：过不了 min_items=3 的检查
+        return [{"id": "1", "name": "Cheap Only", "type": "program", "relevanceScore": 70}]
+
+
+class FailingStrong:
+    deadline = 5.0
+
+    async def run(self, prompt, deadline=None):
+        raise RuntimeError("strong tier down")
+
+
+@pytest.fixture
+def degraded_cascade(live_service, monkeypatch):
+    cascade = CascadeExecutor([CheapScorer()], FailingStrong())
+    monkeypatch.setattr(live_service.service, "_cascade", cascade)
+    return cascade
+
+
+def test_fallback_is_marked_and_not_cached(live_service, degraded_cascade, make_profile):
+    profile = make_profile("Cascade Fallback")
+    status, headers, body = post(live_service.url, "/recommend", profile)
+    assert status == 200 and headers.get("X-Cache") == "DEGRADED"
+    assert [r["name"] for r in json.loads(body)] == ["Cheap Only"]
+    assert live_service.cache_key(profile) not in live_service.service._rec_cache
+    # 下一次请求重新走级联，而不是命中缓存的降级结果
+    assert post(live_service.url, "/recommend", profile)[1].get("X-Cache") == "DEGRADED"
+    assert degraded_cascade.stats["fallback"] == 2
+
+
+def test_executor_wraps_fallback():
+    import asyncio
+
+    recs, provider = asyncio.run(CascadeExecutor([CheapScorer()], FailingStrong()).run("p"))
+    assert isinstance(recs, Degraded) and provider == "cheap" and len(recs) == 1
+
+
+def test_batch_marks_fallback_lines(live_service, degraded_cascade, make_profile):
+    body = json.dumps(make_profile("Batch Fallback")).encode() + b"\n"
+    status, _, out = post(live_service.url, "/recommend/batch", body, "application/x-ndjson")
+    lines = ndjson(out)
+    assert status == 200
+    assert lines == [{"index": 0, "recommendations": lines[0]["recommendations"], "degraded": True}]
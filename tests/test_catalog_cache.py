@@ -0,0 +1,41 @@
+"""目录的列式缓存：源文件改过后写新缓存时删掉旧的。"""
+import os
+
+import pytest
+
+from catalog import _cache_prefix, _prune_cache, _read_frame, _source_key
+
+
+def test_prune_keeps_only_the_current_generation(tmp_path):
+    cache_dir = tmp_path / "cache"
+    cache_dir.mkdir()
+    source = tmp_path / "jobs.csv"
+    source.write_text("id,title\n1,A\n")
+    other = tmp_path / "other" / "jobs.csv"
+    other.parent.mkdir()
+    other.write_text("id,title\n")
+
+    prefix = _cache_prefix(str(source))
+    current = prefix + _source_key(str(source)) + ".parquet"
+    names = [current, prefix + "0" * 16 + ".parquet", prefix + "1" * 16 + ".pkl",
+             "jobs-" + "a" * 16 + ".pkl",                              # 旧命名
+             _cache_prefix(str(other)) + "2" * 16 + ".parquet",         # 同名的另一个源文件
+             "notes.txt"]
+    for name in names:
+        (cache_dir / name).write_bytes(b"x")
+
+    _prune_cache(str(cache_dir), str(source), current)
+    assert sorted(os.listdir(cache_dir)) == sorted([current, names[4], "notes.txt"])
+
+
+def test_rewrite_after_source_change_drops_old_cache(tmp_path):
+    pytest.importorskip("pandas")
+    source = tmp_path / "jobs.csv"
+    source.write_text("id,title\n1,A\n")
+    cache_dir = str(tmp_path / "cache")
+    _read_frame(str(source), cache_dir)
+    first = os.listdir(cache_dir)
+    source.write_text("id,title\n1,A\n2,B\n")
+    assert len(_read_frame(str(source), cache_dir)) == 2
+    after = os.listdir(cache_dir)
+    assert len(after) == 1 and after != first
@@ -0,0 +1,55 @@
+"""HedgedExecutor：同一轮完成的失败任务异常被取走，没用上的在跑任务被取消并等到结束。"""
+import asyncio
+import gc
+
+from llm_engine import HedgedExecutor
+
+
+class GatedScorer:
+    """Answers (or fails) once ``gate`` is set; ``hang`` never answers."""
+
+    def __init__(self, provider, gate, mode):
+        self.provider = provider
+        self.gate = gate
+        self.mode = mode
+        self.finished = False
+
+    async def call_llm(self, prompt):
+        try:
+            if self.mode == "hang":
+                await asyncio.sleep(60)
+            await self.gate.wait()
+            if self.mode == "fail":
+                raise RuntimeError(f"{self.provider} down")
+            return {"provider": self.provider}
+        finally:
+            self.finished = True
+
+    def parse_response(self, llm_resp):
+        return [{"name": llm_resp["provider"]}]
+
+
+def test_losers_are_retrieved_and_cancelled():
+    unretrieved = []
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        loop.set_exception_handler(lambda loop, ctx: unretrieved.append(ctx))
+        # 同一轮里先处理哪个完成的任务取决于集合顺序：多跑几次，让“成功的先被处理”一定出现
+        for _ in range(20):
+            gate = asyncio.Event()
+            scorers = [GatedScorer("ok", gate, "ok"), GatedScorer("bad", gate, "fail"),
+                       GatedScorer("slow", gate, "hang")]
+            engine = HedgedExecutor(scorers, default_hedge_delay=0.001, deadline=5)
+            loop.call_later(0.02, gate.set)     # 三个都已启动后，ok 与 bad 在同一轮完成
+            recs, provider = await engine.run("p")
+            assert provider == "ok" and recs == [{"name": "ok"}]
+            assert engine.stats["hedges"] == 2
+            # run 返回时被取消的请求已经真正结束
+            assert scorers[2].finished
+            gc.collect()
+        await asyncio.sleep(0)
+
+    asyncio.run(scenario())
+    gc.collect()
+    assert not unretrieved
@@ -0,0 +1,154 @@
+"""JobQueue：按 key 去重、失败重试、关闭时放回队列、多个长轮询共用同一个完成通知。"""
+import asyncio
+
+import pytest
+
+from jobs import JobQueue
+from profile_schema import ProfileError
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / "jobs.db"), workers=2, poll_interval=0.05, retry_backoff=0.01, max_attempts=3)
+
+
+def test_disabled_by_default(monkeypatch):
+    monkeypatch.delenv("JOBS_DB", raising=False)
+    assert JobQueue.from_env(lease=60) is None
+
+
+def test_same_key_is_deduped(queue):
+    async def scenario():
+        first = await queue.submit("k1", {"n": 1})
+        second = await queue.submit("k1", {"n": 1})
+        other = await queue.submit("k2", {"n": 2})
+        return first, second, other
+    first, second, other = asyncio.run(scenario())
+    assert second == {"id": first["id"], "status": "queued", "deduped": True}
+    assert other["id"] != first["id"] and not other["deduped"]
+    assert queue.stats["submitted"] == 2 and queue.stats["deduped"] == 1
+
+
+def test_failed_job_is_retried_then_succeeds(queue):
+    calls = []
+
+    async def flaky(profile):
+        calls.append(profile)
+        if len(calls) == 1:
+            raise RuntimeError("provider down")
+        return [{"name": "A"}]
+
+    async def scenario():
+        queue.start(flaky)
+        job = await queue.submit("k", {"n": 1})
+        done = await queue.get(job["id"], wait=5)
+        await queue.close()
+        return done
+    done = asyncio.run(scenario())
+    assert done["status"] == "done" and done["result"] == [{"name": "A"}]
+    assert done["attempts"] == 2 and queue.stats["retried"] == 1
+
+
+def test_retries_stop_at_max_attempts_and_profile_errors_are_not_retried(queue):
+    async def broken(profile):
+        if profile.get("invalid"):
+            raise ProfileError(422, "bad profile")
+        raise RuntimeError("provider down")
+
+    async def scenario():
+        queue.start(broken)
+        a = await queue.submit("a", {})
+        b = await queue.submit("b", {"invalid": True})
+        results = await asyncio.gather(queue.get(a["id"], wait=5), queue.get(b["id"], wait=5))
+        await queue.close()
+        return results
+    failed, invalid = asyncio.run(scenario())
+    assert failed["status"] == "failed" and failed["attempts"] == 3 and "provider down" in failed["error"]
+    assert invalid["status"] == "failed" and invalid["attempts"] == 1
+
+
+def test_failed_key_can_be_resubmitted(queue):
+    async def broken(profile):
+        raise ProfileError(422, "bad profile")
+
+    async def scenario():
+        queue.start(broken)
+        job = await queue.submit("k", {})
+        await queue.get(job["id"], wait=5)
+        again = await queue.submit("k", {})
+        await queue.close()
+        return job, again
+    job, again = asyncio.run(scenario())
+    assert again["id"] != job["id"] and not again["deduped"]
+
+
+def test_close_requeues_running_job_without_counting_the_attempt(queue):
+    started = []
+
+    async def hang(profile):
+        started.append(profile)
+        await asyncio.sleep(60)
+
+    async def scenario():
+        queue.start(hang)
+        job = await queue.submit("k", {})
+        while not started:
+            await asyncio.sleep(0.01)
+        await queue.close()
+        return await queue.get(job["id"])
+    job = asyncio.run(scenario())
+    assert job["status"] == "queued" and job["attempts"] == 0
+    assert queue.stats["requeued"] == 1
+
+
+def test_waiter_timeout_does_not_drop_other_waiters(queue):
+    release = None
+
+    async def gated(profile):
+        await release.wait()
+        return [{"name": "A"}]
+
+    async def scenario():
+        nonlocal release
+        release = asyncio.Event()
+        # 只靠本进程通知：查库间隔比测试长得多
+        queue.poll_interval = 30
+        queue.start(gated)
+        job = await queue.submit("k", {})
+        long_poll = asyncio.ensure_future(queue.get(job["id"], wait=10))
+        short = await queue.get(job["id"], wait=0.1)
+        assert short["status"] in ("queued", "running")
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        release.set()
+        done = await long_poll
+        elapsed = loop.time() - started
+        await queue.close()
+        return done, elapsed
+    done, elapsed = asyncio.run(scenario())
+    assert done["status"] == "done" and elapsed < 5
+    assert not queue._done_events and not queue._waiters
+
+
+def test_degraded_result_is_marked_and_not_deduped(queue):
+    from cascade import Degraded
+
+    calls = []
+
+    async def fallback(profile):
+        calls.append(profile)
+        return Degraded([{"name": "Cheap Only"}], "cheap")
+
+    async def scenario():
+        queue.start(fallback)
+        first = await queue.submit("k", {"n": 1})
+        done = await queue.get(first["id"], wait=5)
+        again = await queue.submit("k", {"n": 1})
+        await queue.get(again["id"], wait=5)
+        await queue.close()
+        return first, done, again
+    first, done, again = asyncio.run(scenario())
+    assert done["status"] == "done" and done["degraded"] is True and done["result"] == [{"name": "Cheap Only"}]
+    # 同一画像再提交：重新排队生成，而不是复用降级结果
+    assert again["id"] != first["id"] and not again["deduped"]
+    assert len(calls) == 2
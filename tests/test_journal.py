@@ -0,0 +1,36 @@
+"""journal 默认关闭、记录里带 prompt；重放遇到未知 provider 时退回替身。"""
+import argparse
+
+from journal import Journal
+from prompt_template import PREFIX_ID, build_prompt
+from replay_journal import _replay_prompt, _request_key, replay_parse
+
+
+def test_journal_is_opt_in(monkeypatch):
+    monkeypatch.delenv("LLM_JOURNAL", raising=False)
+    assert not Journal.from_env().enabled
+    monkeypatch.setenv("LLM_JOURNAL", "journal.jsonl")
+    assert Journal.from_env().enabled
+
+
+def test_prompt_fields_round_trip_through_replay():
+    prompt = build_prompt({"personalInfo": {"location": "Toronto"}})
+    fields = Journal("x.jsonl").prompt_fields(prompt)
+    assert fields["template"] == PREFIX_ID
+    assert fields["prompt"] == prompt.suffix and "Toronto" in fields["prompt"]
+    assert _replay_prompt(fields, 0) == prompt
+    assert "prompt" not in Journal("x.jsonl", store_prompts=False).prompt_fields(prompt)
+    assert _replay_prompt({}, 7) == "journal-replay:7"
+
+
+def test_request_key_ignores_continuation_note():
+    body = b'{"messages": [{"role": "system", "content": "p"}, {"role": "user", "content": "abc\\n# Continuation\\nmore"}]}'
+    assert _request_key(body) == "abc"
+
+
+def test_replay_parse_unknown_provider_uses_stand_in():
+    raw = '[{"name": "A", "type": "job", "relevanceScore": 80}]'
+    records = [{"id": "1", "provider": "retired-provider", "raw": raw, "outcome": "ok"}]
+    args = argparse.Namespace(stand_in="openai4", show=0)
+    report = replay_parse(records, args)
+    assert report["outcomes"] == {"ok": 1}
@@ -0,0 +1,60 @@
+"""容错解析器：bench/parse_corpus.jsonl 的每个用例都要恢复出至少 min_items 条。"""
+import json
+import os
+
+import pytest
+
+from conftest import ROOT
+from json_repair import IncrementalJSONParser, loads_tolerant
+
+with open(os.path.join(ROOT, "bench", "parse_corpus.jsonl"), "r", encoding="utf-8") as _f:
+    CASES = [json.loads(line) for line in _f if line.strip()]
+
+
+def _count_items(data) -> int:
+    if isinstance(data, dict):
+        for key in ("results", "recommendations"):
+            if isinstance(data.get(key), list):
+                return sum(isinstance(it, dict) for it in data[key])
+        return 1
+    return sum(isinstance(it, dict) for it in data)
+
+
+@pytest.mark.parametrize("case", CASES, ids=[c["name"] for c in CASES])
+def test_loads_tolerant(case):
+    try:
+        data, _method = loads_tolerant(case["content"])
+    except ValueError:
+        assert case["min_items"] == 0
+        return
+    assert _count_items(data) >= case["min_items"]
+
+
+@pytest.mark.parametrize("case", [c for c in CASES if c["name"].startswith("prose_brackets")],
+                         ids=lambda c: c["name"])
+@pytest.mark.parametrize("chunk", [1, 16, 4096])
+def test_stream_skips_bracketed_prose(case, chunk):
+    parser = IncrementalJSONParser()
+    content = case["content"]
+    items = []
+    for i in range(0, len(content), chunk):
+        items.extend(parser.feed(content[i:i + chunk]))
+    assert len(items) >= case["min_items"]
+
+
+def test_parse_response_fenced_with_prose():
+    from back import LLMScorerWithExcel
+
+    scorer = LLMScorerWithExcel(api_key="test", provider="openai4")
+    scorer.structured = None
+    for content in ('Sure [see below]:\n```json\n[{"name":"a"},{"name":"b"}]\n```',
+                    'Here you go (see {rules}):\n```json\n[{"name":"a"},{"name":"b"}]\n```'):
+        recs = scorer.parse_response({"choices": [{"message": {"content": content}}]})
+        assert [r["name"] for r in recs] == ["a", "b"]
+
+
+def test_bracketed_prose_alone_is_still_returned():
+    # 没有更好的候选时，合法但没有对象的值照旧返回（由调用方判定为空结果）
+    assert loads_tolerant("Scores: [1, 2]") == ([1, 2], "direct")
+    with pytest.raises(ValueError):
+        loads_tolerant("see {rules} and [notes]")
@@ -0,0 +1,145 @@
+"""ProviderLimiter 的准入与卸载：超过桶容量的估算、卸载时归还额度。"""
+import asyncio
+
+import pytest
+
+from rate_limit import OverloadedError, ProviderLimiter, RateLimitedError, TokenBucket
+
+
+async def _ok():
+    return "ok"
+
+
+def test_estimate_above_token_capacity_is_admitted():
+    # tpm=600 → 容量 100 token；估算 5000 token 的请求按满桶计，满桶时立刻放行
+    limiter = ProviderLimiter("test", rpm=600, tpm=600, max_wait=0.5)
+    assert limiter.tokens.capacity == 100
+    assert asyncio.run(limiter.run(_ok, est_tokens=5000)) == "ok"
+    assert limiter.stats["shed"] == 0
+
+
+def test_oversized_estimate_waits_for_a_full_bucket_then_sheds():
+    async def scenario():
+        limiter = ProviderLimiter("test", tpm=600, max_wait=0.2)
+        await limiter.run(_ok, est_tokens=5000)
+        # 桶已空，攒满 100 token 要 10 秒，超过 max_wait → 卸载，而不是无限等待
+        with pytest.raises(OverloadedError):
+            await limiter.run(_ok, est_tokens=5000)
+        return limiter
+    limiter = asyncio.run(scenario())
+    assert limiter.stats["shed"] == 1
+
+
+def test_shed_refunds_the_request_token():
+    async def scenario():
+        limiter = ProviderLimiter("test", rpm=600, tpm=600, max_wait=0.2)
+        limiter.tokens.tokens = 0.0
+        before = limiter.requests.wait_time(1.0), limiter.requests.tokens
+        with pytest.raises(OverloadedError):
+            await limiter.run(_ok, est_tokens=50)
+        return limiter, before
+    limiter, (wait_before, tokens_before) = asyncio.run(scenario())
+    assert wait_before == 0.0
+    # 请求桶的那一个 token 被还回来了（期间只会多补充，不会更少）
+    assert limiter.requests.tokens >= tokens_before
+
+
+def test_shed_on_concurrency_refunds_both_buckets():
+    async def scenario():
+        limiter = ProviderLimiter("test", rpm=600, tpm=6000, max_concurrency=1, max_wait=0.1)
+        await limiter.concurrency.acquire()
+        tokens_before = limiter.tokens.tokens
+        with pytest.raises(OverloadedError):
+            await limiter.run(_ok, est_tokens=400)
+        return limiter, tokens_before
+    limiter, tokens_before = asyncio.run(scenario())
+    assert limiter.tokens.tokens >= tokens_before
+    assert limiter.requests.tokens >= limiter.requests.capacity - 1e-6
+
+
+def test_refund_never_exceeds_capacity():
+    bucket = TokenBucket(rate=1.0, capacity=5.0)
+    bucket.refund(100)
+    assert bucket.tokens == 5.0
+
+
+def test_usage_correction_uses_the_clamped_charge():
+    # 容量 100：估算 5000 只扣了 100，实际用了 80 → 桶里剩约 20，而不是按 5000 多退 4900
+    limiter = ProviderLimiter("test", tpm=600, max_wait=0.5)
+    asyncio.run(limiter.run(_ok, est_tokens=5000, actual_tokens=lambda result: 80))
+    assert 19 <= limiter.tokens.tokens <= 25
+
+
+def test_usage_correction_covers_every_retried_admission():
+    calls = []
+
+    async def throttled_once():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RateLimitedError(429, retry_after=0)
+        return "ok"
+
+    limiter = ProviderLimiter("test", tpm=600, max_wait=0.5, base_backoff=0.0)
+    asyncio.run(limiter.run(throttled_once, est_tokens=30, actual_tokens=lambda result: 30))
+    # 两次准入各扣 30，成功那次实际用 30：被限流那次的额度退回
+    assert limiter.stats["retries"] == 1
+    assert 69 <= limiter.tokens.tokens <= 75
+
+
+def test_stream_retries_throttled_open_and_releases_the_slot():
+    opened = []
+
+    async def open_stream():
+        opened.append(1)
+        if len(opened) == 1:
+            raise RateLimitedError(503, retry_after=0)
+        for piece in ("a", "b"):
+            yield piece
+
+    async def scenario():
+        limiter = ProviderLimiter("test", tpm=600, max_concurrency=2, max_wait=0.5, base_backoff=0.0)
+        pieces = [p async for p in limiter.stream(open_stream, est_tokens=40, actual_tokens=lambda: 10)]
+        return limiter, pieces
+    limiter, pieces = asyncio.run(scenario())
+    assert pieces == ["a", "b"] and len(opened) == 2
+    assert limiter.stats["retries"] == 1 and limiter.concurrency.inflight == 0
+    assert 85 <= limiter.tokens.tokens <= 95
+
+
+def test_stream_is_shed_before_opening():
+    opened = []
+
+    async def open_stream():
+        opened.append(1)
+        yield "a"
+
+    async def scenario():
+        limiter = ProviderLimiter("test", max_concurrency=1, max_wait=0.1)
+        await limiter.concurrency.acquire()
+        with pytest.raises(OverloadedError):
+            async for _ in limiter.stream(open_stream):
+                pass
+    asyncio.run(scenario())
+    assert not opened
+
+
+def test_scorer_stream_goes_through_the_limiter():
+    from back import LLMScorerWithExcel
+
+    scorer = LLMScorerWithExcel(api_key="test", provider="openai4")
+    scorer._rate_limiter = ProviderLimiter("openai4", tpm=60000, max_concurrency=1, base_backoff=0.0)
+    attempts = []
+
+    async def stream(prompt, max_tokens=None):
+        attempts.append(max_tokens)
+        if len(attempts) == 1:
+            raise RateLimitedError(429, retry_after=0)
+        yield "hello"
+
+    scorer.adapter.stream = stream
+
+    async def scenario():
+        return [d async for d in scorer.stream_llm("prompt")]
+    assert asyncio.run(scenario()) == ["hello"]
+    assert len(attempts) == 2 and scorer._rate_limiter.stats["retries"] == 1
+    assert scorer._rate_limiter.concurrency.inflight == 0
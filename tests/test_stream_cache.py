@@ -0,0 +1,48 @@
+"""/recommend/stream：中途失败或条数不足的结果不进缓存，完整结果照常缓存。"""
+import pytest
+
+from conftest import ndjson, post
+
+
+def _stream(url: str, profile):
+    status, headers, body = post(url, "/recommend/stream", profile)
+    assert status == 200
+    return headers.get("X-Cache"), ndjson(body)
+
+
+@pytest.fixture
+def failing_stream(live_service, monkeypatch):
+    """Make every provider emit ``n`` items and then fail (or end early)."""
+    def install(n: int, error: bool):
+        async def partial(prompt):
+            for i in range(n):
+                yield {"id": str(i + 1), "name": f"Partial {i}", "type": "program", "relevanceScore": 80}
+            if error:
+                raise RuntimeError("upstream reset mid-stream")
+        for scorer in live_service.service._service_scorers:
+            monkeypatch.setattr(scorer, "stream_recommendations", partial)
+    return install
+
+
+def test_failed_stream_is_not_cached(live_service, failing_stream, make_profile):
+    failing_stream(2, error=True)
+    profile = make_profile("Stream Failure")
+    x_cache, lines = _stream(live_service.url, profile)
+    assert x_cache == "MISS"
+    assert len(lines) == 3 and "error" in lines[-1]
+    assert live_service.cache_key(profile) not in live_service.service._rec_cache
+
+
+def test_short_stream_is_not_cached(live_service, failing_stream, make_profile):
+    failing_stream(1, error=False)
+    profile = make_profile("Stream Short")
+    _stream(live_service.url, profile)
+    assert live_service.cache_key(profile) not in live_service.service._rec_cache
+
+
+def test_complete_stream_is_cached(live_service, make_profile):
+    profile = make_profile("Stream Complete")
+    x_cache, lines = _stream(live_service.url, profile)
+    assert x_cache == "MISS" and len(lines) == 3 and all("error" not in line for line in lines)
+    assert live_service.cache_key(profile) in live_service.service._rec_cache
+    assert _stream(live_service.url, profile)[0] == "HIT"
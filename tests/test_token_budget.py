@@ -0,0 +1,36 @@
+"""token 预算按实际解析出的条数学习每条 token 数，而不是按请求的条数。"""
+import asyncio
+import json
+
+from back import LLMScorerWithExcel
+
+
+def _scorer(items: int, completion_tokens: int):
+    scorer = LLMScorerWithExcel(api_key="test", provider="openai4")
+    content = json.dumps([{"name": f"Item {i}", "type": "program", "relevanceScore": 90 - i} for i in range(items)])
+
+    async def dispatch(prompt, max_tokens):
+        return {"choices": [{"message": {"content": content}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 100, "completion_tokens": completion_tokens}}
+
+    scorer._dispatch_llm = dispatch
+    return scorer
+
+
+def test_observe_uses_parsed_item_count():
+    scorer = _scorer(items=2, completion_tokens=2 * 500 + 150)
+    budget = scorer.budget
+    budget.per_item, budget.alpha = 350.0, 1.0
+    recs = scorer.parse_response(asyncio.run(scorer.call_llm("p")))
+    assert len(recs) == 2 and scorer.target_items != 2
+    assert budget.per_item == 500.0 and budget.stats["calls"] == 1
+
+
+def test_observed_once_and_failed_parse_counts_a_call():
+    scorer = _scorer(items=0, completion_tokens=40)
+    budget = scorer.budget
+    per_item = budget.per_item
+    resp = asyncio.run(scorer.call_llm("p"))
+    assert scorer.parse_response(resp) == []
+    assert scorer.parse_response(resp) == []
+    assert budget.per_item == per_item and budget.stats["calls"] == 1
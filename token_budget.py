@@ -0,0 +1,61 @@
+"""
+Token 预算：本地估算 prompt token、按目标条目数与 provider 输出上限选择 max_tokens，
+并统一识别各家的“输出被截断”信号
+"""
+import re
+from typing import Any, Dict, Optional
+
+# 中日韩字符大约 1 字 1 token，其余按 4 字符 1 token 估算
+_WIDE = re.compile(r"[⺀-鿿가-힯豈-﫿＀-￯]")
+
+# OpenAI 兼容: "length"；Claude: "max_tokens"；Gemini: "MAX_TOKENS"；Responses API: "max_output_tokens"
+_TRUNCATED = {"length", "max_tokens", "max_output_tokens"}
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap local token estimate; good enough for budgeting and rate limiting."""
+    if not text:
+        return 0
+    wide = len(_WIDE.findall(text))
+    return int((len(text) - wide) / 4 + wide) + 1
+
+
+def is_truncated(finish_reason: Optional[str]) -> bool:
+    return bool(finish_reason) and str(finish_reason).lower() in _TRUNCATED
+
+
+class TokenBudget:
+    """Pick ``max_tokens`` for a requested number of recommendations.
+
+    The per-item estimate starts from ``per_item`` and tracks observed
+    completion sizes (EWMA over untruncated answers); a truncated answer bumps
+    it so the next call gets more room.
+    """
+
+    def __init__(self, max_output: int = 8192, per_item: float = 350.0, overhead: float = 150.0,
+                 headroom: float = 1.3, floor: int = 512, alpha: float = 0.2):
+        self.max_output = max_output
+        self.per_item = per_item
+        self.overhead = overhead
+        self.headroom = headroom
+        self.floor = floor
+        self.alpha = alpha
+        self.stats = {"calls": 0, "truncated": 0, "continuations": 0}
+
+    def max_tokens(self, items: int) -> int:
+        want = (self.overhead + max(1, items) * self.per_item) * self.headroom
+        return int(max(self.floor, min(self.max_output, want)))
+
+    def observe(self, completion_tokens: int, items: int):
+        self.stats["calls"] += 1
+        if completion_tokens > 0 and items > 0:
+            per = max(1.0, (completion_tokens - self.overhead) / items)
+            self.per_item += self.alpha * (per - self.per_item)
+
+    def on_truncated(self):
+        self.stats["calls"] += 1
+        self.stats["truncated"] += 1
+        self.per_item *= 1.25
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {**self.stats, "per_item_tokens": round(self.per_item, 1), "max_output": self.max_output}
@@ -0,0 +1,129 @@
+"""
+所有 provider 共用的 HTTP 传输层：按 provider 复用的 aiohttp 连接池、延迟构建的 SSL context、
+连接/首字节计时的 trace 回调，以及 rate-limit 响应头处理
+"""
+import functools
+import os
+import ssl
+import time
+from contextvars import ContextVar
+from typing import Dict
+
+import aiohttp
+
+from rate_limit import RateLimitedError, parse_retry_after
+
+# Connection pool settings shared by every provider session
+POOL_LIMIT = int(os.getenv("LLM_POOL_LIMIT", "100"))
+POOL_LIMIT_PER_HOST = int(os.getenv("LLM_POOL_LIMIT_PER_HOST", "20"))
+DNS_CACHE_TTL = int(os.getenv("LLM_DNS_CACHE_TTL", "300"))   # 0 = 关闭 DNS 缓存
+KEEPALIVE_TIMEOUT = float(os.getenv("LLM_KEEPALIVE_TIMEOUT", "60"))
+
+# 当前这次 provider 调用的分段计时（由 aiohttp trace 回调填充）
+call_timing: ContextVar[Dict[str, float] | None] = ContextVar("call_timing", default=None)
+
+# provider -> long-lived ClientSession（按进程隔离：fork 出的 worker 不能复用父进程的连接）
+_http_sessions: Dict[str, aiohttp.ClientSession] = {}
+_http_sessions_pid = os.getpid()
+
+
+def build_ssl_context(insecure: bool = False, ca_bundle: str | None = None) -> ssl.SSLContext:
+    if insecure:
+        ctx = ssl.create_default_context()
+        ctx.check_hostname = False
+        ctx.verify_mode = ssl.CERT_NONE
+        return ctx
+    if ca_bundle:
+        return ssl.create_default_context(cafile=ca_bundle)
+    try:
+        # certifi 只在第一次建 context 时才 import
+        import certifi
+        return ssl.create_default_context(cafile=certifi.where())
+    except Exception:
+        return ssl.create_default_context()
+
+
+@functools.lru_cache(maxsize=None)
+def shared_ssl_context(insecure: bool, ca_bundle: str | None) -> ssl.SSLContext:
+    """One SSL context per option set and process; loading the certifi bundle is slow."""
+    return build_ssl_context(insecure, ca_bundle)
+
+
+def scorer_ssl_context(scorer):
+    """SSL context for this scorer, built lazily on first connection."""
+    ctx = getattr(scorer, "_ssl_context", None)
+    options = getattr(scorer, "_ssl_options", None)
+    if ctx is None and options is not None:
+        ctx = scorer._ssl_context = shared_ssl_context(*options)
+    return ctx
+
+
+def _build_trace_config() -> aiohttp.TraceConfig:
+    """Record connection-acquire time and time-to-first-byte into ``call_timing``."""
+    trace = aiohttp.TraceConfig()
+
+    def _mark(key):
+        async def _cb(session, ctx, params):
+            timing = call_timing.get()
+            if timing is not None:
+                timing[key] = time.perf_counter()
+        return _cb
+
+    def _span(start_key, total_key):
+        async def _cb(session, ctx, params):
+            timing = call_timing.get()
+            if timing is not None and start_key in timing:
+                timing[total_key] = timing.get(total_key, 0.0) + time.perf_counter() - timing.pop(start_key)
+        return _cb
+
+    # 连接获取 = 连接池排队 + 新建连接（DNS/TCP/TLS）；复用连接时为 0
+    trace.on_connection_queued_start.append(_mark("_queued"))
+    trace.on_connection_queued_end.append(_span("_queued", "connect"))
+    trace.on_connection_create_start.append(_mark("_create"))
+    trace.on_connection_create_end.append(_span("_create", "connect"))
+    # on_request_end 在收到响应头时触发
+    trace.on_request_end.append(_mark("headers"))
+    return trace
+
+
+def get_http_session(scorer) -> aiohttp.ClientSession:
+    """Return the pooled session for this scorer's provider, creating it on first use."""
+    global _http_sessions_pid
+    if _http_sessions_pid != os.getpid():
+        # 在 fork 出的子进程里：丢弃继承来的会话（不关闭，它们属于父进程的事件循环）
+        _http_sessions.clear()
+        _http_sessions_pid = os.getpid()
+    session = _http_sessions.get(scorer.provider)
+    if session is None or session.closed:
+        connector = aiohttp.TCPConnector(
+            ssl=scorer_ssl_context(scorer),
+            limit=POOL_LIMIT,
+            limit_per_host=POOL_LIMIT_PER_HOST,
+            use_dns_cache=DNS_CACHE_TTL > 0,
+            ttl_dns_cache=DNS_CACHE_TTL if DNS_CACHE_TTL > 0 else None,
+            keepalive_timeout=KEEPALIVE_TIMEOUT,
+        )
+        session = aiohttp.ClientSession(connector=connector, trace_configs=[_build_trace_config()])
+        _http_sessions[scorer.provider] = session
+    return session
+
+
+async def close_http_sessions():
+    """Close every pooled provider session (service shutdown / end of CLI run)."""
+    sessions = list(_http_sessions.values())
+    _http_sessions.clear()
+    for session in sessions:
+        if not session.closed:
+            await session.close()
+
+
+def check_rate_limits(scorer, response) -> None:
+    """Feed rate-limit headers to the provider limiter; raise RateLimitedError on 429/503/529."""
+    limiter = getattr(scorer, "_rate_limiter", None)
+    if limiter is not None:
+        limiter.update_from_headers(response.headers)
+    if response.status in (429, 503, 529):
+        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        if retry_after is None:
+            retry_after = parse_retry_after(response.headers.get("x-ratelimit-reset-requests"))
+        raise RateLimitedError(response.status, retry_after)